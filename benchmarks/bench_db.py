@@ -0,0 +1,43 @@
+"""Общие функции замеров: отдельная база под замер, миграция и метка коммита для результатов."""
+import os
+import subprocess
+import sys
+from typing import Optional
+
+from psycopg import AsyncConnection, sql
+
+from config.config import Config
+from infrastructure.database.connection import build_pg_conninfo
+
+
+# Функция, открывающая соединение с рабочей базой в autocommit (для CREATE/DROP DATABASE и pg_stat_*)
+async def admin_connection(config: Config) -> AsyncConnection:
+    conninfo = build_pg_conninfo(config.db.name, config.db.host, config.db.port, config.db.user, config.db.password)
+    return await AsyncConnection.connect(conninfo, autocommit=True)
+
+
+async def recreate_database(admin: AsyncConnection, db_name: str) -> None:
+    await drop_database(admin, db_name)
+    await admin.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+
+
+async def drop_database(admin: AsyncConnection, db_name: str) -> None:
+    await admin.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(db_name)))
+
+
+def subprocess_env(db_name: str, **overrides: str) -> dict:
+    # Скрипты читают настройки из окружения, а значения из .env не перекрывают уже заданные переменные
+    return {**os.environ, "POSTGRES_DB": db_name, **overrides}
+
+
+def run_migration(db_name: str) -> None:
+    subprocess.run([sys.executable, "-m", "migrations.create_tables"], env=subprocess_env(db_name), check=True)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
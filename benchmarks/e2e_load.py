@@ -0,0 +1,547 @@
+"""
+Сквозной нагрузочный замер конвейера бота: сообщение -> хэндлер `query_router` -> LLM -> SQL -> ответ.
+
+Скрипт:
+  1. создаёт отдельную базу (`--db`, по умолчанию `<POSTGRES_DB>_e2e_bench`) и накатывает на неё
+     `migrations/create_tables.py` в отдельном процессе, затем заполняет её синтетическими
+     видео, снапшотами и дневными агрегатами;
+  2. поднимает локальную заглушку Chipp chat-completions с настраиваемой задержкой, которая
+     отвечает заранее заготовленным SQL для вопросов корпуса;
+  3. прогоняет `--messages` синтетических сообщений через настоящий диспетчер aiogram с `query_router`,
+     не больше `--concurrency` одновременно; отправка в Telegram перехватывается локальной сессией;
+  4. печатает p50/p95/p99 задержки, сообщений в секунду и число соединений с базой
+     и сохраняет результат в JSON (`--output`), чтобы сравнивать замеры между коммитами (`--baseline`).
+
+Кеши, шаблоны, single-flight и планировщик настраиваются теми же переменными окружения, что и бот
+(например, RESULT_CACHE_SIZE=0 или INTENTS_ENABLED=true). При COLUMNAR_ENABLED=true засеянные данные
+выгружаются в колоночные файлы во временном каталоге, и простые агрегаты считаются по ним. В конце база удаляется (если не указан `--keep`).
+
+Запуск из корня репозитория:
+    python -m benchmarks.e2e_load --messages 2000 --concurrency 50 --llm-latency 800
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import Chat, Message, Update
+from aiohttp import web
+from psycopg import AsyncConnection
+
+from benchmarks.bench_db import admin_connection, drop_database, git_commit, recreate_database, run_migration
+from bot.handlers.query import query_router
+from bot.services.batch import QuestionSplitter
+from bot.services.intents import IntentMatcher
+from bot.services.llm import LLMClient
+from bot.services.pipeline import QueryPipeline
+from bot.services.prompt_builder import PromptBuilder
+from bot.services.resilience import CircuitBreaker, HedgePolicy
+from bot.services.scheduler import WorkScheduler
+from bot.services.translation_cache import TranslationCache
+from config.config import Config, get_config
+from infrastructure.cache.singleflight import SingleFlight
+from infrastructure.columnar.engine import ColumnarEngine
+from infrastructure.columnar.export import export_columnar, is_available as columnar_available
+from infrastructure.database.connection import create_pg_pool
+from infrastructure.database.data_version import bump_data_version
+from infrastructure.database.query_guard import QueryGuard
+from infrastructure.database.result_cache import ResultCache
+from infrastructure.database.sql_rewriter import SargableRewriter
+from infrastructure.load_data.rollups import rebuild_creator_rollups
+from infrastructure.monitoring.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+STUB_PATH = "/api/v1/chat/completions"
+
+# Вопросы корпуса и SQL, которым на них отвечает заглушка LLM (в формате ответа модели — блоком кода).
+# Вопросы с SQL None разбираются шаблонами IntentMatcher и до LLM не доходят (если шаблоны включены)
+CORPUS: List[tuple[str, Optional[str]]] = [
+    ("Сколько всего видео?", None),
+    ("Сколько видео вышло в ноябре 2025 года?", None),
+    ("На сколько выросли просмотры 28 ноября 2025?", None),
+    (
+        "Сколько видео набрали больше 100000 просмотров за всё время?",
+        "SELECT COUNT(*) FROM videos WHERE views_count > 100000",
+    ),
+    (
+        "Сколько разных видео получали новые просмотры 27 ноября 2025?",
+        "SELECT COUNT(DISTINCT video_id) FROM video_snapshots "
+        "WHERE created_at::date = '2025-11-27' AND delta_views_count > 0",
+    ),
+    (
+        "Какое среднее количество лайков у одного видео?",
+        "SELECT ROUND(AVG(likes_count)) FROM videos",
+    ),
+    (
+        "Сколько креаторов опубликовали хотя бы одно видео в октябре 2025?",
+        "SELECT COUNT(DISTINCT creator_id) FROM videos WHERE date_trunc('month', video_created_at) = '2025-10-01'",
+    ),
+    (
+        "Сколько снапшотов зафиксировали падение просмотров?",
+        "SELECT COUNT(*) FROM video_snapshots WHERE delta_views_count < 0",
+    ),
+    # Несколько вопросов в одном сообщении: пакетный ответ
+    (
+        "Сколько видео набрали больше 100000 просмотров за всё время?\n"
+        "Какое среднее количество лайков у одного видео?\n"
+        "Сколько всего видео?",
+        None,
+    ),
+]
+DEFAULT_SQL = "SELECT COUNT(*) FROM videos"
+# Так LLMClient.get_sql_queries отмечает список вопросов в пакетном запросе
+BATCH_MARKER = "Вопросы пользователя:"
+
+
+# --- заглушка LLM ---
+
+class StubLLM:
+    """Локальный сервер в формате Chipp chat-completions с задержкой `latency` ± `jitter` секунд."""
+
+    def __init__(self, latency: float, jitter: float, seed: int) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        content = payload["messages"][-1]["content"]
+        if BATCH_MARKER in content:
+            # Пакетный запрос: вопросы пронумерованы, ответ — JSON-массив SQL
+            asked = re.findall(r"^\d+\. (.+)$", content.split(BATCH_MARKER, 1)[1], re.MULTILINE)
+            answer = json.dumps([self.sql_for(question) for question in asked], ensure_ascii=False)
+        else:
+            answer = self.sql_for(content)
+
+        delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay)
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": f"```sql\n{answer}\n```"}}]})
+
+    @staticmethod
+    def sql_for(text: str) -> str:
+        return next((sql_text for question, sql_text in CORPUS if sql_text and question in text), DEFAULT_SQL)
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(STUB_PATH, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}{STUB_PATH}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+# --- перехват отправки в Telegram ---
+
+class CaptureSession(BaseSession):
+    """Сессия aiogram без сети: sendMessage сохраняется в `sent`, остальные методы не поддерживаются."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sent: List[tuple[int, str]] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        if not isinstance(method, SendMessage):
+            raise NotImplementedError(f"{type(method).__name__} is not captured")
+        self.sent.append((method.chat_id, method.text))
+        return Message(
+            message_id=len(self.sent),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=method.chat_id, type="private"),
+            text=method.text,
+        )
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"bench{user_id}"},
+            "text": text,
+        },
+    })
+
+
+# --- база для замера ---
+
+# Функция, заполняющая базу: видео за полгода, снапшоты каждые 6 часов в конце года и дневные агрегаты
+async def seed(connection: AsyncConnection, videos: int, snapshots_per_video: int) -> None:
+    async with connection.transaction():
+        async with connection.cursor() as cur:
+            await cur.execute(
+                """
+                INSERT INTO videos (id, creator_id, video_created_at, views_count, likes_count, comments_count, reports_count)
+                SELECT gen_random_uuid(),
+                       'creator_' || (g %% 50),
+                       TIMESTAMPTZ '2025-06-01 00:00:00+00' + (g * INTERVAL '1 second' * (15552000 / %(videos)s)),
+                       g * 10, g, g / 10, 0
+                FROM generate_series(1, %(videos)s) AS g;
+                """,
+                {"videos": videos},
+            )
+            await cur.execute(
+                """
+                INSERT INTO video_snapshots (
+                    id, video_id,
+                    views_count, likes_count, comments_count, reports_count,
+                    delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                    created_at
+                )
+                SELECT gen_random_uuid(), v.id,
+                       n * 10, n, n / 10, 0,
+                       CASE WHEN n %% 17 = 0 THEN -3 ELSE 10 END, 1, (n %% 10 = 0)::int, 0,
+                       TIMESTAMPTZ '2025-12-31 23:00:00+00' - (n * INTERVAL '6 hours') - (random() * INTERVAL '59 minutes')
+                FROM videos v, generate_series(1, %s) AS n;
+                """,
+                (snapshots_per_video,),
+            )
+            await cur.execute(
+                """
+                INSERT INTO daily_video_stats (
+                    video_id, day,
+                    delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                    snapshots_count
+                )
+                SELECT video_id, created_at::date,
+                       SUM(delta_views_count), SUM(delta_likes_count),
+                       SUM(delta_comments_count), SUM(delta_reports_count),
+                       COUNT(*)
+                FROM video_snapshots
+                GROUP BY video_id, created_at::date;
+                """
+            )
+            await rebuild_creator_rollups(cur)
+            await bump_data_version(cur)
+    await connection.execute("ANALYZE")
+
+
+# Функция, раз в `interval` секунд замеряющая число соединений с базой замера и состояние пула
+async def sample_connections(admin: AsyncConnection, db_name: str, pool, peaks: Dict[str, int],
+                             interval: float = 0.05) -> None:
+    while True:
+        cur = await admin.execute(
+            "SELECT count(*), count(*) FILTER (WHERE state = 'active') FROM pg_stat_activity WHERE datname = %s",
+            (db_name,),
+        )
+        total, active = await cur.fetchone()
+        stats = pool.get_stats()
+        in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+        peaks["server_connections"] = max(peaks["server_connections"], total)
+        peaks["server_active"] = max(peaks["server_active"], active)
+        peaks["pool_in_use"] = max(peaks["pool_in_use"], in_use)
+        peaks["pool_waiting"] = max(peaks["pool_waiting"], stats.get("requests_waiting", 0))
+        await asyncio.sleep(interval)
+
+
+# --- замер ---
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def drive(dp: Dispatcher, bot: Bot, args: argparse.Namespace, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(update_id: int) -> None:
+        nonlocal failures
+        question = rng.choice(CORPUS)[0]
+        if args.unique:
+            # Уникальный хвост делает вопрос новым для кеша переводов и шаблонов
+            question = f"{question} #{update_id}"
+        update = make_update(update_id, 1000 + update_id % args.users, question)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update, **workflow_data)
+            except Exception as e:
+                failures += 1
+                logger.warning("Обновление %d завершилось ошибкой: %s", update_id, e)
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(1, args.messages + 1)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msgs_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in (
+                ("p50", percentile(ordered, 0.50)),
+                ("p95", percentile(ordered, 0.95)),
+                ("p99", percentile(ordered, 0.99)),
+                ("max", ordered[-1] if ordered else None),
+                ("avg", sum(ordered) / len(ordered) if ordered else None),
+            )
+        },
+        "failures": failures,
+    }
+
+
+def compare(result: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"Сравнение с {baseline_path} (коммит {baseline.get('commit')}):")
+    rows = [("throughput_msgs_per_s", result["throughput_msgs_per_s"], baseline.get("throughput_msgs_per_s"))]
+    rows += [
+        (f"latency_ms.{name}", result["latency_ms"][name], baseline.get("latency_ms", {}).get(name))
+        for name in ("p50", "p95", "p99")
+    ]
+    for name, current, previous in rows:
+        if current is None or not previous:
+            print(f"  {name}: {current} (было {previous})")
+            continue
+        print(f"  {name}: {current} (было {previous}, {(current - previous) / previous * 100:+.1f}%)")
+
+
+async def main(config: Config, args: argparse.Namespace) -> int:
+    db_name = args.db or f"{config.db.name}_e2e_bench"
+    admin = await admin_connection(config)
+    stub = StubLLM(args.llm_latency / 1000, args.llm_jitter / 1000, args.seed)
+    pool = None
+    llm = None
+    columnar_path = None
+
+    try:
+        await recreate_database(admin, db_name)
+        logger.info("Миграция базы %s...", db_name)
+        await asyncio.to_thread(run_migration, db_name)
+
+        pool = await create_pg_pool(
+            db_name=db_name,
+            host=config.db.host,
+            port=config.db.port,
+            user=config.db.user,
+            password=config.db.password,
+            min_size=config.db.pool.min_size,
+            max_size=config.db.pool.max_size,
+            max_idle=config.db.pool.max_idle,
+            max_lifetime=config.db.pool.max_lifetime,
+            timeout=config.db.pool.timeout,
+            check=config.db.pool.check,
+            timezone=config.db.timezone,
+        )
+        logger.info("Заполнение: %d видео x %d снапшотов", args.videos, args.snapshots)
+        async with pool.connection() as connection:
+            await seed(connection, args.videos, args.snapshots)
+
+        # Колоночные файлы — во временном каталоге, чтобы не трогать рабочие
+        columnar = None
+        if config.columnar.enabled and columnar_available() and config.result_cache.max_size > 0:
+            columnar_path = tempfile.mkdtemp(prefix="columnar_bench_")
+            await export_columnar(pool, columnar_path)
+            columnar = ColumnarEngine(columnar_path)
+
+        await stub.start()
+        metrics = Metrics(slow_query_seconds=config.metrics.slow_query_ms / 1000)
+        # Примеры только в памяти, чтобы не трогать рабочее хранилище
+        prompt_builder = PromptBuilder(
+            k=config.prompt.examples_k, max_examples=config.prompt.max_examples, min_score=config.prompt.min_score,
+            verify_successes=config.prompt.verify_successes,
+        ) if config.prompt.retrieval else None
+        llm = LLMClient(
+            "bench",
+            url=stub.url,
+            timeout=config.ai.timeout,
+            connection_limit=config.ai.connection_limit,
+            keepalive_timeout=config.ai.keepalive_timeout,
+            stream=config.ai.stream,
+            stream_read_timeout=config.ai.stream_read_timeout,
+            hedge=HedgePolicy(
+                min_delay=config.ai.hedge_min_delay, max_ratio=config.ai.hedge_max_ratio
+            ) if config.ai.hedge else None,
+            breaker=CircuitBreaker(
+                failure_threshold=config.ai.breaker_failures,
+                recovery_time=config.ai.breaker_recovery,
+                probe_timeout=config.ai.timeout,
+            ) if config.ai.breaker_failures > 0 else None,
+            prompt_builder=prompt_builder,
+            metrics=metrics,
+        )
+        await llm.start()
+        if prompt_builder is not None:
+            await prompt_builder.start()
+
+        # Те же компоненты, что собирает main.py; кеш переводов — только в памяти, чтобы не трогать рабочее хранилище
+        scheduler = None
+        if config.scheduler.enabled:
+            scheduler = WorkScheduler(
+                workers=config.scheduler.workers,
+                max_queue=config.scheduler.queue_size,
+                max_per_user=config.scheduler.user_queue_size,
+                llm_concurrency=config.scheduler.llm_concurrency,
+                llm_rate=config.scheduler.llm_rate,
+                llm_burst=config.scheduler.llm_burst,
+                db_concurrency=min(config.scheduler.db_concurrency, config.db.pool.max_size),
+            )
+            scheduler.attach(metrics)
+            llm.rate_limit = scheduler.llm.bucket
+        workflow_data = dict(
+            pipeline=QueryPipeline(
+                pool=pool,
+                llm=llm,
+                translation_cache=TranslationCache(
+                    max_size=config.translation_cache.max_size, ttl=config.translation_cache.ttl
+                ),
+                rewriter=SargableRewriter(timezone=config.db.timezone),
+                guard=QueryGuard(
+                    statement_timeout_ms=config.query_guard.statement_timeout_ms,
+                    work_mem=config.query_guard.work_mem,
+                    explain=config.query_guard.explain,
+                    max_cost=config.query_guard.max_cost,
+                    max_rows=config.query_guard.max_rows,
+                    record_rejected=config.query_guard.record_rejected,
+                ),
+                result_cache=ResultCache(
+                    max_size=config.result_cache.max_size, version_ttl=config.result_cache.version_ttl
+                ) if config.result_cache.max_size > 0 else None,
+                intents=IntentMatcher(default_year=config.intents.default_year) if config.intents.enabled else None,
+                llm_flights=(
+                    SingleFlight(timeout=config.singleflight.llm_timeout) if config.singleflight.enabled else None
+                ),
+                db_flights=SingleFlight(timeout=config.singleflight.db_timeout) if config.singleflight.enabled else None,
+                scheduler=scheduler,
+                metrics=metrics,
+                prompt_builder=prompt_builder,
+                columnar=columnar,
+            ),
+            splitter=QuestionSplitter(max_questions=config.batch.max_questions) if config.batch.enabled else None,
+            startup=None,
+        )
+
+        session = CaptureSession()
+        bot = Bot(token="42:bench", session=session)
+        dp = Dispatcher()
+        dp.include_router(query_router)
+
+        peaks = {"server_connections": 0, "server_active": 0, "pool_in_use": 0, "pool_waiting": 0}
+        sampler = asyncio.create_task(sample_connections(admin, db_name, pool, peaks))
+        try:
+            logger.info("Прогон: %d сообщений, до %d одновременно", args.messages, args.concurrency)
+            run = await drive(dp, bot, args, workflow_data)
+        finally:
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+
+        replies = [text for _, text in session.sent]
+        result = {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "params": {
+                "messages": args.messages,
+                "concurrency": args.concurrency,
+                "users": args.users,
+                "unique": args.unique,
+                "llm_latency_ms": args.llm_latency,
+                "llm_jitter_ms": args.llm_jitter,
+                "videos": args.videos,
+                "snapshots_per_video": args.snapshots,
+                "pool_max_size": config.db.pool.max_size,
+                "seed": args.seed,
+            },
+            **run,
+            "replies": len(replies),
+            "error_replies": sum(1 for text in replies if text.startswith(("❌", "⏳", "🔌"))),
+            "llm_requests": stub.requests,
+            "db_connections": {**peaks, "opened": pool.get_stats().get("connections_num", 0)},
+            "stages": metrics.stats()["stages"],
+            "counters": metrics.stats()["counters"],
+            "llm": llm.stats(),
+            "columnar": columnar.stats() if columnar is not None else None,
+        }
+
+        print(json.dumps({key: result[key] for key in (
+            "throughput_msgs_per_s", "latency_ms", "failures", "error_replies", "llm_requests", "db_connections",
+        )}, ensure_ascii=False, indent=2))
+
+        output = args.output or os.path.join("benchmarks", "results", f"e2e_{result['commit'] or 'local'}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результат сохранён в {output}")
+
+        if args.baseline:
+            compare(result, args.baseline)
+
+        return 1 if run["failures"] else 0
+
+    finally:
+        await stub.close()
+        if llm is not None:
+            await llm.close()
+        if pool is not None:
+            await pool.close()
+        if columnar_path is not None:
+            shutil.rmtree(columnar_path, ignore_errors=True)
+        if not args.keep:
+            await drop_database(admin, db_name)
+        await admin.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный замер бота")
+    parser.add_argument("--messages", type=int, default=1000, help="всего сообщений")
+    parser.add_argument("--concurrency", type=int, default=50, help="сообщений в обработке одновременно")
+    parser.add_argument("--users", type=int, default=100, help="число разных пользователей")
+    parser.add_argument("--unique", action="store_true", help="делать каждый вопрос уникальным (холодные кеши)")
+    parser.add_argument("--llm-latency", type=float, default=500.0, help="средняя задержка заглушки LLM, мс")
+    parser.add_argument("--llm-jitter", type=float, default=200.0, help="разброс задержки заглушки LLM, ± мс")
+    parser.add_argument("--videos", type=int, default=20000, help="видео в засеянной базе")
+    parser.add_argument("--snapshots", type=int, default=48, help="снапшотов на видео")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора вопросов и задержек")
+    parser.add_argument("--db", help="имя базы для замера (по умолчанию <POSTGRES_DB>_e2e_bench)")
+    parser.add_argument("--keep", action="store_true", help="не удалять базу после замера")
+    parser.add_argument("--output", help="путь к JSON с результатом")
+    parser.add_argument("--baseline", help="JSON предыдущего замера для сравнения")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Построчные логи хэндлера на каждое сообщение искажали бы замер
+    for name in ("bot", "infrastructure", "aiogram"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    sys.exit(asyncio.run(main(get_config(), parse_args())))
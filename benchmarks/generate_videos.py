@@ -0,0 +1,181 @@
+"""
+Детерминированный генератор синтетических данных в формате `videos.json`.
+
+Пишет `{"videos": [...]}` потоково, по одному видео за раз, поэтому размер файла не ограничен памятью.
+При одинаковых параметрах и `--seed` файл получается побайтно одинаковым.
+
+Для каждого видео генерируются снапшоты раз в час (с небольшим случайным сдвигом минут), начиная
+с `--start`; счётчики просмотров, лайков, комментариев и жалоб монотонно растут, поля `delta_*`
+равны разнице с предыдущим снапшотом, а итоговые счётчики видео равны последнему снапшоту.
+
+Запуск из корня репозитория:
+    python -m benchmarks.generate_videos videos_big.json --videos 100000 --snapshots 48 --creators 500
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, TextIO
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START = "2025-11-26T00:00:00+00:00"
+# Видео опубликованы за это число дней до первого снапшота
+PUBLISHED_WITHIN_DAYS = 180
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _iso(value: datetime) -> str:
+    return value.isoformat()
+
+
+def iter_videos(
+    *,
+    videos: int,
+    snapshots: int,
+    creators: int,
+    seed: int = 1,
+    start: datetime,
+) -> Iterator[Dict[str, Any]]:
+    """Генерирует видео со снапшотами; каждое видео создаётся и отдаётся по одному."""
+    rng = random.Random(seed)
+    # Идентификаторы креаторов — 32 шестнадцатеричных символа, как в выгрузке
+    creator_ids = [uuid.UUID(int=rng.getrandbits(128)).hex for _ in range(creators)]
+
+    for _ in range(videos):
+        video_id = _uuid(rng)
+        created_at = start - timedelta(seconds=rng.randrange(1, PUBLISHED_WITHIN_DAYS * 86400))
+
+        # Популярность распределена с тяжёлым хвостом: большинство видео набирает мало просмотров
+        popularity = rng.paretovariate(1.5)
+        like_rate = rng.uniform(0.01, 0.08)
+        comment_rate = rng.uniform(0.001, 0.01)
+
+        views = int(popularity * rng.uniform(50, 500))
+        likes = int(views * like_rate)
+        comments = int(views * comment_rate)
+        reports = 0
+
+        snapshot_list = []
+        for hour in range(snapshots):
+            previous = (views, likes, comments, reports)
+            # Прирост затухает со временем и иногда равен нулю
+            if rng.random() < 0.85:
+                views += int(popularity * rng.expovariate(1 / 40) / (1 + hour / 24))
+                likes = max(likes, int(views * like_rate))
+                comments = max(comments, int(views * comment_rate))
+                if rng.random() < 0.01:
+                    reports += 1
+
+            snapshot_at = start + timedelta(hours=hour, minutes=rng.randrange(0, 5), seconds=rng.randrange(0, 60))
+            snapshot_list.append({
+                "id": _uuid(rng),
+                "video_id": video_id,
+                "views_count": views,
+                "likes_count": likes,
+                "comments_count": comments,
+                "reports_count": reports,
+                "delta_views_count": views - previous[0],
+                "delta_likes_count": likes - previous[1],
+                "delta_comments_count": comments - previous[2],
+                "delta_reports_count": reports - previous[3],
+                "created_at": _iso(snapshot_at),
+                "updated_at": _iso(snapshot_at),
+            })
+
+        updated_at = start + timedelta(hours=max(snapshots - 1, 0))
+        yield {
+            "id": video_id,
+            "creator_id": rng.choice(creator_ids),
+            "video_created_at": _iso(created_at),
+            "views_count": views,
+            "likes_count": likes,
+            "comments_count": comments,
+            "reports_count": reports,
+            "created_at": _iso(created_at),
+            "updated_at": _iso(updated_at),
+            "snapshots": snapshot_list,
+        }
+
+
+def write_videos(out: TextIO, records: Iterator[Dict[str, Any]]) -> int:
+    """Пишет `{"videos": [...]}` по одной записи; возвращает число записанных видео."""
+    count = 0
+    out.write('{"videos": [\n')
+    for record in records:
+        if count:
+            out.write(",\n")
+        out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        count += 1
+    out.write("\n]}\n")
+    return count
+
+
+def generate(
+    path: str,
+    *,
+    videos: int,
+    snapshots: int,
+    creators: int,
+    seed: int = 1,
+    start: str = DEFAULT_START,
+) -> Dict[str, Any]:
+    """Генерирует файл `path` и возвращает его описание: число строк и размер в байтах."""
+    started = time.perf_counter()
+    records = iter_videos(
+        videos=videos,
+        snapshots=snapshots,
+        creators=creators,
+        seed=seed,
+        start=datetime.fromisoformat(start).astimezone(timezone.utc),
+    )
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        write_videos(f, records)
+
+    info = {
+        "path": path,
+        "videos": videos,
+        "snapshots": videos * snapshots,
+        "rows": videos * (snapshots + 1),
+        "bytes": os.path.getsize(path),
+        "seed": seed,
+    }
+    logger.info(
+        "Сгенерирован %s: %d видео, %d снапшотов, %.1f МБ за %.1f с",
+        path, videos, videos * snapshots, info["bytes"] / 2**20, time.perf_counter() - started,
+    )
+    return info
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерация синтетического videos.json")
+    parser.add_argument("path", help="куда записать файл")
+    parser.add_argument("--videos", type=int, default=10000, help="число видео")
+    parser.add_argument("--snapshots", type=int, default=24, help="снапшотов на видео (раз в час)")
+    parser.add_argument("--creators", type=int, default=200, help="число креаторов")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора")
+    parser.add_argument("--start", default=DEFAULT_START, help="время первого снапшота (ISO 8601)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = parse_args()
+    if min(args.videos, args.snapshots, args.creators) <= 0:
+        sys.exit("--videos, --snapshots and --creators must be positive")
+    generate(
+        args.path,
+        videos=args.videos,
+        snapshots=args.snapshots,
+        creators=args.creators,
+        seed=args.seed,
+        start=args.start,
+    )
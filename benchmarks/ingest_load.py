@@ -0,0 +1,216 @@
+"""
+Замер загрузки данных `infrastructure/load_data/load_data.py` на нескольких масштабах.
+
+Для каждого масштаба (`--scales`, число видео) генерируется детерминированный файл
+(`benchmarks.generate_videos`), и для каждой комбинации `--modes` x `--methods`:
+  1. создаётся чистая база (`<POSTGRES_DB>_ingest_bench`) и накатывается миграция;
+  2. загрузчик запускается отдельным процессом с LOAD_MODE/LOAD_METHOD/LOAD_DATA_PATH;
+     режимы full, stream и chunked пишут через `upsert_videos_and_snapshots`, parallel — через `upsert_rows`;
+  3. замеряются общее время (включая запуск интерпретатора), строк в секунду, пиковый RSS процесса загрузчика
+     (вместе с его воркерами, через wait4), объём WAL по разнице `pg_current_wal_lsn()` и размер базы.
+
+WAL считается по всему кластеру: параллельная активность в других базах попадёт в замер.
+Результат печатается таблицей и сохраняется в JSON (`--output`).
+
+Запуск из корня репозитория:
+    python -m benchmarks.ingest_load --scales 1000,10000,100000 --snapshots 24 --methods executemany,copy
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from psycopg import AsyncConnection
+
+from benchmarks.bench_db import (
+    admin_connection,
+    drop_database,
+    git_commit,
+    recreate_database,
+    run_migration,
+    subprocess_env,
+)
+from benchmarks.generate_videos import generate
+from config.config import Config, get_config
+from infrastructure.database.connection import build_pg_conninfo
+
+logger = logging.getLogger(__name__)
+
+
+def run_loader(env: Dict[str, str]) -> tuple[int, int]:
+    """Запускает загрузчик и ждёт его; возвращает код завершения и пиковый RSS в КБ (Linux)."""
+    proc = subprocess.Popen([sys.executable, "-m", "infrastructure.load_data.load_data"], env=env)
+    # wait4 возвращает ресурсы именно этого процесса и дождавшихся его потомков (воркеров parallel)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_maxrss
+
+
+async def wal_lsn(admin: AsyncConnection) -> str:
+    cur = await admin.execute("SELECT pg_current_wal_lsn()::text")
+    return (await cur.fetchone())[0]
+
+
+async def table_counts(config: Config, db_name: str) -> Dict[str, int]:
+    conninfo = build_pg_conninfo(db_name, config.db.host, config.db.port, config.db.user, config.db.password)
+    async with await AsyncConnection.connect(conninfo) as connection:
+        cur = await connection.execute(
+            "SELECT (SELECT count(*) FROM videos), (SELECT count(*) FROM video_snapshots), pg_database_size(current_database())"
+        )
+        videos, snapshots, size = await cur.fetchone()
+    return {"videos": videos, "snapshots": snapshots, "db_bytes": size}
+
+
+async def measure(
+    config: Config,
+    admin: AsyncConnection,
+    db_name: str,
+    data: Dict[str, Any],
+    mode: str,
+    method: str,
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    await recreate_database(admin, db_name)
+    await asyncio.to_thread(run_migration, db_name)
+
+    overrides = {"LOAD_DATA_PATH": data["path"], "LOAD_MODE": mode, "LOAD_METHOD": method}
+    if args.batch_size:
+        overrides["LOAD_BATCH_SIZE"] = str(args.batch_size)
+    if args.workers:
+        overrides["LOAD_WORKERS"] = str(args.workers)
+    if not args.verbose:
+        overrides["LOG_LEVEL"] = "WARNING"
+
+    lsn_before = await wal_lsn(admin)
+    started = time.perf_counter()
+    returncode, peak_rss_kb = await asyncio.to_thread(run_loader, subprocess_env(db_name, **overrides))
+    elapsed = time.perf_counter() - started
+    lsn_after = await wal_lsn(admin)
+
+    cur = await admin.execute("SELECT pg_wal_lsn_diff(%s::pg_lsn, %s::pg_lsn)", (lsn_after, lsn_before))
+    wal_bytes = int((await cur.fetchone())[0])
+    counts = await table_counts(config, db_name) if returncode == 0 else {}
+
+    return {
+        "videos": data["videos"],
+        "rows": data["rows"],
+        "file_bytes": data["bytes"],
+        "mode": mode,
+        "method": method,
+        "returncode": returncode,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(data["rows"] / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "wal_mb": round(wal_bytes / 2**20, 2),
+        "wal_bytes_per_row": round(wal_bytes / data["rows"], 1) if data["rows"] else None,
+        **counts,
+    }
+
+
+def print_table(runs: List[Dict[str, Any]]) -> None:
+    header = f"{'видео':>9} {'строк':>10} {'режим':>9} {'метод':>11} {'время, с':>9} {'строк/с':>10} {'RSS, МБ':>8} {'WAL, МБ':>9}"
+    print(header)
+    print("-" * len(header))
+    for run in runs:
+        status = "" if run["returncode"] == 0 else f"  ошибка (код {run['returncode']})"
+        print(
+            f"{run['videos']:>9} {run['rows']:>10} {run['mode']:>9} {run['method']:>11} "
+            f"{run['elapsed_s']:>9.2f} {run['rows_per_s'] or 0:>10.0f} {run['peak_rss_mb']:>8.1f} {run['wal_mb']:>9.1f}{status}"
+        )
+
+
+async def main(config: Config, args: argparse.Namespace) -> int:
+    db_name = args.db or f"{config.db.name}_ingest_bench"
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ingest_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    admin = await admin_connection(config)
+    runs: List[Dict[str, Any]] = []
+
+    try:
+        for videos in args.scales:
+            path = os.path.join(workdir, f"videos_{videos}x{args.snapshots}_c{args.creators}_s{args.seed}.json")
+            if os.path.exists(path) and args.reuse_files:
+                data = {
+                    "path": path,
+                    "videos": videos,
+                    "rows": videos * (args.snapshots + 1),
+                    "bytes": os.path.getsize(path),
+                }
+            else:
+                data = await asyncio.to_thread(
+                    generate, path, videos=videos, snapshots=args.snapshots, creators=args.creators, seed=args.seed
+                )
+
+            for mode in args.modes:
+                for method in args.methods:
+                    logger.info("Загрузка %d видео (%s, %s)...", videos, mode, method)
+                    run = await measure(config, admin, db_name, data, mode, method, args)
+                    runs.append(run)
+                    logger.info("Готово за %.1f с, %.0f строк/с", run["elapsed_s"], run["rows_per_s"] or 0)
+
+            if not args.reuse_files:
+                os.remove(path)
+    finally:
+        if not args.keep:
+            await drop_database(admin, db_name)
+        await admin.close()
+
+    print_table(runs)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {
+            "scales": args.scales,
+            "snapshots_per_video": args.snapshots,
+            "creators": args.creators,
+            "seed": args.seed,
+            "batch_size": args.batch_size or config.load.batch_size,
+            "workers": args.workers or config.load.workers,
+        },
+        "runs": runs,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"ingest_{result['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результат сохранён в {output}")
+
+    return 1 if any(run["returncode"] != 0 for run in runs) else 0
+
+
+def _list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Замер загрузки данных на нескольких масштабах")
+    parser.add_argument("--scales", type=lambda v: [int(x) for x in _list(v)], default=[1000, 10000, 100000],
+                        help="числа видео через запятую")
+    parser.add_argument("--snapshots", type=int, default=24, help="снапшотов на видео")
+    parser.add_argument("--creators", type=int, default=200, help="число креаторов")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора данных")
+    parser.add_argument("--modes", type=_list, default=["stream"], help="LOAD_MODE через запятую")
+    parser.add_argument("--methods", type=_list, default=["executemany", "copy"], help="LOAD_METHOD через запятую")
+    parser.add_argument("--batch-size", type=int, default=0, help="LOAD_BATCH_SIZE (0 — из настроек)")
+    parser.add_argument("--workers", type=int, default=0, help="LOAD_WORKERS для режима parallel (0 — из настроек)")
+    parser.add_argument("--workdir", help="каталог для сгенерированных файлов (по умолчанию временный)")
+    parser.add_argument("--reuse-files", action="store_true",
+                        help="не удалять сгенерированные файлы и использовать уже существующие")
+    parser.add_argument("--db", help="имя базы для замера (по умолчанию <POSTGRES_DB>_ingest_bench)")
+    parser.add_argument("--keep", action="store_true", help="не удалять базу после замера")
+    parser.add_argument("--verbose", action="store_true", help="не приглушать логи загрузчика")
+    parser.add_argument("--output", help="путь к JSON с результатом")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    sys.exit(asyncio.run(main(get_config(), parse_args())))
@@ -0,0 +1,197 @@
+"""
+Сравнение планов запросов до и после `SargableRewriter` на засеянной базе.
+
+Скрипт в одной транзакции создаёт временную схему с таблицами `videos` и `video_snapshots`
+(те же индексы, что и в миграции), заполняет её синтетическими данными, выполняет ANALYZE
+и для каждого запроса корпуса печатает способ доступа к таблицам до и после переписывания,
+а также проверяет, что результаты совпадают. В конце транзакция откатывается —
+рабочие таблицы не затрагиваются.
+
+Запуск из корня репозитория:
+    python -m benchmarks.sql_rewrite_plans [videos] [snapshots_per_video]
+"""
+import asyncio
+import logging
+import sys
+import time
+from typing import Any, List, Set
+
+from psycopg import AsyncCursor
+
+from config.config import Config, get_config
+from infrastructure.database.connection import create_pg_pool
+from infrastructure.database.sql_rewriter import SargableRewriter
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "sql_rewrite_bench"
+
+# Запросы в том виде, в каком их пишет LLM по промпту
+CORPUS = [
+    "SELECT COUNT(*) FROM video_snapshots WHERE created_at::date = '2025-12-28'",
+    "SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots WHERE DATE(created_at) = '2025-12-28'",
+    "SELECT COUNT(DISTINCT video_id) FROM video_snapshots "
+    "WHERE created_at::date BETWEEN '2025-12-26' AND '2025-12-27' AND delta_views_count > 0",
+    "SELECT COUNT(*) FROM video_snapshots WHERE created_at::date >= '2025-12-30'",
+    "SELECT COUNT(*) FROM videos WHERE video_created_at::date = '2025-11-01'",
+    "SELECT COUNT(*) FROM videos WHERE CAST(video_created_at AS DATE) < DATE '2025-09-05'",
+    "SELECT COUNT(*) FROM videos WHERE date_trunc('month', video_created_at) = '2025-10-01'",
+    "SELECT COUNT(*) FROM video_snapshots WHERE date_trunc('day', created_at) = '2025-12-25'",
+    "SELECT COUNT(*) FROM videos "
+    "WHERE EXTRACT(YEAR FROM video_created_at) = 2025 AND EXTRACT(MONTH FROM video_created_at) = 9",
+    "SELECT COUNT(*) FROM videos WHERE to_char(video_created_at, 'YYYY-MM') = '2025-07'",
+    "SELECT COALESCE(SUM(s.delta_likes_count), 0) FROM video_snapshots s "
+    "JOIN videos v ON v.id = s.video_id "
+    "WHERE v.creator_id = 'creator_7' AND s.created_at::date = '2025-12-30'",
+]
+
+SCHEMA_DDL = f"""
+CREATE SCHEMA {SCHEMA};
+SET LOCAL search_path TO {SCHEMA}, public;
+
+CREATE TABLE videos (
+    id UUID PRIMARY KEY,
+    creator_id TEXT NOT NULL,
+    video_created_at TIMESTAMPTZ NOT NULL,
+    views_count BIGINT,
+    likes_count BIGINT,
+    comments_count BIGINT,
+    reports_count BIGINT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE video_snapshots (
+    id UUID PRIMARY KEY,
+    video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    views_count BIGINT,
+    likes_count BIGINT,
+    comments_count BIGINT,
+    reports_count BIGINT,
+    delta_views_count BIGINT,
+    delta_likes_count BIGINT,
+    delta_comments_count BIGINT,
+    delta_reports_count BIGINT,
+    created_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+"""
+
+INDEXES_DDL = """
+CREATE INDEX idx_video_snapshots_video_id ON video_snapshots(video_id);
+CREATE INDEX idx_video_snapshots_created_at ON video_snapshots(created_at);
+CREATE INDEX idx_video_snapshots_video_id_created_at ON video_snapshots(video_id, created_at);
+CREATE INDEX idx_videos_creator_id ON videos(creator_id);
+CREATE INDEX idx_videos_video_created_at ON videos(video_created_at);
+"""
+
+
+# Функция, заполняющая временную схему: видео за полгода и снапшоты каждые 6 часов в конце декабря
+async def seed(cur: AsyncCursor, videos: int, snapshots_per_video: int) -> None:
+    await cur.execute(SCHEMA_DDL)
+    await cur.execute(
+        """
+        INSERT INTO videos (id, creator_id, video_created_at, views_count, likes_count, comments_count, reports_count)
+        SELECT gen_random_uuid(),
+               'creator_' || (g %% 50),
+               TIMESTAMPTZ '2025-06-01 00:00:00+00' + (g * INTERVAL '1 second' * (15552000 / %(videos)s)),
+               g * 10, g, g / 10, 0
+        FROM generate_series(1, %(videos)s) AS g;
+        """,
+        {"videos": videos},
+    )
+    await cur.execute(
+        """
+        INSERT INTO video_snapshots (
+            id, video_id,
+            views_count, likes_count, comments_count, reports_count,
+            delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+            created_at
+        )
+        SELECT gen_random_uuid(), v.id,
+               n * 10, n, n / 10, 0,
+               10, 1, (n %% 10 = 0)::int, 0,
+               TIMESTAMPTZ '2025-12-31 23:00:00+00' - (n * INTERVAL '6 hours') - (random() * INTERVAL '59 minutes')
+        FROM videos v, generate_series(1, %s) AS n;
+        """,
+        (snapshots_per_video,),
+    )
+    await cur.execute(INDEXES_DDL)
+    await cur.execute("ANALYZE videos; ANALYZE video_snapshots;")
+
+
+# Функция, собирающая способы доступа к таблицам из JSON-плана
+def scan_nodes(plan: dict) -> Set[str]:
+    nodes = set()
+    if "Relation Name" in plan:
+        nodes.add(f"{plan['Node Type']} on {plan['Relation Name']}")
+    for child in plan.get("Plans", []):
+        nodes |= scan_nodes(child)
+    return nodes
+
+
+async def explain(cur: AsyncCursor, query: str) -> tuple[Set[str], float]:
+    await cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+    plan = (await cur.fetchone())[0][0]["Plan"]
+    return scan_nodes(plan), plan["Total Cost"]
+
+
+async def timed(cur: AsyncCursor, query: str) -> tuple[Any, float]:
+    started = time.perf_counter()
+    await cur.execute(query)
+    result = (await cur.fetchone())[0]
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def main(config: Config, videos: int, snapshots_per_video: int) -> int:
+    rewriter = SargableRewriter(timezone=config.db.timezone)
+    pool = await create_pg_pool(
+        db_name=config.db.name,
+        host=config.db.host,
+        port=config.db.port,
+        user=config.db.user,
+        password=config.db.password,
+        min_size=1,
+        max_size=1,
+        timeout=config.db.pool.timeout,
+        check=config.db.pool.check,
+        timezone=config.db.timezone,
+    )
+    mismatches: List[str] = []
+
+    try:
+        async with pool.connection() as connection:
+            async with connection.cursor() as cur:
+                logger.info("Заполнение схемы %s: %d видео x %d снапшотов", SCHEMA, videos, snapshots_per_video)
+                await seed(cur, videos, snapshots_per_video)
+
+                for query in CORPUS:
+                    rewritten, rules = rewriter.rewrite(query)
+                    before_nodes, before_cost = await explain(cur, query)
+                    after_nodes, after_cost = await explain(cur, rewritten)
+                    before_result, before_ms = await timed(cur, query)
+                    after_result, after_ms = await timed(cur, rewritten)
+
+                    print(query)
+                    print(f"  правила: {', '.join(rules) or '—'}")
+                    print(f"  до:    {'; '.join(sorted(before_nodes))} (cost {before_cost:.0f}, {before_ms:.1f} мс)")
+                    print(f"  после: {'; '.join(sorted(after_nodes))} (cost {after_cost:.0f}, {after_ms:.1f} мс)")
+                    if before_result != after_result:
+                        mismatches.append(query)
+                        print(f"  РЕЗУЛЬТАТ ИЗМЕНИЛСЯ: {before_result} -> {after_result}")
+                    print()
+
+            # Схема с данными существовала только внутри транзакции
+            await connection.rollback()
+    finally:
+        await pool.close()
+
+    print(f"Переписано {rewriter.stats()['rewritten']} из {len(CORPUS)} запросов, расхождений: {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    videos_arg = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    snapshots_arg = int(sys.argv[2]) if len(sys.argv) > 2 else 48
+    sys.exit(asyncio.run(main(get_config(), videos_arg, snapshots_arg)))
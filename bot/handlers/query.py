@@ -1,34 +1,136 @@
 import logging
+import time
+from contextlib import nullcontext
+from typing import Any, Hashable, List
 
 from aiogram import Router, F
 from aiogram.types import Message
 
-from bot.services.llm import get_sql_query
-from infrastructure.database.query_executor_db import execute_scalar_query
+from bot.services.batch import QuestionSplitter, TooManyQuestionsError
+from bot.services.llm import LLMError, LLMTimeoutError, LLMUnavailableError
+from bot.services.pipeline import QueryPipeline, ResolvedQuery
+from bot.services.scheduler import SchedulerBusyError
+from infrastructure.database.query_guard import QueryRejectedError
+from infrastructure.monitoring.metrics import Metrics, new_trace_id
+from infrastructure.monitoring.startup import StartupTimer
 
 query_router = Router()
 logger = logging.getLogger(__name__)
 
 
 @query_router.message(F.text, ~F.command)
-async def handle_text_query(message: Message):
+async def handle_text_query(
+    message: Message,
+    pipeline: QueryPipeline,
+    splitter: QuestionSplitter | None,
+    startup: StartupTimer | None,
+):
     user_query = message.text.strip()
+    # Все записи лога, относящиеся к этому сообщению, получают общий идентификатор
+    new_trace_id()
+    user_id = message.from_user.id if message.from_user else message.chat.id
+    metrics = pipeline.metrics
+
+    # Без планировщика сообщения принимаются без очереди
+    admission = pipeline.scheduler.admit(user_id) if pipeline.scheduler is not None else nullcontext()
+
+    async def reply(text: str) -> None:
+        started = time.perf_counter()
+        try:
+            await message.answer(text)
+        finally:
+            if metrics is not None:
+                metrics.observe("telegram_send", time.perf_counter() - started)
+        if startup is not None:
+            startup.answered()
 
     try:
-        # Генерация SQL через LLM
-        sql = await get_sql_query(user_query)
-        logger.info("Сгенерирован SQL для '%s': %s", user_query, sql)
+        questions = splitter.split(user_query) if splitter is not None else [user_query]
 
-        # Выполнение запроса
-        result = await execute_scalar_query(sql)
+        async with admission:
+            # Несколько вопросов в одном сообщении отвечаются одним вызовом LLM и одним запросом к БД
+            if len(questions) > 1:
+                await reply(await _answer_batch(questions, pipeline, user_id))
+                return
 
-        if result is None:
-            answer = "0"
-        else:
-            answer = str(result)
+            started = time.perf_counter()
+            result = await pipeline.execute(await pipeline.resolve(user_query), user_id)
+            logger.info("Вопрос '%s' отвечен за %.1f мс", user_query, (time.perf_counter() - started) * 1000)
+            await reply(_format_value(result))
 
-        await message.answer(answer)
+    except TooManyQuestionsError as e:
+        await reply(f"✂️ В сообщении {e.count} вопросов, а за раз я отвечаю не больше чем на {e.limit}. Раздели их, пожалуйста.")
 
     except Exception as e:
-        logger.error("Ошибка при обработке запроса '%s': %s", user_query, e)
-        await message.answer("❌ Не удалось обработать запрос. Попробуй переформулировать.")
\ No newline at end of file
+        await reply(_error_reply(user_query, e, metrics))
+
+
+async def _answer_batch(questions: List[str], pipeline: QueryPipeline, user_id: Hashable | None = None) -> str:
+    """
+    Отвечает на несколько вопросов сразу: шаблоны и кеш переводов — для каждого вопроса,
+    один вызов LLM на все оставшиеся вопросы и один запрос к БД на все SQL.
+    Возвращает общий ответ: по строке на вопрос.
+    """
+    started = time.perf_counter()
+    # Для каждого вопроса: SQL, число или исключение, из-за которого ответа не будет
+    answers: List[Any] = [await pipeline.lookup(question) for question in questions]
+
+    missing = [i for i, resolved in enumerate(answers) if resolved is None]
+    if missing:
+        try:
+            translated = await pipeline.translate_many([questions[i] for i in missing])
+        except Exception as e:
+            logger.error("Не удалось получить SQL для %d вопросов: %s", len(missing), e)
+            translated = [e] * len(missing)
+        for i, resolved in zip(missing, translated):
+            answers[i] = resolved
+
+    positions = [i for i, resolved in enumerate(answers) if isinstance(resolved, ResolvedQuery)]
+    values = await pipeline.execute_many([answers[i] for i in positions], user_id)
+    for i, value in zip(positions, values):
+        answers[i] = value
+
+    lines: List[str] = []
+    for i, (question, value) in enumerate(zip(questions, answers), 1):
+        if isinstance(value, Exception):
+            value = _error_reply(question, value, pipeline.metrics)
+        else:
+            value = _format_value(value)
+        lines.append(f"{i}. {question} — {value}")
+
+    logger.info(
+        "Пакет из %d вопросов отвечен за %.1f мс (через LLM: %d)",
+        len(questions), (time.perf_counter() - started) * 1000, len(missing),
+    )
+    return "\n".join(lines)
+
+
+def _format_value(value: Any) -> str:
+    return "0" if value is None else str(value)
+
+
+def _error_reply(question: str, error: Exception, metrics: Metrics | None) -> str:
+    """Пишет ошибку в лог и возвращает ответ пользователю; общий для одиночных вопросов и пакетов."""
+    if isinstance(error, SchedulerBusyError):
+        return "⏳ Сейчас слишком много запросов. Попробуй через минуту."
+
+    if isinstance(error, QueryRejectedError):
+        logger.warning("Запрос '%s' отклонён: %s", question, error.reason)
+        return "❌ Запрос получился слишком тяжёлым или недопустимым. Попробуй уточнить вопрос."
+
+    if isinstance(error, LLMUnavailableError):
+        logger.warning("Вопрос '%s' не отправлен в LLM: %s", question, error)
+        return "🔌 Сервис перевода вопросов в SQL временно недоступен. Попробуй через минуту."
+
+    if isinstance(error, LLMTimeoutError):
+        logger.warning("LLM не ответила вовремя на вопрос '%s'", question)
+        return "⏳ Модель не ответила вовремя. Попробуй ещё раз."
+
+    if isinstance(error, LLMError):
+        logger.error("Не удалось получить SQL для '%s': %s", question, error)
+        return "❌ Не удалось получить SQL от модели. Попробуй переформулировать."
+
+    if metrics is not None:
+        metrics.error("handler")
+    logger.error("Ошибка при обработке запроса '%s': %s", question, error)
+    return "❌ Не удалось обработать запрос. Попробуй переформулировать."
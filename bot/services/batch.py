@@ -0,0 +1,84 @@
+import logging
+import re
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Маркеры пунктов списка в начале строки: «1.», «2)», «-», «•», «*», «—»
+_LIST_MARKER_RE = re.compile(r"^\s*(?:\d{1,2}\s*[.)]|[-•*—–])\s+")
+# Граница между вопросами в одной строке: «?», затем следующий вопрос с заглавной буквы или цифры
+_INLINE_SPLIT_RE = re.compile(r"(?<=\?)\s+(?=[A-ZА-ЯЁ0-9«\"])")
+
+
+class TooManyQuestionsError(Exception):
+    """В сообщении больше вопросов, чем разрешено отвечать за раз."""
+
+    def __init__(self, count: int, limit: int) -> None:
+        super().__init__(f"{count} вопросов при лимите {limit}")
+        self.count = count
+        self.limit = limit
+
+
+class QuestionSplitter:
+    """
+    Разбивает сообщение на отдельные вопросы для пакетного ответа.
+
+    Вопросом считается каждый пункт списка или строка, заканчивающаяся «?», «.» или «!»
+    (строки без них склеиваются со следующими, маркеры «1.», «-», «•» отбрасываются),
+    а внутри строки — каждая часть, заканчивающаяся «?», если за ней начинается следующий вопрос.
+    Строки-заголовки, заканчивающиеся двоеточием («Отчёт за неделю:»), пропускаются.
+    Сообщение из одного вопроса возвращается как есть.
+    """
+
+    def __init__(self, max_questions: int = 10) -> None:
+        if max_questions < 2:
+            raise ValueError("max_questions must be at least 2")
+        self.max_questions = max_questions
+
+        self.messages = 0
+        self.batches = 0
+        self.questions = 0
+        self.rejected = 0
+
+    def split(self, text: str) -> List[str]:
+        self.messages += 1
+        # Строки без знака конца предложения склеиваются со следующими: вопрос мог быть перенесён
+        lines: List[str] = []
+        pending = ""
+        for raw in text.splitlines():
+            marker = _LIST_MARKER_RE.match(raw)
+            line = _LIST_MARKER_RE.sub("", raw).strip()
+            if (not line or marker) and pending:
+                lines.append(pending)
+                pending = ""
+            if not line or (line.endswith(":") and not pending):
+                continue
+            pending = f"{pending} {line}".strip()
+            if line.endswith(("?", ".", "!")):
+                lines.append(pending)
+                pending = ""
+        if pending:
+            lines.append(pending)
+
+        questions = [part.strip() for line in lines for part in _INLINE_SPLIT_RE.split(line) if part.strip()]
+
+        if len(questions) <= 1:
+            return [text.strip()]
+
+        if len(questions) > self.max_questions:
+            self.rejected += 1
+            raise TooManyQuestionsError(len(questions), self.max_questions)
+
+        self.batches += 1
+        self.questions += len(questions)
+        logger.info("Сообщение разбито на %d вопросов", len(questions))
+        return questions
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "batches": self.batches,
+            "questions": self.questions,
+            "avg_batch_size": round(self.questions / self.batches, 2) if self.batches else 0.0,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,232 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bot.services.normalizer import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Даты после normalize_question: 2025-12-01, xxxx-12-01, 2025-11, xxxx-11
+_DAY = r"(?:\d{4}|xxxx)-\d{2}-\d{2}"
+_MONTH = r"(?:\d{4}|xxxx)-\d{2}"
+_RANGE_RE = re.compile(
+    rf"\b(?:с|от|между)\s+(?P<start>{_DAY}|\d{{1,2}})\s+(?:по|до|и)\s+(?P<end>{_DAY})\b(?:\s+включительно)?"
+)
+_DAY_RE = re.compile(rf"\b{_DAY}\b")
+_MONTH_RE = re.compile(rf"\b{_MONTH}\b")
+_YEAR_RE = re.compile(r"\b(?P<year>\d{4})\s+(?:год|года|году|г)\b")
+
+# Креатор ищется в исходном тексте: идентификатор может быть чувствителен к регистру
+_CREATOR_RE = re.compile(
+    r"\b(?:креатор|автор)(?:а|у|ом|е)?\s+(?:с\s+)?(?:(?:id|ид|айди)\s*[:=]?\s*)?[\"'«]?(?P<id>[A-Za-z0-9_-]{6,})[\"'»]?",
+    re.IGNORECASE,
+)
+
+_METRICS = {
+    "views": re.compile(r"просмотр\w*"),
+    "likes": re.compile(r"лайк\w*"),
+    "comments": re.compile(r"комментари\w*|коммент\w*"),
+    "reports": re.compile(r"жалоб\w*|репорт\w*"),
+    "videos": re.compile(r"видео|ролик\w*"),
+}
+_PUBLISHED_RE = re.compile(r"вышл[ои]|вышел|опубликова\w*|выложи\w*|выложен\w*|загружен\w*|загрузил\w*|появил\w*")
+_GROWTH_RE = re.compile(r"вырос\w*|увеличил\w*|прирост\w*|прибавил\w*|прибавк\w*|набрал\w*")
+# Слова, которые не меняют смысла шаблонных вопросов; любое другое слово отправляет вопрос в LLM
+_FILLER = frozenset(
+    "сколько на какое каков каково какой количество число всего общее общий общая суммарно суммарное "
+    "сумма итого в во за у с по было были был всех все всем их его ее период периоде есть системе базе "
+    "<period> <creator>".split()
+)
+
+
+@dataclass
+class IntentMatch:
+    """Результат сопоставления вопроса с шаблоном: имя шаблона, SQL с параметрами и сами параметры."""
+    intent: str
+    sql: str
+    params: tuple
+
+
+def _resolve_day(text: str, default_year: int | None) -> Optional[date]:
+    year, month, day = text.split("-")
+    if year == "xxxx":
+        if default_year is None:
+            return None
+        year = str(default_year)
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+class IntentMatcher:
+    """
+    Быстрый путь для типовых вопросов без обращения к LLM.
+
+    Вопрос нормализуется (`normalize_question`), из него выделяются период (день, месяц,
+    диапазон «с ... по ...» или год) и идентификатор креатора, а оставшиеся слова должны
+    целиком состоять из известных: метрики (видео, просмотры, лайки, комментарии, жалобы),
+    глагола публикации или прироста и служебных слов. Тогда вопрос превращается в
+    параметризованный SQL по шаблону; всё остальное уходит в LLM.
+
+    Даты без года дополняются `default_year` (если он не задан, такие вопросы уходят в LLM).
+    Для отчёта об экономии хэндлер сообщает длительность обращений к LLM через `record_llm_latency`.
+    """
+
+    def __init__(self, *, default_year: int | None = None) -> None:
+        self.default_year = default_year
+
+        self.hits = 0
+        self.misses = 0
+        self.by_intent: Dict[str, int] = {}
+        self._llm_calls = 0
+        self._llm_seconds = 0.0
+
+    def _period(self, text: str) -> Tuple[str, Optional[Tuple[date, date]], bool]:
+        """Вырезает период из текста; третье значение — найден ли период, который не удалось разобрать."""
+        match = _RANGE_RE.search(text)
+        if match:
+            end = _resolve_day(match["end"], self.default_year)
+            start_text = match["start"]
+            if end is None:
+                return text, None, True
+            if "-" not in start_text:
+                start_text = f"{end.year:04d}-{end.month:02d}-{int(start_text):02d}"
+            elif start_text.startswith("xxxx"):
+                start_text = f"{end.year:04d}{start_text[4:]}"
+            start = _resolve_day(start_text, self.default_year)
+            if start is not None and start > end and match["start"].startswith("xxxx"):
+                start = start.replace(year=start.year - 1)
+            if start is None or start > end:
+                return text, None, True
+            return text[:match.start()] + "<period>" + text[match.end():], (start, end + timedelta(days=1)), False
+
+        match = _DAY_RE.search(text)
+        if match:
+            day = _resolve_day(match.group(), self.default_year)
+            if day is None:
+                return text, None, True
+            return text[:match.start()] + "<period>" + text[match.end():], (day, day + timedelta(days=1)), False
+
+        match = _MONTH_RE.search(text)
+        if match:
+            start = _resolve_day(f"{match.group()}-01", self.default_year)
+            if start is None:
+                return text, None, True
+            return text[:match.start()] + "<period>" + text[match.end():], (start, _next_month(start)), False
+
+        match = _YEAR_RE.search(text)
+        if match:
+            year = int(match["year"])
+            return text[:match.start()] + "<period>" + text[match.end():], (date(year, 1, 1), date(year + 1, 1, 1)), False
+
+        return text, None, False
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        result = self._match(question)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.by_intent[result.intent] = self.by_intent.get(result.intent, 0) + 1
+        return result
+
+    def _match(self, question: str) -> Optional[IntentMatch]:
+        creator_id = None
+        creator = _CREATOR_RE.search(question)
+        if creator:
+            creator_id = creator["id"]
+            if len(_CREATOR_RE.findall(question)) > 1:
+                return None
+
+        text = normalize_question(question)
+        if creator_id is not None:
+            text = _CREATOR_RE.sub("<creator>", text, count=1)
+
+        text, period, unparsed = self._period(text)
+        if unparsed:
+            return None
+
+        metrics: List[str] = []
+        published = growth = False
+        for word in text.split():
+            if word in _FILLER:
+                continue
+            metric = next((name for name, pattern in _METRICS.items() if pattern.fullmatch(word)), None)
+            if metric is not None:
+                metrics.append(metric)
+            elif _PUBLISHED_RE.fullmatch(word):
+                published = True
+            elif _GROWTH_RE.fullmatch(word):
+                growth = True
+            else:
+                return None
+
+        if len(set(metrics)) != 1 or (published and growth):
+            return None
+        metric = metrics[0]
+
+        conditions: List[str] = []
+        params: List = []
+        if period is not None:
+            conditions.append("day >= %s AND day < %s")
+            params.extend(period)
+
+        if growth:
+            if metric == "videos" or period is None:
+                return None
+            table = "daily_creator_stats" if creator_id is not None else "daily_video_stats"
+            if creator_id is not None:
+                conditions.append("creator_id = %s")
+                params.append(creator_id)
+            return IntentMatch(
+                intent=f"{metric}_growth",
+                sql=f"SELECT COALESCE(SUM(delta_{metric}_count), 0) FROM {table} WHERE {' AND '.join(conditions)}",
+                params=tuple(params),
+            )
+
+        if metric == "videos" and period is not None:
+            if creator_id is not None:
+                conditions.append("creator_id = %s")
+                params.append(creator_id)
+            return IntentMatch(
+                intent="videos_published",
+                sql="SELECT COALESCE(SUM(videos_count), 0) FROM daily_video_publications "
+                    f"WHERE {' AND '.join(conditions)}",
+                params=tuple(params),
+            )
+
+        # «Сколько просмотров в ноябре» можно понять и как прирост, и как итог — такое решает LLM
+        if period is not None or published:
+            return None
+
+        where, params = ("", ()) if creator_id is None else (" WHERE creator_id = %s", (creator_id,))
+        if metric == "videos":
+            return IntentMatch(intent="videos_total", sql=f"SELECT COUNT(*) FROM videos{where}", params=params)
+        return IntentMatch(
+            intent=f"{metric}_total",
+            sql=f"SELECT COALESCE(SUM({metric}_count), 0) FROM videos{where}",
+            params=params,
+        )
+
+    def record_llm_latency(self, seconds: float) -> None:
+        self._llm_calls += 1
+        self._llm_seconds += seconds
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        avg_llm = self._llm_seconds / self._llm_calls if self._llm_calls else None
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "by_intent": dict(self.by_intent),
+            "avg_llm_latency": avg_llm,
+            "latency_saved": self.hits * avg_llm if avg_llm is not None else None,
+        }
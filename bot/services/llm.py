@@ -1,69 +1,517 @@
 import asyncio
+import json
 import logging
-from typing import List, Dict
-import aiofiles
+import os
+import time
+from typing import Any, Callable, Dict, List
 
+import aiofiles
 import aiohttp
+from yarl import URL as YarlURL
 
-from config.config import Config, load_config
+from bot.services.prompt_builder import PromptBuilder
+from bot.services.resilience import CircuitBreaker, HedgePolicy
+from bot.services.scheduler import TokenBucket
+from infrastructure.monitoring.metrics import Metrics
 
 logger = logging.getLogger(__name__)
 
-config: Config = load_config()
-
 URL = "https://app.chipp.ai/api/v1/chat/completions"
-HEADERS = {
-    "Authorization": f"Bearer {config.ai.token}",
-    "Content-Type": "application/json"
-}
+MODEL = "newapplication-10028464"
+PROMPT_PATH = "prompt.txt"
+
+# Дополнение к промпту для нескольких вопросов в одном сообщении
+BATCH_INSTRUCTION = (
+    "Составь отдельный SQL-запрос для КАЖДОГО вопроса по правилам выше: правило про один запрос, "
+    "возвращающий ровно одно число, относится к каждому вопросу отдельно. "
+    "Ответь исключительно JSON-массивом строк — SQL-запросы в том же порядке, что и вопросы, "
+    "по одному элементу на вопрос, без пояснений."
+)
+
+
+class LLMError(Exception):
+    """Не удалось получить SQL от модели."""
+
+
+class LLMAPIError(LLMError):
+    """API модели ответило статусом, отличным от 200."""
+
+    def __init__(self, status: int, body: str) -> None:
+        super().__init__(f"Ошибка API: {status}")
+        self.status = status
+        self.body = body
+
+
+class LLMTimeoutError(LLMError):
+    """Модель не ответила за отведённое время или поток ответа остановился."""
+
+
+class LLMConnectionError(LLMError):
+    """Не удалось соединиться с API модели."""
+
+
+class LLMUnavailableError(LLMError):
+    """Цепь разомкнута после серии неудач: запрос к модели не отправлялся."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"API модели недоступно, повтор через {retry_after:.0f} с")
+        self.retry_after = retry_after
+
+
+class LLMResponseError(LLMError, ValueError):
+    """Ответ модели не удалось разобрать."""
+
+
+def _is_upstream_failure(error: BaseException) -> bool:
+    """Ошибки, которые говорят о проблемах на стороне API и учитываются размыкателем цепи."""
+    if isinstance(error, LLMAPIError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (LLMTimeoutError, LLMConnectionError))
+
+
+def strip_code_fence(content: str) -> str:
+    """Убирает обёртку блока кода (```sql ... ```), если модель её добавила."""
+    content = content.strip()
+    if content.startswith("```"):
+        # Берём середину между ``` и убираем язык блока в начале
+        content = content.split("```", 2)[1]
+        for language in ("sql", "json"):
+            if content.lstrip().startswith(language):
+                content = content.lstrip()[len(language):]
+                break
+    return content.strip()
+
+
+def _message_content(data: Dict[str, Any]) -> str:
+    """Текст ответа из обычного (не потокового) ответа chat-completions."""
+    try:
+        return data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError) as e:
+        raise LLMResponseError(f"В ответе API нет текста модели: {e!r}") from e
+
+
+def _delta_content(chunk: Dict[str, Any]) -> str:
+    """Очередная порция текста из события потока chat-completions (пустая строка, если текста нет)."""
+    choices = chunk.get("choices") or []
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") or choices[0].get("message") or {}
+    return delta.get("content") or ""
+
+
+def sql_statement_end(text: str) -> int:
+    """
+    Позиция сразу после первого завершённого SQL-запроса в ответе модели: после «;» вне строк
+    и комментариев или перед закрывающим ``` блока кода. -1, если запрос ещё не завершён.
+    """
+    fenced = text.lstrip().startswith("```")
+    i = text.index("```") + 3 if fenced else 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in ("'", '"'):
+            # Удвоенная кавычка внутри строки разбирается как две соседние строки — позиция конца та же
+            close = text.find(ch, i + 1)
+            if close < 0:
+                return -1
+            i = close + 1
+        elif text.startswith("--", i):
+            close = text.find("\n", i)
+            if close < 0:
+                return -1
+            i = close + 1
+        elif text.startswith("/*", i):
+            close = text.find("*/", i + 2)
+            if close < 0:
+                return -1
+            i = close + 2
+        elif ch == ";":
+            return i + 1
+        elif fenced and text.startswith("```", i):
+            return i
+        else:
+            i += 1
+    return -1
+
+
+def json_array_end(text: str) -> int:
+    """Позиция сразу после закрывающей скобки первого JSON-массива в тексте или -1, если массив не завершён."""
+    start = text.find("[")
+    if start < 0:
+        return -1
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def parse_sql_list(content: str, expected: int) -> List[str]:
+    """Разбирает ответ модели на несколько вопросов: JSON-массив из `expected` SQL-запросов."""
+    content = strip_code_fence(content)
+    start, end = content.find("["), content.rfind("]")
+    if start < 0 or end < start:
+        raise LLMResponseError("Ответ модели не содержит JSON-массива")
+    try:
+        queries = json.loads(content[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise LLMResponseError(f"Ответ модели не разбирается как JSON: {e}") from e
+
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        raise LLMResponseError("Ответ модели должен быть массивом строк")
+    if len(queries) != expected:
+        raise LLMResponseError(f"Модель вернула {len(queries)} SQL-запросов вместо {expected}")
+    return [strip_code_fence(query).rstrip(";").strip() for query in queries]
+
+
+class LLMClient:
+    """
+    Долгоживущий клиент Chipp.ai: одна HTTP-сессия с пулом keep-alive соединений
+    на всё время работы бота и промпт, закешированный в памяти.
+
+    Создаётся при старте (`start`) и закрывается при остановке (`close`).
+    Промпт перечитывается с диска только при изменении mtime файла.
+
+    Ответ запрашивается потоком (`stream=True`), и чтение прекращается, как только пришёл
+    завершённый SQL-запрос; если поток молчит дольше `stream_read_timeout` секунд, запрос
+    считается зависшим. Если API отвечает обычным JSON, он разбирается целиком.
+    С `hedge` медленный запрос дублируется после порога по p95; дубль тоже берёт токен из `rate_limit`
+    (ограничение частоты планировщика) и не отправляется, если токена нет. С `breaker` серия неудач
+    размыкает цепь, и запросы сразу завершаются ошибкой. Все ошибки — подклассы `LLMError`.
+    С `prompt_builder` вместо полного промпта отправляются компактная схема и похожие примеры.
+    """
 
+    def __init__(
+        self,
+        token: str,
+        *,
+        url: str = URL,
+        prompt_path: str = PROMPT_PATH,
+        timeout: float = 30.0,
+        connection_limit: int = 10,
+        keepalive_timeout: float = 60.0,
+        dns_cache_ttl: int = 300,
+        stream: bool = True,
+        stream_read_timeout: float = 10.0,
+        hedge: HedgePolicy | None = None,
+        rate_limit: TokenBucket | None = None,
+        breaker: CircuitBreaker | None = None,
+        prompt_builder: PromptBuilder | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
+        self.url = url
+        self.metrics = metrics
+        self.stream = stream
+        self.hedge = hedge
+        self.rate_limit = rate_limit
+        self.breaker = breaker
+        self.prompt_builder = prompt_builder
+        self.prompt_path = prompt_path
+        self._headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        # Для потока дополнительно ограничено ожидание каждой следующей порции данных
+        self._stream_timeout = aiohttp.ClientTimeout(total=timeout, sock_read=stream_read_timeout)
+        self._connection_limit = connection_limit
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+
+        self._session: aiohttp.ClientSession | None = None
+        self._prompt: str | None = None
+        self._prompt_mtime: float | None = None
+        self._prompt_lock = asyncio.Lock()
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_throttled = 0
+        self.early_stops = 0
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self._connection_limit,
+            limit_per_host=self._connection_limit,
+            ttl_dns_cache=self._dns_cache_ttl,
+            keepalive_timeout=self._keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            headers=self._headers,
+            timeout=self._timeout,
+            connector=connector,
+        )
+        await self.get_prompt()
+        logger.info("LLM client started (connection_limit=%d)", self._connection_limit)
+
+    async def warm_up(self, timeout: float = 5.0) -> bool:
+        """
+        Заранее открывает соединение с хостом модели (DNS, TCP, TLS), чтобы первый вопрос
+        после деплоя не ждал рукопожатия. Соединение остаётся в keep-alive пуле сессии.
+        Ошибка прогрева только логируется: бот стартует и без него.
+        """
+        await self.start()
+        origin = str(YarlURL(self.url).origin())
+        started = time.perf_counter()
+        try:
+            async with self._session.head(
+                origin, allow_redirects=False, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as resp:
+                # Ответ дочитывается, чтобы соединение вернулось в пул, а не закрылось
+                await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Не удалось прогреть соединение с %s: %s", origin, e or type(e).__name__)
+            return False
+        finally:
+            self._observe("llm_warmup", started)
+
+        logger.info("Соединение с %s прогрето за %.0f мс", origin, (time.perf_counter() - started) * 1000)
+        return True
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("LLM client closed")
+        self._session = None
+
+    async def get_prompt(self) -> str:
+        """Возвращает промпт из памяти, перечитывая файл только если изменился его mtime."""
+        mtime = os.stat(self.prompt_path).st_mtime
+        if self._prompt is not None and mtime == self._prompt_mtime:
+            return self._prompt
 
-async def get_sql_query(user_query: str,) -> str:
+        async with self._prompt_lock:
+            if self._prompt is None or mtime != self._prompt_mtime:
+                async with aiofiles.open(self.prompt_path, 'r', encoding="utf-8") as prompt_file:
+                    self._prompt = await prompt_file.read()
+                self._prompt_mtime = mtime
+                logger.info("Промпт загружен из %s", self.prompt_path)
 
-    async with aiofiles.open("prompt.txt", 'r', encoding="utf-8") as prompt_file:
-        prompt = await prompt_file.read()
+        return self._prompt
 
-        messages: List[Dict[str, str]] = [
-            {
-                "role": "user",
-                "content": f'{prompt}\n Запрос пользователя: {user_query}'
-                           f'Ответь исключительно SQL-кодом.'
-            }
-        ]
+    async def _prompt_for(self, questions: List[str]) -> str:
+        started = time.perf_counter()
+        if self.prompt_builder is not None:
+            prompt = await self.prompt_builder.build(questions)
+        else:
+            prompt = await self.get_prompt()
+        self._observe("prompt_load", started)
+        return prompt
+
+    async def _complete(self, content: str, end: Callable[[str], int] | None = None) -> str:
+        """
+        Отправляет один запрос chat-completions и возвращает текст ответа модели.
+        `end(text)` возвращает позицию конца готового ответа (или -1): поток дочитывается только до неё.
+        """
+        if self.breaker is not None and not self.breaker.allow():
+            if self.metrics is not None:
+                self.metrics.inc("circuit_rejections", stage="llm")
+            raise LLMUnavailableError(self.breaker.retry_after())
+
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        messages: List[Dict[str, str]] = [{"role": "user", "content": content}]
         payload = {
-            "model": "newapplication-10028464",
+            "model": MODEL,
             "messages": messages,
-            "stream": False,
+            "stream": self.stream,
             "temperature": 0.0,
         }
 
-        timeout = aiohttp.ClientTimeout(total=30)
+        try:
+            text = await self._request_hedged(payload, end)
+        except LLMError as e:
+            if self.breaker is not None:
+                if _is_upstream_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    # API ответило, пусть и ошибкой запроса: сервис жив
+                    self.breaker.record_success()
+            if self.metrics is not None:
+                if isinstance(e, LLMTimeoutError):
+                    self.metrics.timeout("llm")
+                else:
+                    self.metrics.error("llm")
+            raise
+
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return text
 
+    async def _request_hedged(self, payload: dict, end: Callable[[str], int] | None) -> str:
+        """Выполняет запрос; если он идёт дольше порога HedgePolicy, отправляет дубль и берёт первый успешный ответ."""
+        delay = self.hedge.delay() if self.hedge is not None else None
+        if delay is None:
+            return await self._request(payload, end)
+
+        tasks = [asyncio.ensure_future(self._request(payload, end))]
         try:
-            async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout) as session:
-                async with session.post(URL, json=payload) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        content = data["choices"][0]["message"]["content"].strip()
-
-                        # Удаляем возможные ```sql
-                        if content.startswith("```"):
-                            # Убираем блок кода
-                            content = content.split("```", 2)[1]  # берём середину между ```
-                            if content.lstrip().startswith("sql"):
-                                content = content[3:]  # убираем "sql" в начале
-
-                        content = content.strip()
-
-                        logger.info(f"Очищенный SQL: {content}")
-
-                        return content
-                    else:
-                        error = await resp.text()
-                        print(f"API Error {resp.status}: {error}")
-                        return f"Ошибка API: {resp.status}"
-        except asyncio.TimeoutError:
-            return "Таймаут запроса к Chipp.ai"
-        except Exception as e:
-            print(f"Неожиданная ошибка: {e}")
-            return "Внутренняя ошибка сервера"
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.hedge.acquire() and not self._hedge_throttled():
+                self.hedged += 1
+                if self.metrics is not None:
+                    self.metrics.inc("llm_hedges")
+                logger.info("Ответа модели нет дольше %.0f мс, отправлен дублирующий запрос", delay * 1000)
+                tasks.append(asyncio.ensure_future(self._request(payload, end)))
+
+            error: BaseException | None = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                            if self.metrics is not None:
+                                self.metrics.inc("llm_hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Проигравший (или брошенный при отмене) запрос не должен продолжать работу
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _hedge_throttled(self) -> bool:
+        # Дубль — такой же запрос к API и расходует ту же квоту частоты; ждать токен ему незачем
+        if self.rate_limit is None or self.rate_limit.try_acquire():
+            return False
+        self.hedges_throttled += 1
+        if self.metrics is not None:
+            self.metrics.inc("llm_hedges_throttled")
+        return True
+
+    async def _request(self, payload: dict, end: Callable[[str], int] | None) -> str:
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            async with self._session.post(
+                self.url, json=payload, timeout=self._stream_timeout if payload["stream"] else self._timeout
+            ) as resp:
+                if resp.status != 200:
+                    raise LLMAPIError(resp.status, await resp.text())
+                if resp.content_type == "text/event-stream":
+                    text = await self._read_stream(resp, end)
+                else:
+                    text = _message_content(await resp.json(content_type=None))
+        except asyncio.TimeoutError as e:
+            raise LLMTimeoutError("Таймаут запроса к Chipp.ai") from e
+        except aiohttp.ClientError as e:
+            raise LLMConnectionError(f"Ошибка соединения с Chipp.ai: {e}") from e
+        except json.JSONDecodeError as e:
+            raise LLMResponseError(f"Ответ API не разбирается как JSON: {e}") from e
+        finally:
+            self._observe("llm_request", started)
+
+        if self.hedge is not None:
+            self.hedge.record(time.perf_counter() - started)
+        return text.strip()
+
+    async def _read_stream(self, resp: aiohttp.ClientResponse, end: Callable[[str], int] | None) -> str:
+        """Читает поток server-sent events; останавливается на `data: [DONE]` или когда `end` нашёл конец ответа."""
+        text = ""
+        async for raw in resp.content:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            piece = _delta_content(json.loads(data))
+            if not piece:
+                continue
+            text += piece
+            if end is not None:
+                position = end(text)
+                if position >= 0:
+                    # Остаток ответа не нужен: соединение закроется при выходе из `async with`
+                    self.early_stops += 1
+                    if self.metrics is not None:
+                        self.metrics.inc("llm_early_stops")
+                    return text[:position]
+        return text
+
+    async def get_sql_query(self, user_query: str) -> str:
+        """Переводит вопрос в SQL. Ошибки API, таймауты и неразбираемые ответы — исключения `LLMError`."""
+        prompt = await self._prompt_for([user_query])
+
+        content = await self._complete(
+            f'{prompt}\n Запрос пользователя: {user_query}'
+            f'Ответь исключительно SQL-кодом.',
+            end=sql_statement_end,
+        )
+
+        started = time.perf_counter()
+        content = strip_code_fence(content)
+        self._observe("sql_cleanup", started)
+
+        if not content:
+            if self.metrics is not None:
+                self.metrics.error("llm")
+            raise LLMResponseError("Модель вернула пустой ответ")
+
+        logger.info(f"Очищенный SQL: {content}")
+
+        return content
+
+    async def get_sql_queries(self, questions: List[str]) -> List[str]:
+        """
+        Переводит несколько вопросов в SQL одним запросом к модели: модель возвращает JSON-массив
+        SQL-запросов в порядке вопросов. Ошибки — исключения `LLMError`, неверный ответ модели — LLMResponseError.
+        """
+        prompt = await self._prompt_for(questions)
+
+        numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+        content = await self._complete(
+            f"{prompt}\n Вопросы пользователя:\n{numbered}\n{BATCH_INSTRUCTION}",
+            end=json_array_end,
+        )
+
+        started = time.perf_counter()
+        try:
+            queries = parse_sql_list(content, len(questions))
+        except LLMResponseError:
+            if self.metrics is not None:
+                self.metrics.error("llm")
+            raise
+        self._observe("sql_cleanup", started)
+
+        logger.info("Очищенные SQL (%d): %s", len(queries), queries)
+
+        return queries
+
+    def _observe(self, stage: str, started: float) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(stage, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedges_throttled": self.hedges_throttled,
+            "early_stops": self.early_stops,
+            "hedge": self.hedge.stats() if self.hedge is not None else None,
+            "breaker": self.breaker.stats() if self.breaker is not None else None,
+        }
@@ -0,0 +1,73 @@
+import re
+
+# Месяцы во всех падежах: «ноябрь», «ноября», «ноябре», «в мае», «марта» и т.д.
+MONTHS = {
+    1: r"январ[ьяеюи]",
+    2: r"феврал[ьяеюи]",
+    3: r"март[ае]?",
+    4: r"апрел[ьяеюи]",
+    5: r"ма[йяею]",
+    6: r"июн[ьяеюи]",
+    7: r"июл[ьяеюи]",
+    8: r"август[ае]?",
+    9: r"сентябр[ьяеюи]",
+    10: r"октябр[ьяеюи]",
+    11: r"ноябр[ьяеюи]",
+    12: r"декабр[ьяеюи]",
+}
+
+_MONTH_PATTERN = "|".join(f"(?:{pattern})" for pattern in MONTHS.values())
+_YEAR_SUFFIX = r"(?:\s*(?:года|году|год|г)\b\.?)?"
+
+_DAY_MONTH_YEAR_RE = re.compile(rf"\b(\d{{1,2}})\s+({_MONTH_PATTERN})\b(?:\s+(\d{{4}}){_YEAR_SUFFIX})?")
+_MONTH_YEAR_RE = re.compile(rf"\b({_MONTH_PATTERN})\b(?:\s+(\d{{4}}){_YEAR_SUFFIX})?")
+_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+# Знаки сравнения и «%» меняют смысл вопроса («> 100000» и «< 100000»), поэтому остаются в ключе
+_PUNCTUATION_RE = re.compile(r"[^\w\s<>=%!-]+|!(?!=)")
+_OPERATOR_RE = re.compile(r"\s*(<=|>=|<>|!=|[<>=%])\s*")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Регистр складывается только у кириллицы и у латинских служебных слов: идентификаторы креаторов
+# и видео могут различаться одним регистром
+_CYRILLIC_RE = re.compile(r"[А-ЯЁ]+")
+_LATIN_WORD_RE = re.compile(r"\b[A-Za-z_]+\b")
+KEYWORDS = frozenset(
+    "id video videos views likes comments reports creator creators snapshot snapshots sql".split()
+)
+
+
+def month_number(word: str) -> int | None:
+    """Возвращает номер месяца по русскому названию в любом падеже."""
+    for number, pattern in MONTHS.items():
+        if re.fullmatch(pattern, word):
+            return number
+    return None
+
+
+def _iso(year: str | None, month: int, day: int | None = None) -> str:
+    year = year or "xxxx"
+    if day is None:
+        return f"{year}-{month:02d}"
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+def normalize_question(text: str) -> str:
+    """
+    Приводит текст вопроса к каноническому виду для использования в качестве ключа кеша.
+
+    Регистр кириллицы и служебных слов (`KEYWORDS`), «ё», пунктуация и пробелы унифицируются, а даты
+    в любом написании («1 декабря 2025», «01.12.2025», «2025-12-1») приводятся к ISO-виду `2025-12-01`.
+    Дата без года записывается как `xxxx-12-01`, месяц — как `2025-11` или `xxxx-11`.
+    Цифры, знаки сравнения, «%» и регистр остальных латинских слов (идентификаторов) сохраняются.
+    """
+    text = _CYRILLIC_RE.sub(lambda m: m.group().lower(), text).replace("ё", "е")
+    text = _LATIN_WORD_RE.sub(lambda m: m.group().lower() if m.group().lower() in KEYWORDS else m.group(), text)
+
+    text = _NUMERIC_DATE_RE.sub(lambda m: _iso(m[3], int(m[2]), int(m[1])), text)
+    text = _ISO_DATE_RE.sub(lambda m: _iso(m[1], int(m[2]), int(m[3])), text)
+    text = _DAY_MONTH_YEAR_RE.sub(lambda m: _iso(m[3], month_number(m[2]), int(m[1])), text)
+    text = _MONTH_YEAR_RE.sub(lambda m: _iso(m[2], month_number(m[1])), text)
+
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _OPERATOR_RE.sub(r" \1 ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
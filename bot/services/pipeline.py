@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, AsyncContextManager, Hashable, List, Optional
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from bot.services.intents import IntentMatcher
+from bot.services.llm import LLMClient
+from bot.services.prompt_builder import PromptBuilder
+from bot.services.scheduler import WorkScheduler
+from bot.services.translation_cache import TranslationCache
+from infrastructure.cache.singleflight import SingleFlight
+from infrastructure.columnar.engine import ColumnarEngine
+from infrastructure.database.query_executor_db import execute_scalar_batch, execute_scalar_query
+from infrastructure.database.query_guard import QueryGuard, QueryRejectedError
+from infrastructure.database.result_cache import ResultCache
+from infrastructure.database.sql_rewriter import SargableRewriter
+from infrastructure.monitoring.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ResolvedQuery:
+    """SQL, которым отвечается вопрос."""
+
+    question: str
+    # SQL для выполнения: шаблонный или после переписывания дат
+    sql: str
+    params: tuple | None = None
+    # SQL от LLM в исходном виде; после успешного выполнения попадает в кеш переводов и в кандидаты примеров промпта
+    generated: str | None = None
+    # SQL взят из кеша переводов, а не получен от LLM только что
+    cached: bool = False
+
+
+def _is_bad_sql(error: BaseException) -> bool:
+    """Ошибка говорит о самом SQL (отклонён, не разобран, не тот результат), а не о состоянии БД или соединения."""
+    if isinstance(error, psycopg.OperationalError):
+        return False
+    return isinstance(error, (QueryRejectedError, ValueError, psycopg.Error))
+
+
+@dataclass
+class QueryPipeline:
+    """
+    Путь вопроса до числа: шаблон → кеш переводов → LLM → переписывание дат → выполнение → запоминание SQL.
+
+    Один объект на процесс передаётся в хэндлер через workflow_data. Одиночный вопрос проходит путь
+    через `resolve` и `execute`; несколько вопросов — через `lookup` для каждого, один вызов
+    `translate_many` на оставшиеся и один `execute_many` на все SQL.
+
+    Каждое успешное выполнение SQL от LLM (в том числе из кеша переводов) — подтверждение пары для примеров
+    промпта от пользователя `user_id`; SQL, который не выполнился, из примеров и кандидатов убирается.
+    """
+
+    pool: AsyncConnectionPool
+    llm: LLMClient
+    translation_cache: TranslationCache
+    rewriter: SargableRewriter
+    guard: QueryGuard
+    result_cache: ResultCache | None = None
+    intents: IntentMatcher | None = None
+    llm_flights: SingleFlight | None = None
+    db_flights: SingleFlight | None = None
+    scheduler: WorkScheduler | None = None
+    metrics: Metrics | None = None
+    prompt_builder: PromptBuilder | None = None
+    columnar: ColumnarEngine | None = None
+
+    @property
+    def _llm_limit(self) -> AsyncContextManager:
+        # Без планировщика этапы не ограничиваются
+        return self.scheduler.llm if self.scheduler is not None else nullcontext()
+
+    @property
+    def _db_limiter(self) -> AsyncContextManager | None:
+        return self.scheduler.db if self.scheduler is not None else None
+
+    async def resolve(self, question: str) -> ResolvedQuery:
+        """SQL для вопроса: по шаблону, из кеша переводов или от LLM."""
+        resolved = await self.lookup(question)
+        if resolved is None:
+            resolved = await self.translate(question)
+        return resolved
+
+    async def lookup(self, question: str) -> Optional[ResolvedQuery]:
+        """SQL по шаблону или из кеша переводов; None — нужен вызов LLM."""
+        # Типовые вопросы разбираются локально по шаблонам и сразу превращаются в параметризованный SQL
+        intent = self.intents.match(question) if self.intents is not None else None
+        if intent is not None:
+            if self.metrics is not None:
+                self.metrics.cache_hit("intent")
+            logger.info("Вопрос '%s' разобран по шаблону %s", question, intent.intent)
+            return ResolvedQuery(question, intent.sql, intent.params)
+
+        sql = await self.translation_cache.get(question)
+        if sql is None:
+            return None
+        if self.metrics is not None:
+            self.metrics.cache_hit("translation")
+        logger.info("SQL для '%s' взят из кеша: %s", question, sql)
+        return ResolvedQuery(question, self._rewrite(sql), generated=sql, cached=True)
+
+    async def translate(self, question: str) -> ResolvedQuery:
+        """SQL от LLM; одновременные одинаковые (после нормализации) вопросы ждут один общий вызов."""
+        async def generate() -> str:
+            async with self._llm_limit:
+                return await self.llm.get_sql_query(question)
+
+        started = time.perf_counter()
+        if self.llm_flights is not None:
+            try:
+                sql = await self.llm_flights.do(self.translation_cache.key(question), generate)
+            except asyncio.TimeoutError:
+                if self.metrics is not None:
+                    self.metrics.timeout("llm")
+                raise
+        else:
+            sql = await generate()
+        if self.intents is not None:
+            self.intents.record_llm_latency(time.perf_counter() - started)
+        logger.info("Сгенерирован SQL для '%s': %s", question, sql)
+        return ResolvedQuery(question, self._rewrite(sql), generated=sql)
+
+    async def translate_many(self, questions: List[str]) -> List[ResolvedQuery]:
+        """SQL от LLM для нескольких вопросов одним вызовом модели."""
+        async def generate() -> List[str]:
+            async with self._llm_limit:
+                return await self.llm.get_sql_queries(questions)
+
+        if self.llm_flights is not None:
+            key = ("batch", *(self.translation_cache.key(question) for question in questions))
+            sqls = await self.llm_flights.do(key, generate)
+        else:
+            sqls = await generate()
+        return [
+            ResolvedQuery(question, self._rewrite(sql), generated=sql) for question, sql in zip(questions, sqls)
+        ]
+
+    async def execute(self, resolved: ResolvedQuery, user_id: Hashable | None = None) -> Any:
+        """Число — ответ на вопрос; SQL от LLM запоминается только после успешного выполнения."""
+        try:
+            value = await execute_scalar_query(
+                self.pool, resolved.sql, resolved.params,
+                result_cache=self.result_cache, guard=self.guard, singleflight=self.db_flights,
+                limiter=self._db_limiter, metrics=self.metrics, columnar=self.columnar,
+            )
+        except Exception as e:
+            await self.reject(resolved, e)
+            raise
+        await self.remember(resolved, user_id)
+        return value
+
+    async def execute_many(self, queries: List[ResolvedQuery], user_id: Hashable | None = None) -> List[Any]:
+        """
+        Выполняет SQL нескольких вопросов одним запросом к БД. Для каждого — число или исключение,
+        с которым он завершился; SQL от LLM запоминается только для выполнившихся.
+        """
+        values = await execute_scalar_batch(
+            self.pool, [(resolved.sql, resolved.params) for resolved in queries],
+            result_cache=self.result_cache, guard=self.guard, limiter=self._db_limiter,
+            metrics=self.metrics, columnar=self.columnar,
+        ) if queries else []
+        for resolved, value in zip(queries, values):
+            if isinstance(value, Exception):
+                await self.reject(resolved, value)
+            else:
+                await self.remember(resolved, user_id)
+        return values
+
+    async def remember(self, resolved: ResolvedQuery, user_id: Hashable | None = None) -> None:
+        """Кладёт новый SQL от LLM в кеш переводов и засчитывает выполнение паре «вопрос → SQL» для примеров."""
+        if resolved.generated is None:
+            return
+        if not resolved.cached:
+            await self.translation_cache.set(resolved.question, resolved.generated)
+        if self.prompt_builder is not None:
+            await self.prompt_builder.record(resolved.question, resolved.generated, user_id)
+
+    async def reject(self, resolved: ResolvedQuery, error: BaseException) -> None:
+        """SQL от LLM не выполнился из-за самого запроса: пара не должна оставаться примером для промпта."""
+        if resolved.generated is None or self.prompt_builder is None or not _is_bad_sql(error):
+            return
+        await self.prompt_builder.reject(resolved.question, resolved.generated)
+
+    def _rewrite(self, sql: str) -> str:
+        # Приведения дат к ::date и подобные фильтры заменяются диапазонами, которые используют индексы.
+        # В кеш переводов по-прежнему кладётся исходный SQL — переписывание дешёвое и детерминированное
+        executed_sql, rules = self.rewriter.rewrite(sql)
+        if rules:
+            logger.info("SQL переписан (%s): %s", ", ".join(rules), executed_sql)
+        return executed_sql
@@ -0,0 +1,453 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import aiofiles
+
+from bot.services.normalizer import normalize_question
+from config.config import Config, get_config
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = "prompt_compact.txt"
+SEEDS_PATH = "prompt_examples.json"
+# Место в шаблоне, куда подставляются примеры
+EXAMPLES_PLACEHOLDER = "{examples}"
+
+
+def sql_key(sql: str) -> str:
+    """SQL для сравнения: без различий в пробелах и без «;» в конце."""
+    return " ".join(sql.split()).rstrip(";").rstrip()
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Символьные n-граммы слов нормализованного вопроса (слова дополняются пробелами по краям)."""
+    grams: Counter = Counter()
+    for word in text.split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams[padded] += 1
+            continue
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+class NgramIndex:
+    """
+    Поиск похожих вопросов: TF-IDF по символьным триграммам и косинусная близость.
+
+    Хранит инвертированный индекс «триграмма → документы». Нормы документов считаются при добавлении
+    с текущими IDF и пересчитываются целиком, когда число документов изменилось больше чем на четверть
+    с прошлого пересчёта, — так добавление не требует обхода всего индекса. Кандидаты набираются
+    по редким триграммам (см. `search`), поэтому результат приближённый, но поиск не обходит весь индекс.
+    """
+
+    def __init__(self, n: int = 3, max_df: float = 0.05, min_common_docs: int = 100) -> None:
+        self.n = n
+        self.max_df = max_df
+        self.min_common_docs = min_common_docs
+        self._docs: Dict[str, Dict[str, float]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._norms: Dict[str, float] = {}
+        self._normalized_at = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._docs
+
+    def _idf(self, gram: str) -> float:
+        return math.log((len(self._docs) + 1) / (len(self._postings.get(gram, ())) + 1)) + 1.0
+
+    def _norm(self, weights: Dict[str, float]) -> float:
+        return math.sqrt(sum((tf * self._idf(gram)) ** 2 for gram, tf in weights.items())) or 1.0
+
+    @staticmethod
+    def _weights(grams: Counter) -> Dict[str, float]:
+        # Сублинейный TF: повторы триграммы в длинном вопросе не перевешивают остальные
+        return {gram: 1.0 + math.log(count) for gram, count in grams.items()}
+
+    def add(self, key: str, text: str) -> None:
+        if key in self._docs:
+            self.remove(key)
+        weights = self._weights(char_ngrams(text, self.n))
+        self._docs[key] = weights
+        for gram in weights:
+            self._postings.setdefault(gram, set()).add(key)
+
+        if abs(len(self._docs) - self._normalized_at) > max(self._normalized_at, 4) // 4:
+            self._renormalize()
+        else:
+            self._norms[key] = self._norm(weights)
+
+    def remove(self, key: str) -> None:
+        weights = self._docs.pop(key, None)
+        if weights is None:
+            return
+        self._norms.pop(key, None)
+        for gram in weights:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _renormalize(self) -> None:
+        self._norms = {key: self._norm(weights) for key, weights in self._docs.items()}
+        self._normalized_at = len(self._docs)
+
+    def search(self, text: str, k: int) -> List[Tuple[str, float]]:
+        """Возвращает до `k` пар (ключ, близость от 0 до 1), самые похожие первыми."""
+        query = {gram: weight * self._idf(gram) for gram, weight in self._weights(char_ngrams(text, self.n)).items()}
+        query_norm = math.sqrt(sum(weight * weight for weight in query.values())) or 1.0
+
+        # Частые триграммы («ско», «ько») почти не различают вопросы, а обход их списков занимает основное время.
+        # Поэтому триграммы обходятся от редких к частым, и частые (больше `max_df` документов) только уточняют
+        # счёт уже найденных кандидатов; новых кандидатов они добавляют, лишь если редкие не нашли ни одного
+        common = max(self.min_common_docs, int(len(self._docs) * self.max_df))
+        scores: Dict[str, float] = {}
+        docs = self._docs
+        for gram, weight in sorted(query.items(), key=lambda item: len(self._postings.get(item[0], ()))):
+            keys = self._postings.get(gram)
+            if not keys:
+                continue
+            weight *= self._idf(gram)
+            if len(keys) > common and scores:
+                for key in scores:
+                    tf = docs[key].get(gram)
+                    if tf is not None:
+                        scores[key] += weight * tf
+            else:
+                for key in keys:
+                    scores[key] = scores.get(key, 0.0) + weight * docs[key][gram]
+
+        ranked = sorted(
+            ((key, score / (query_norm * self._norms[key])) for key, score in scores.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return ranked[:k]
+
+
+class SQLiteExampleStore:
+    """
+    Проверенные пары «вопрос → SQL» в локальном файле SQLite. `verified` — сколько подтверждений
+    было у пары, когда она стала примером; при загрузке пары с меньшим числом, чем требуется сейчас, пропускаются.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS prompt_examples ("
+            "question_key TEXT PRIMARY KEY, question TEXT NOT NULL, sql TEXT NOT NULL, "
+            "verified INTEGER NOT NULL DEFAULT 1, created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = asyncio.Lock()
+
+    def _load(self, limit: int, min_verified: int) -> List[Tuple[str, str, str]]:
+        rows = self._connection.execute(
+            "SELECT question_key, question, sql FROM prompt_examples WHERE verified >= ? "
+            "ORDER BY created_at DESC LIMIT ?",
+            (min_verified, limit),
+        ).fetchall()
+        # Старые первыми: в таком порядке они добавляются в индекс и вытесняются из него
+        return list(reversed(rows))
+
+    def _add(self, key: str, question: str, sql: str, verified: int) -> None:
+        self._connection.execute(
+            """
+            INSERT INTO prompt_examples (question_key, question, sql, verified, created_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (question_key) DO UPDATE SET
+                question = excluded.question,
+                sql = excluded.sql,
+                verified = excluded.verified,
+                created_at = excluded.created_at
+            """,
+            (key, question, sql, verified, time.time()),
+        )
+        self._connection.commit()
+
+    def _remove(self, key: str) -> bool:
+        cursor = self._connection.execute("DELETE FROM prompt_examples WHERE question_key = ?", (key,))
+        self._connection.commit()
+        return cursor.rowcount > 0
+
+    async def load(self, limit: int, min_verified: int = 1) -> List[Tuple[str, str, str]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._load, limit, min_verified)
+
+    async def add(self, key: str, question: str, sql: str, verified: int = 1) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._add, key, question, sql, verified)
+
+    async def remove(self, key: str) -> bool:
+        async with self._lock:
+            return await asyncio.to_thread(self._remove, key)
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class PromptBuilder:
+    """
+    Промпт под конкретный вопрос: компактная схема из шаблона `template_path` и `k` примеров,
+    самых похожих на вопрос, вместо полного `prompt.txt` со всеми примерами.
+
+    Примеры — начальные пары из `seeds_path` и проверенные пары от модели. Успешное выполнение SQL (`record`)
+    само по себе пару не проверяет: она остаётся кандидатом, пока тот же SQL для того же вопроса не выполнится
+    у `verify_successes` разных пользователей, либо сразу, если SQL совпал с SQL начального примера.
+    Проверенные пары сохраняются в `store` и загружаются при старте. SQL, который не выполнился (`reject`),
+    перестаёт быть примером и кандидатом; `forget` убирает пару вручную.
+
+    В индексе держится не больше `max_examples` записанных пар и столько же кандидатов (старые вытесняются),
+    начальные пары не вытесняются. Примеры с близостью ниже `min_score` в промпт не попадают.
+    """
+
+    def __init__(
+        self,
+        *,
+        template_path: str = TEMPLATE_PATH,
+        seeds_path: str = SEEDS_PATH,
+        store: Optional[SQLiteExampleStore] = None,
+        k: int = 3,
+        max_examples: int = 5000,
+        min_score: float = 0.1,
+        verify_successes: int = 3,
+    ) -> None:
+        if k < 1 or verify_successes < 1:
+            raise ValueError("k and verify_successes must be at least 1")
+        self.template_path = template_path
+        self.seeds_path = seeds_path
+        self.store = store
+        self.k = k
+        self.max_examples = max_examples
+        self.min_score = min_score
+        self.verify_successes = verify_successes
+
+        self.index = NgramIndex()
+        self._examples: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._seed_keys: Set[str] = set()
+        self._seed_sqls: Set[str] = set()
+        # Кандидаты: вопрос, SQL и пользователи, у которых этот SQL выполнился; хранятся только в памяти
+        self._pending: "OrderedDict[str, Tuple[str, str, Set[Hashable]]]" = OrderedDict()
+        self._template: str | None = None
+        self._template_mtime: float | None = None
+        self._template_lock = asyncio.Lock()
+
+        self.builds = 0
+        self.examples_used = 0
+        self.prompt_chars = 0
+        self.recorded = 0
+        self.rejected = 0
+        self.store_errors = 0
+
+    async def start(self) -> None:
+        await self.get_template()
+
+        with open(self.seeds_path, encoding="utf-8") as f:
+            seeds = json.load(f)
+        for seed in seeds:
+            key = normalize_question(seed["question"])
+            self._seed_keys.add(key)
+            self._seed_sqls.add(sql_key(seed["sql"]))
+            self._add(key, seed["question"], seed["sql"])
+
+        if self.store is not None:
+            try:
+                for key, question, sql in await self.store.load(self.max_examples, self.verify_successes):
+                    if key not in self._seed_keys:
+                        self._add(key, question, sql)
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning("Ошибка чтения сохранённых примеров: %s", e)
+
+        logger.info(
+            "Индекс примеров для промпта: %d пар (начальных %d)", len(self._examples), len(self._seed_keys)
+        )
+
+    async def get_template(self) -> str:
+        """Возвращает шаблон из памяти, перечитывая файл только если изменился его mtime."""
+        mtime = os.stat(self.template_path).st_mtime
+        if self._template is not None and mtime == self._template_mtime:
+            return self._template
+
+        async with self._template_lock:
+            if self._template is None or mtime != self._template_mtime:
+                async with aiofiles.open(self.template_path, "r", encoding="utf-8") as template_file:
+                    template = await template_file.read()
+                if EXAMPLES_PLACEHOLDER not in template:
+                    raise ValueError(f"В шаблоне {self.template_path} нет {EXAMPLES_PLACEHOLDER}")
+                self._template = template
+                self._template_mtime = mtime
+                logger.info("Шаблон промпта загружен из %s", self.template_path)
+
+        return self._template
+
+    def _add(self, key: str, question: str, sql: str) -> None:
+        self._examples[key] = (question, sql)
+        self._examples.move_to_end(key)
+        self.index.add(key, key)
+
+        # Вытесняются самые старые записанные пары; начальные остаются всегда
+        while len(self._examples) - len(self._seed_keys) > self.max_examples:
+            oldest = next(k for k in self._examples if k not in self._seed_keys)
+            del self._examples[oldest]
+            self.index.remove(oldest)
+
+    def _remove(self, key: str) -> bool:
+        if key in self._seed_keys or self._examples.pop(key, None) is None:
+            return False
+        self.index.remove(key)
+        return True
+
+    def similar(self, questions: Iterable[str]) -> List[Tuple[str, str]]:
+        """
+        Похожие примеры для вопросов: до `k` на каждый вопрос без повторов, но не больше `2 * k` на все вопросы
+        пакета; самые близкие первыми.
+        """
+        found: Dict[str, float] = {}
+        for question in questions:
+            for key, score in self.index.search(normalize_question(question), self.k):
+                if score >= self.min_score and score > found.get(key, 0.0):
+                    found[key] = score
+        ranked = sorted(found, key=found.get, reverse=True)[:2 * self.k]
+        return [self._examples[key] for key in ranked]
+
+    async def build(self, questions: List[str]) -> str:
+        template = await self.get_template()
+        examples = self.similar(questions)
+
+        if examples:
+            section = "Примеры похожих вопросов и верного SQL:\n" + "\n".join(
+                f"Вопрос: {question}\nSQL: {sql}" for question, sql in examples
+            )
+        else:
+            section = ""
+        prompt = template.replace(EXAMPLES_PLACEHOLDER, section)
+
+        self.builds += 1
+        self.examples_used += len(examples)
+        self.prompt_chars += len(prompt)
+        return prompt
+
+    async def record(self, question: str, sql: str, user_id: Hashable | None = None) -> None:
+        """
+        Учитывает успешное выполнение SQL для вопроса у пользователя `user_id`. Пара становится примером,
+        когда набрала `verify_successes` разных пользователей или сразу, если SQL совпал с начальным примером.
+        Без `user_id` каждое выполнение считается отдельным подтверждением.
+        """
+        key = normalize_question(question)
+        sql = sql.strip()
+        if key in self._seed_keys or self._examples.get(key, (None, None))[1] == sql:
+            return
+
+        if sql_key(sql) in self._seed_sqls:
+            votes = self.verify_successes
+            self._pending.pop(key, None)
+        else:
+            pending = self._pending.get(key)
+            if pending is None or pending[1] != sql:
+                # Другой SQL для того же вопроса начинает подсчёт заново
+                pending = (question, sql, set())
+                self._pending[key] = pending
+            users = pending[2]
+            users.add(user_id if user_id is not None else ("anonymous", len(users)))
+            self._pending.move_to_end(key)
+            while len(self._pending) > self.max_examples:
+                self._pending.popitem(last=False)
+
+            votes = len(users)
+            if votes < self.verify_successes:
+                return
+            del self._pending[key]
+
+        self._add(key, question, sql)
+        self.recorded += 1
+        logger.info("Пара '%s' стала примером для промпта (подтверждений: %d)", question, votes)
+
+        if self.store is None:
+            return
+        try:
+            await self.store.add(key, question, sql, votes)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning("Ошибка записи примера для промпта: %s", e)
+
+    async def reject(self, question: str, sql: str) -> None:
+        """SQL для вопроса не выполнился: такая пара больше не пример и не кандидат."""
+        key = normalize_question(question)
+        sql = sql.strip()
+        pending = self._pending.get(key)
+        if pending is not None and pending[1] == sql:
+            del self._pending[key]
+        if key not in self._seed_keys and self._examples.get(key, (None, None))[1] == sql:
+            self.rejected += 1
+            logger.warning("Пример для '%s' убран: его SQL не выполнился", question)
+            await self.forget(question)
+
+    async def forget(self, question: str) -> bool:
+        """Убирает пару для вопроса из примеров, кандидатов и хранилища; начальные примеры не убираются."""
+        key = normalize_question(question)
+        self._pending.pop(key, None)
+        removed = self._remove(key)
+        if self.store is not None and key not in self._seed_keys:
+            try:
+                removed = await self.store.remove(key) or removed
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning("Ошибка удаления примера для промпта: %s", e)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "examples": len(self._examples),
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "rejected": self.rejected,
+            "builds": self.builds,
+            "avg_examples": round(self.examples_used / self.builds, 2) if self.builds else 0.0,
+            "avg_prompt_chars": round(self.prompt_chars / self.builds) if self.builds else 0,
+            "store_errors": self.store_errors,
+        }
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+
+async def main(config: Config, questions: List[str]) -> None:
+    """Удаляет сохранённые примеры для вопросов; работающий бот перестанет их использовать после перезапуска."""
+    store = SQLiteExampleStore(config.prompt.examples_path)
+    try:
+        for question in questions:
+            if await store.remove(normalize_question(question)):
+                logger.info("Пример для '%s' удалён", question)
+            else:
+                logger.info("Сохранённого примера для '%s' нет", question)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    config = get_config()
+    logging.basicConfig(
+        level=logging.getLevelName(config.log.level),
+        format=config.log.format,
+    )
+    asyncio.run(main(config, sys.argv[1:]))
@@ -0,0 +1,149 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для внешнего сервиса.
+
+    После `failure_threshold` неудач подряд цепь размыкается: в течение `recovery_time` секунд вызовы
+    отклоняются сразу (`allow()` возвращает False), не дожидаясь таймаута. Затем пропускается один
+    пробный вызов (полуоткрытое состояние): успех замыкает цепь, неудача снова размыкает её.
+    Если пробный вызов не завершился за `probe_timeout` секунд (например, был отменён),
+    пропускается следующий.
+    """
+
+    def __init__(self, *, failure_threshold: int = 5, recovery_time: float = 30.0, probe_timeout: float = 30.0) -> None:
+        if failure_threshold < 1 or recovery_time <= 0:
+            raise ValueError("failure_threshold must be at least 1 and recovery_time positive")
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.probe_timeout = probe_timeout
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at: Optional[float] = None
+
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.recovery_time:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probe_at = None
+
+        # Полуоткрытое состояние: одновременно идёт не больше одного пробного вызова
+        if self._probe_at is not None and now - self._probe_at < self.probe_timeout:
+            self.rejected += 1
+            return False
+        self._probe_at = now
+        return True
+
+    def retry_after(self) -> float:
+        """Через сколько секунд цепь пропустит пробный вызов."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_time - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("Цепь замкнута: сервис снова отвечает")
+        self.state = CLOSED
+        self._failures = 0
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+                logger.warning(
+                    "Цепь разомкнута после %d неудач подряд, вызовы отклоняются %.0f с",
+                    self._failures, self.recovery_time,
+                )
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self._probe_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class HedgePolicy:
+    """
+    Когда отправлять дублирующий (hedged) запрос.
+
+    Порог — p95 длительности последних `window` успешных запросов, но не меньше `min_delay` секунд;
+    пока замеров меньше `min_samples`, дублирования нет. Чтобы дубли не удвоили нагрузку при общей
+    деградации, их доля ограничена бюджетом: каждый запрос добавляет `max_ratio` токена (не больше
+    `max_burst`), каждый дубль тратит один.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_delay: float = 1.0,
+        max_ratio: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+        max_burst: float = 10.0,
+    ) -> None:
+        if min_delay <= 0 or not 0 < max_ratio <= 1:
+            raise ValueError("min_delay must be positive and max_ratio in (0, 1]")
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._budget = 0.0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        """Вызывается на каждый запрос: порог дублирования в секундах или None, если дублировать нельзя."""
+        self._budget = min(self.max_burst, self._budget + self.max_ratio)
+        return self._threshold()
+
+    def _threshold(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(self.min_delay, p95)
+
+    def acquire(self) -> bool:
+        """Списывает токен бюджета на дубль; False — бюджет исчерпан."""
+        if self._budget < 1:
+            return False
+        self._budget -= 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self._samples),
+            "delay": self._threshold(),
+            "budget": round(self._budget, 2),
+        }
+
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+from infrastructure.monitoring.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних ожиданий хранится для перцентилей
+WAIT_SAMPLES = 1000
+
+
+class SchedulerBusyError(Exception):
+    """Очередь заполнена (общая или очередь пользователя) — запрос не принят."""
+
+
+def _wait_stats(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"wait_avg": None, "wait_p50": None, "wait_p95": None, "wait_max": None}
+    ordered = sorted(samples)
+    return {
+        "wait_avg": sum(ordered) / len(ordered),
+        "wait_p50": ordered[len(ordered) // 2],
+        "wait_p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "wait_max": ordered[-1],
+    }
+
+
+def _export_waits(metrics: Metrics, name: str, samples: Deque[float], **labels: str) -> None:
+    stats = _wait_stats(samples)
+    for quantile, key in (("0.5", "wait_p50"), ("0.95", "wait_p95"), ("1", "wait_max")):
+        if stats[key] is not None:
+            metrics.set_gauge(name, stats[key], quantile=quantile, **labels)
+
+
+class TokenBucket:
+    """Ограничение частоты: `rate` токенов в секунду, не больше `capacity` подряд."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        # Lock выдаёт токены ожидающим в порядке очереди
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def try_acquire(self) -> bool:
+        """Берёт токен без ожидания; False, если токена нет или его уже ждут другие."""
+        if self._lock.locked():
+            return False
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class StageLimiter:
+    """
+    Ограничение числа одновременных операций одного этапа (LLM или БД),
+    опционально с ограничением частоты через TokenBucket. Используется как `async with`.
+    """
+
+    def __init__(self, name: str, concurrency: int, bucket: Optional[TokenBucket] = None) -> None:
+        if concurrency <= 0:
+            raise ValueError("concurrency must be positive")
+        self.name = name
+        self.concurrency = concurrency
+        self.bucket = bucket
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self.active = 0
+        self.waiting = 0
+        self.acquired = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    async def __aenter__(self) -> "StageLimiter":
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.acquired += 1
+        self._waits.append(time.monotonic() - started)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            **_wait_stats(self._waits),
+        }
+
+
+class WorkScheduler:
+    """
+    Допуск сообщений к обработке: не больше `workers` обработок одновременно,
+    остальные ждут в ограниченной очереди.
+
+    Очередь устроена по пользователям: свободный слот получает следующий по кругу пользователь,
+    у которого есть ожидающие сообщения, поэтому один активный пользователь не занимает все слоты.
+    Если общая очередь (`max_queue`) или очередь пользователя (`max_per_user`) заполнена,
+    `admit` сразу бросает SchedulerBusyError — хэндлер отвечает «занято, попробуй позже».
+
+    Кроме того, планировщик хранит ограничители этапов: `llm` (одновременные вызовы
+    и частота запросов к API) и `db` (одновременные запросы к БД).
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int = 16,
+        max_queue: int = 100,
+        max_per_user: int = 3,
+        llm_concurrency: int = 4,
+        llm_rate: float = 0.0,
+        llm_burst: float = 1.0,
+        db_concurrency: int = 8,
+    ) -> None:
+        if workers <= 0:
+            raise ValueError("workers must be positive")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+
+        bucket = TokenBucket(llm_rate, max(llm_burst, 1.0)) if llm_rate > 0 else None
+        self.llm = StageLimiter("llm", llm_concurrency, bucket)
+        self.db = StageLimiter("db", db_concurrency)
+
+        self._active = 0
+        self._queued = 0
+        self._queues: Dict[Hashable, Deque[tuple[asyncio.Future, float]]] = {}
+        # Пользователи с ожидающими сообщениями в порядке обхода по кругу
+        self._ready: Deque[Hashable] = deque()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._metrics: Metrics | None = None
+
+    def attach(self, metrics: Metrics) -> None:
+        """
+        Подключает метрики: отклонённые сообщения считаются в `bot_scheduler_rejected_total`, а глубина
+        очереди, занятые слоты и перцентили ожидания (общие и по этапам) обновляются при каждом чтении /metrics.
+        """
+        self._metrics = metrics
+        metrics.add_collector(self.export)
+
+    def export(self, metrics: Metrics) -> None:
+        metrics.set_gauge("scheduler_active", self._active)
+        metrics.set_gauge("scheduler_queue_depth", self._queued)
+        metrics.set_gauge("scheduler_queued_users", len(self._queues))
+        _export_waits(metrics, "scheduler_wait_seconds", self._waits)
+        for stage in (self.llm, self.db):
+            metrics.set_gauge("stage_active", stage.active, stage=stage.name)
+            metrics.set_gauge("stage_waiting", stage.waiting, stage=stage.name)
+            _export_waits(metrics, "stage_wait_seconds", stage._waits, stage=stage.name)
+
+    @asynccontextmanager
+    async def admit(self, user_id: Hashable) -> AsyncIterator[None]:
+        await self._acquire(user_id)
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._dispatch()
+
+    async def _acquire(self, user_id: Hashable) -> None:
+        if self._active < self.workers and not self._queued:
+            self._grant(0.0)
+            return
+
+        queue = self._queues.get(user_id)
+        if self._queued >= self.max_queue or (queue is not None and len(queue) >= self.max_per_user):
+            self.rejected += 1
+            if self._metrics is not None:
+                self._metrics.inc("scheduler_rejected")
+            logger.warning(
+                "Очередь заполнена (всего %d, у пользователя %s — %d), сообщение отклонено",
+                self._queued, user_id, len(queue) if queue else 0,
+            )
+            raise SchedulerBusyError()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            self._ready.append(user_id)
+        queue.append(entry)
+        self._queued += 1
+        self.max_depth = max(self.max_depth, self._queued)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но получатель отменён — возвращаем слот
+                self._active -= 1
+                self._dispatch()
+            else:
+                self._remove(user_id, entry)
+            raise
+
+    def _remove(self, user_id: Hashable, entry: tuple) -> None:
+        queue = self._queues.get(user_id)
+        if queue is None or entry not in queue:
+            return
+        queue.remove(entry)
+        self._queued -= 1
+        if not queue:
+            del self._queues[user_id]
+            self._ready.remove(user_id)
+
+    def _grant(self, waited: float) -> None:
+        self._active += 1
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def _dispatch(self) -> None:
+        while self._active < self.workers and self._ready:
+            user_id = self._ready.popleft()
+            queue = self._queues[user_id]
+            future, enqueued_at = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._ready.append(user_id)
+            else:
+                del self._queues[user_id]
+
+            if future.done():
+                continue
+            self._grant(time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "queue_depth": self._queued,
+            "queued_users": len(self._queues),
+            "max_depth": self.max_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            **_wait_stats(self._waits),
+            "llm": self.llm.stats(),
+            "db": self.db.stats(),
+        }
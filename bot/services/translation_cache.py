@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Protocol
+
+from psycopg_pool import AsyncConnectionPool
+
+from bot.services.normalizer import normalize_question
+from infrastructure.cache.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationStore(Protocol):
+    """Персистентный уровень кеша «вопрос → SQL», переживающий перезапуски."""
+
+    async def get(self, key: str) -> Optional[str]: ...
+
+    async def set(self, key: str, sql: str) -> None: ...
+
+
+class SQLiteTranslationStore:
+    """Хранение переводов в локальном файле SQLite (один экземпляр бота)."""
+
+    def __init__(self, path: str, ttl: Optional[float] = None) -> None:
+        self.path = path
+        self.ttl = ttl
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sql_translation_cache ("
+            "question_key TEXT PRIMARY KEY, sql TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = asyncio.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._connection.execute(
+            "SELECT sql, created_at FROM sql_translation_cache WHERE question_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if self.ttl and row[1] + self.ttl < time.time():
+            return None
+        return row[0]
+
+    def _set(self, key: str, sql: str) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO sql_translation_cache (question_key, sql, created_at) VALUES (?, ?, ?)",
+            (key, sql, time.time()),
+        )
+        self._connection.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, sql: str) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, sql)
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class PostgresTranslationStore:
+    """Хранение переводов в таблице `sql_translation_cache`, общей для всех реплик бота."""
+
+    def __init__(self, pool: AsyncConnectionPool, ttl: Optional[float] = None) -> None:
+        self.pool = pool
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self.pool.connection() as connection:
+            async with connection.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT sql FROM sql_translation_cache
+                    WHERE question_key = %s
+                      AND (%s::float8 IS NULL OR created_at > NOW() - make_interval(secs => %s::float8))
+                    """,
+                    (key, self.ttl, self.ttl),
+                )
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def set(self, key: str, sql: str) -> None:
+        async with self.pool.connection() as connection:
+            await connection.execute(
+                """
+                INSERT INTO sql_translation_cache (question_key, sql, created_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (question_key) DO UPDATE SET
+                    sql = EXCLUDED.sql,
+                    created_at = EXCLUDED.created_at;
+                """,
+                (key, sql),
+            )
+
+
+class TranslationCache:
+    """
+    Кеш «нормализованный вопрос → очищенный SQL» перед вызовом LLM.
+
+    Первый уровень — LRU с TTL в памяти процесса, второй (опциональный) —
+    персистентное хранилище, которое переживает перезапуски и может быть общим для реплик.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int = 1000,
+        ttl: Optional[float] = None,
+        store: Optional[TranslationStore] = None,
+    ) -> None:
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.store = store
+
+        self.store_hits = 0
+        self.store_errors = 0
+
+    @staticmethod
+    def key(question: str) -> str:
+        return normalize_question(question)
+
+    async def get(self, question: str) -> Optional[str]:
+        key = self.key(question)
+
+        sql = self.memory.get(key)
+        if sql is not None or self.store is None:
+            return sql
+
+        try:
+            sql = await self.store.get(key)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning("Ошибка чтения персистентного кеша переводов: %s", e)
+            return None
+
+        if sql is not None:
+            self.store_hits += 1
+            self.memory.set(key, sql)
+        return sql
+
+    async def set(self, question: str, sql: str) -> None:
+        key = self.key(question)
+        self.memory.set(key, sql)
+
+        if self.store is None:
+            return
+
+        try:
+            await self.store.set(key, sql)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning("Ошибка записи в персистентный кеш переводов: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats["store_hits"] = self.store_hits
+        stats["store_errors"] = self.store_errors
+        # Промах памяти, закрытый персистентным уровнем, не считается промахом кеша в целом
+        stats["total_hits"] = stats["hits"] + self.store_hits
+        stats["total_misses"] = stats["misses"] - self.store_hits
+        return stats
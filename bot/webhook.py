@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import signal
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик вебхука с плавной остановкой: после начала остановки новые обновления
+    получают 503 (Telegram повторит их позже, возможно, на другой реплике), а уже принятые
+    дорабатываются не дольше `drain_timeout` секунд.
+    """
+
+    def __init__(self, *args: Any, drain_timeout: float = 30.0, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+        self.draining = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.json_response({"error": "shutting down"}, status=503)
+        return await super().handle(request)
+
+    async def drain(self) -> None:
+        self.draining = True
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logger.info("Ожидание завершения %d обрабатываемых обновлений...", len(tasks))
+            _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            if pending:
+                logger.warning("%d обновлений не успели обработаться и отменены", len(pending))
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+HANDLER_KEY = web.AppKey("webhook_handler", DrainingRequestHandler)
+
+
+def build_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    *,
+    path: str,
+    secret: str,
+    drain_timeout: float = 30.0,
+    **workflow_data: Any,
+) -> web.Application:
+    """Собирает aiohttp-приложение: POST `path` для обновлений Telegram и GET /healthz."""
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret,
+        drain_timeout=drain_timeout,
+        **workflow_data,
+    )
+    handler.register(app, path=path)
+    app[HANDLER_KEY] = handler
+
+    async def healthz(request: web.Request) -> web.Response:
+        # Во время остановки реплика сообщает балансировщику, что новые обновления ей слать не нужно
+        status = 503 if handler.draining else 200
+        return web.json_response(
+            {"status": "draining" if handler.draining else "ok", "in_flight": handler.in_flight},
+            status=status,
+        )
+
+    app.router.add_get("/healthz", healthz)
+    setup_application(app, dp, bot=bot, **workflow_data)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    *,
+    host: str,
+    port: int,
+    path: str,
+    secret: str,
+    url: str | None = None,
+    drain_timeout: float = 30.0,
+    **workflow_data: Any,
+) -> None:
+    """
+    Запускает встроенный веб-сервер и обслуживает обновления до SIGINT/SIGTERM.
+
+    Если задан `url`, вебхук регистрируется в Telegram (`url` + `path`) с тем же секретом;
+    при нескольких репликах за балансировщиком достаточно, чтобы это сделала одна из них.
+    """
+    app = build_webhook_app(
+        dp, bot, path=path, secret=secret, drain_timeout=drain_timeout, **workflow_data
+    )
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info("Webhook server listening on %s:%d%s", host, port, path)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C придёт как KeyboardInterrupt
+            pass
+
+    try:
+        if url:
+            await bot.set_webhook(
+                url.rstrip("/") + path,
+                secret_token=secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info("Webhook registered at %s%s", url.rstrip("/"), path)
+        await stop.wait()
+    finally:
+        logger.info("Stopping webhook server...")
+        # Пока начатые обновления дорабатываются, сервер ещё отвечает: /healthz и новые обновления получают 503
+        await app[HANDLER_KEY].drain()
+        await runner.cleanup()
+        logger.info("Webhook server stopped")
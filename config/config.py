@@ -1,6 +1,7 @@
 import logging
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 
 from environs import Env
 
@@ -10,6 +11,28 @@ logger = logging.getLogger(__name__)
 @dataclass
 class BotSettings:
     token: str
+    mode: str
+    warm_up: bool
+
+
+@dataclass
+class WebhookSettings:
+    url: str | None
+    path: str
+    host: str
+    port: int
+    secret: str
+    drain_timeout: float
+
+
+@dataclass
+class DatabasePoolSettings:
+    min_size: int
+    max_size: int
+    max_idle: float
+    max_lifetime: float
+    timeout: float
+    check: bool
 
 
 @dataclass
@@ -19,6 +42,10 @@ class DatabaseSettings:
     port: int
     user: str
     password: str
+    timezone: str
+    partitioned_snapshots: bool
+    partitions_ahead: int
+    pool: DatabasePoolSettings
 
 
 @dataclass
@@ -30,14 +57,127 @@ class LoggSettings:
 @dataclass
 class AISettings:
     token: str
+    timeout: float
+    connection_limit: int
+    keepalive_timeout: float
+    dns_cache_ttl: int
+    stream: bool
+    stream_read_timeout: float
+    hedge: bool
+    hedge_min_delay: float
+    hedge_max_ratio: float
+    breaker_failures: int
+    breaker_recovery: float
+
+
+@dataclass
+class TranslationCacheSettings:
+    max_size: int
+    ttl: float | None
+    backend: str
+    path: str
+
+
+@dataclass
+class ResultCacheSettings:
+    max_size: int
+    version_ttl: float
+
+
+@dataclass
+class QueryGuardSettings:
+    statement_timeout_ms: int
+    work_mem: str
+    explain: bool
+    max_cost: float
+    max_rows: float
+    record_rejected: bool
+
+
+@dataclass
+class IntentSettings:
+    enabled: bool
+    default_year: int | None
+
+
+@dataclass
+class SingleFlightSettings:
+    enabled: bool
+    llm_timeout: float
+    db_timeout: float
+
+
+@dataclass
+class SchedulerSettings:
+    enabled: bool
+    workers: int
+    queue_size: int
+    user_queue_size: int
+    llm_concurrency: int
+    llm_rate: float
+    llm_burst: float
+    db_concurrency: int
+
+
+@dataclass
+class BatchSettings:
+    enabled: bool
+    max_questions: int
+
+
+@dataclass
+class PromptSettings:
+    retrieval: bool
+    examples_k: int
+    examples_path: str
+    max_examples: int
+    min_score: float
+    verify_successes: int
+
+
+@dataclass
+class ColumnarSettings:
+    enabled: bool
+    path: str
+
+
+@dataclass
+class MetricsSettings:
+    enabled: bool
+    host: str
+    port: int
+    slow_query_ms: int
+    trace_ids: bool
+
+
+@dataclass
+class LoadSettings:
+    path: str
+    mode: str
+    method: str
+    batch_size: int
+    workers: int
+    incremental: bool
 
 
 @dataclass
 class Config:
     bot: BotSettings
+    webhook: WebhookSettings
     db: DatabaseSettings
     log: LoggSettings
     ai: AISettings
+    translation_cache: TranslationCacheSettings
+    result_cache: ResultCacheSettings
+    query_guard: QueryGuardSettings
+    intents: IntentSettings
+    singleflight: SingleFlightSettings
+    scheduler: SchedulerSettings
+    batch: BatchSettings
+    prompt: PromptSettings
+    columnar: ColumnarSettings
+    metrics: MetricsSettings
+    load: LoadSettings
 
 
 def load_config(path: str | None = None) -> Config:
@@ -56,12 +196,45 @@ def load_config(path: str | None = None) -> Config:
     if not token:
         raise ValueError("BOT_TOKEN must not be empty")
 
+    bot_settings = BotSettings(
+        token=token,
+        mode=env("BOT_MODE", "polling"),
+        warm_up=env.bool("BOT_WARM_UP", True),
+    )
+
+    if bot_settings.mode not in ("polling", "webhook"):
+        raise ValueError("BOT_MODE must be one of: polling, webhook")
+
+    webhook_settings = WebhookSettings(
+        url=env("WEBHOOK_URL", "") or None,
+        path=env("WEBHOOK_PATH", "/webhook"),
+        host=env("WEBHOOK_HOST", "0.0.0.0"),
+        port=env.int("WEBHOOK_PORT", 8080),
+        secret=env("WEBHOOK_SECRET", ""),
+        drain_timeout=env.float("WEBHOOK_DRAIN_TIMEOUT", 30.0),
+    )
+
+    # Без секрета любой, кто знает адрес, мог бы присылать боту поддельные обновления
+    if bot_settings.mode == "webhook" and not webhook_settings.secret:
+        raise ValueError("WEBHOOK_SECRET must not be empty in webhook mode")
+
     db = DatabaseSettings(
         name=env("POSTGRES_DB"),
         host=env("POSTGRES_HOST"),
         port=env.int("POSTGRES_PORT"),
         user=env("POSTGRES_USER"),
         password=env("POSTGRES_PASSWORD"),
+        timezone=env("POSTGRES_TIMEZONE", "UTC"),
+        partitioned_snapshots=env.bool("SNAPSHOTS_PARTITIONED", False),
+        partitions_ahead=env.int("SNAPSHOTS_PARTITIONS_AHEAD", 3),
+        pool=DatabasePoolSettings(
+            min_size=env.int("POSTGRES_POOL_MIN_SIZE", 1),
+            max_size=env.int("POSTGRES_POOL_MAX_SIZE", 10),
+            max_idle=env.float("POSTGRES_POOL_MAX_IDLE", 300.0),
+            max_lifetime=env.float("POSTGRES_POOL_MAX_LIFETIME", 3600.0),
+            timeout=env.float("POSTGRES_POOL_TIMEOUT", 5.0),
+            check=env.bool("POSTGRES_POOL_CHECK", True),
+        ),
     )
 
     logg_settings = LoggSettings(
@@ -71,13 +244,156 @@ def load_config(path: str | None = None) -> Config:
 
     ai_settings = AISettings(
         token=env("CHIPP_API_KEY"),
+        timeout=env.float("CHIPP_TIMEOUT", 30.0),
+        connection_limit=env.int("CHIPP_CONNECTION_LIMIT", 10),
+        keepalive_timeout=env.float("CHIPP_KEEPALIVE_TIMEOUT", 60.0),
+        dns_cache_ttl=env.int("CHIPP_DNS_CACHE_TTL", 300),
+        stream=env.bool("CHIPP_STREAM", True),
+        stream_read_timeout=env.float("CHIPP_STREAM_READ_TIMEOUT", 10.0),
+        hedge=env.bool("CHIPP_HEDGE", False),
+        hedge_min_delay=env.float("CHIPP_HEDGE_MIN_DELAY", 1.0),
+        hedge_max_ratio=env.float("CHIPP_HEDGE_MAX_RATIO", 0.1),
+        breaker_failures=env.int("CHIPP_BREAKER_FAILURES", 5),
+        breaker_recovery=env.float("CHIPP_BREAKER_RECOVERY", 30.0),
+    )
+
+    if ai_settings.stream_read_timeout <= 0 or ai_settings.hedge_min_delay <= 0:
+        raise ValueError("CHIPP_STREAM_READ_TIMEOUT and CHIPP_HEDGE_MIN_DELAY must be positive")
+
+    if not 0 < ai_settings.hedge_max_ratio <= 1:
+        raise ValueError("CHIPP_HEDGE_MAX_RATIO must be in (0, 1]")
+
+    if ai_settings.breaker_failures < 0 or ai_settings.breaker_recovery <= 0:
+        raise ValueError("CHIPP_BREAKER_FAILURES must be non-negative and CHIPP_BREAKER_RECOVERY positive")
+
+    translation_cache_settings = TranslationCacheSettings(
+        max_size=env.int("TRANSLATION_CACHE_SIZE", 1000),
+        ttl=env.float("TRANSLATION_CACHE_TTL", 86400.0) or None,
+        backend=env("TRANSLATION_CACHE_BACKEND", "memory"),
+        path=env("TRANSLATION_CACHE_PATH", ".cache/translations.sqlite3"),
+    )
+
+    if translation_cache_settings.backend not in ("memory", "disk", "postgres"):
+        raise ValueError("TRANSLATION_CACHE_BACKEND must be one of: memory, disk, postgres")
+
+    result_cache_settings = ResultCacheSettings(
+        max_size=env.int("RESULT_CACHE_SIZE", 10000),
+        version_ttl=env.float("RESULT_CACHE_VERSION_TTL", 5.0),
+    )
+
+    query_guard_settings = QueryGuardSettings(
+        statement_timeout_ms=env.int("QUERY_STATEMENT_TIMEOUT_MS", 5000),
+        work_mem=env("QUERY_WORK_MEM", "16MB"),
+        explain=env.bool("QUERY_EXPLAIN", True),
+        max_cost=env.float("QUERY_MAX_COST", 1_000_000.0),
+        max_rows=env.float("QUERY_MAX_ROWS", 0.0),
+        record_rejected=env.bool("QUERY_RECORD_REJECTED", True),
+    )
+
+    if query_guard_settings.statement_timeout_ms < 0:
+        raise ValueError("QUERY_STATEMENT_TIMEOUT_MS must not be negative")
+
+    intent_settings = IntentSettings(
+        enabled=env.bool("INTENTS_ENABLED", False),
+        default_year=env.int("INTENTS_DEFAULT_YEAR", 0) or None,
+    )
+
+    singleflight_settings = SingleFlightSettings(
+        enabled=env.bool("SINGLEFLIGHT_ENABLED", True),
+        llm_timeout=env.float("SINGLEFLIGHT_LLM_TIMEOUT", 60.0),
+        db_timeout=env.float("SINGLEFLIGHT_DB_TIMEOUT", 30.0),
+    )
+
+    scheduler_settings = SchedulerSettings(
+        enabled=env.bool("SCHEDULER_ENABLED", True),
+        workers=env.int("SCHEDULER_WORKERS", 16),
+        queue_size=env.int("SCHEDULER_QUEUE_SIZE", 100),
+        user_queue_size=env.int("SCHEDULER_USER_QUEUE_SIZE", 3),
+        llm_concurrency=env.int("SCHEDULER_LLM_CONCURRENCY", 4),
+        llm_rate=env.float("SCHEDULER_LLM_RATE", 5.0),
+        llm_burst=env.float("SCHEDULER_LLM_BURST", 10.0),
+        db_concurrency=env.int("SCHEDULER_DB_CONCURRENCY", 8),
+    )
+
+    if min(scheduler_settings.workers, scheduler_settings.llm_concurrency, scheduler_settings.db_concurrency) <= 0:
+        raise ValueError("SCHEDULER_WORKERS, SCHEDULER_LLM_CONCURRENCY and SCHEDULER_DB_CONCURRENCY must be positive")
+
+    batch_settings = BatchSettings(
+        enabled=env.bool("BATCH_ENABLED", True),
+        max_questions=env.int("BATCH_MAX_QUESTIONS", 10),
     )
 
+    if batch_settings.max_questions < 2:
+        raise ValueError("BATCH_MAX_QUESTIONS must be at least 2")
+
+    prompt_settings = PromptSettings(
+        retrieval=env.bool("PROMPT_RETRIEVAL", False),
+        examples_k=env.int("PROMPT_EXAMPLES_K", 3),
+        examples_path=env("PROMPT_EXAMPLES_PATH", ".cache/prompt_examples.sqlite3"),
+        max_examples=env.int("PROMPT_EXAMPLES_MAX", 5000),
+        min_score=env.float("PROMPT_EXAMPLES_MIN_SCORE", 0.1),
+        verify_successes=env.int("PROMPT_VERIFY_SUCCESSES", 3),
+    )
+
+    if prompt_settings.examples_k < 1 or prompt_settings.max_examples < 0:
+        raise ValueError("PROMPT_EXAMPLES_K must be at least 1 and PROMPT_EXAMPLES_MAX non-negative")
+    if prompt_settings.verify_successes < 1:
+        raise ValueError("PROMPT_VERIFY_SUCCESSES must be at least 1")
+
+    columnar_settings = ColumnarSettings(
+        enabled=env.bool("COLUMNAR_ENABLED", False),
+        path=env("COLUMNAR_PATH", ".cache/columnar"),
+    )
+
+    metrics_settings = MetricsSettings(
+        enabled=env.bool("METRICS_ENABLED", True),
+        host=env("METRICS_HOST", "127.0.0.1"),
+        port=env.int("METRICS_PORT", 9100),
+        slow_query_ms=env.int("METRICS_SLOW_QUERY_MS", 1000),
+        trace_ids=env.bool("METRICS_TRACE_IDS", True),
+    )
+
+    load_settings = LoadSettings(
+        path=env("LOAD_DATA_PATH", "infrastructure/load_data/videos.json"),
+        mode=env("LOAD_MODE", "full"),
+        method=env("LOAD_METHOD", "executemany"),
+        batch_size=env.int("LOAD_BATCH_SIZE", 5000),
+        workers=env.int("LOAD_WORKERS", 0) or os.cpu_count() or 1,
+        incremental=env.bool("LOAD_INCREMENTAL", False),
+    )
+
+    if load_settings.mode not in ("full", "stream", "chunked", "parallel"):
+        raise ValueError("LOAD_MODE must be one of: full, stream, chunked, parallel")
+
+    if load_settings.method not in ("executemany", "copy"):
+        raise ValueError("LOAD_METHOD must be one of: executemany, copy")
+
     logger.info("Configuration loaded successfully")
 
     return Config(
-        bot=BotSettings(token=token),
+        bot=bot_settings,
+        webhook=webhook_settings,
         db=db,
         log=logg_settings,
-        ai=ai_settings
-    )
\ No newline at end of file
+        ai=ai_settings,
+        translation_cache=translation_cache_settings,
+        result_cache=result_cache_settings,
+        query_guard=query_guard_settings,
+        intents=intent_settings,
+        singleflight=singleflight_settings,
+        scheduler=scheduler_settings,
+        batch=batch_settings,
+        prompt=prompt_settings,
+        columnar=columnar_settings,
+        metrics=metrics_settings,
+        load=load_settings,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_config(path: str | None = None) -> Config:
+    """
+    Возвращает конфигурацию процесса, читая окружение только при первом вызове.
+    Модули не загружают настройки при импорте: их вызывает точка входа (`main`, миграция, загрузчик).
+    """
+    return load_config(path)
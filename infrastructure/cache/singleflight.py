@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых вызовов (single-flight).
+
+    Пока вызов по ключу выполняется, остальные вызовы с тем же ключом не запускают свою
+    работу, а ждут общий результат: все получают одно и то же значение или одно и то же
+    исключение. После завершения ключ освобождается — это не кеш.
+
+    Общая работа выполняется в отдельной задаче и ограничена `timeout` секунд на ключ
+    (по истечении все ожидающие получают `asyncio.TimeoutError`). Отмена одного ожидающего
+    не отменяет работу для остальных; работа отменяется, только когда не осталось ни одного
+    ожидающего.
+    """
+
+    def __init__(self, *, timeout: Optional[float] = None) -> None:
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.abandoned = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(self._run(fn)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, key=key: self._finish(key, task))
+            self.leaders += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            # shield: отмена этого ожидающего не должна отменять общую задачу
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                self.abandoned += 1
+                logger.debug("Все ожидающие ключа %r отменены, общая задача отменяется", key)
+                # Новые вызовы с этим ключом не должны присоединиться к отменяемой задаче
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    async def _run(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if self.timeout is None:
+            return await fn()
+        try:
+            return await asyncio.wait_for(fn(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
+        # Исключение уже получили ожидающие; без этого asyncio предупредит о непрочитанном исключении
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.shared
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "shared_rate": self.shared / total if total else 0.0,
+            "timeouts": self.timeouts,
+            "abandoned": self.abandoned,
+        }
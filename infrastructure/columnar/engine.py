@@ -0,0 +1,599 @@
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from infrastructure.columnar.export import COUNTERS, DELTAS, META_FILE, SNAPSHOT_TIMES, VIDEO_TIMES
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость, без неё движок не создаётся
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+_TOKEN_RE = re.compile(
+    r"\s+|(?P<str>'(?:[^']|'')*')|(?P<num>\d+(?:\.\d+)?)|(?P<param>%s)|(?P<op>>=|<=|<>|!=|::|[=<>(),*;.-])"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_]*)"
+)
+_OPS = ("=", "<>", "!=", "<", "<=", ">", ">=")
+_TYPES = ("date", "timestamp", "timestamptz")
+
+
+@dataclass(frozen=True)
+class Table:
+    """Как таблица из схемы БД считается по колоночным файлам."""
+
+    source: str
+    # Колонка времени, по которой отсортированы строки источника
+    time_column: str
+    # Колонка `day` считается по `time_column` (дневные агрегаты)
+    daily: bool = False
+    # Колонки, которые можно суммировать: имя в таблице -> столбец источника (None — число строк источника)
+    sums: Tuple[Tuple[str, Optional[str]], ...] = ()
+    # Колонки для условий сравнения с числом и для AVG/COUNT(col)
+    values: Tuple[str, ...] = ()
+    times: Tuple[str, ...] = ()
+    # Колонки-идентификаторы для условий `=` и COUNT(DISTINCT ...): имя -> столбец источника с номерами
+    keys: Tuple[Tuple[str, str], ...] = ()
+
+
+# Дневные агрегаты загрузчик строит по снапшотам и видео, поэтому их суммы считаются по тем же строкам:
+# день — `created_at::date` (`video_created_at::date` для публикаций) в часовом поясе сессии выгрузки
+TABLES: Dict[str, Table] = {
+    "videos": Table(
+        source="videos",
+        time_column="video_created_at",
+        sums=tuple((column, column) for column in COUNTERS),
+        values=COUNTERS,
+        times=VIDEO_TIMES,
+        keys=(("creator_id", "creator"), ("id", "id")),
+    ),
+    "video_snapshots": Table(
+        source="snapshots",
+        time_column="created_at",
+        sums=tuple((column, column) for column in COUNTERS + DELTAS),
+        values=COUNTERS + DELTAS,
+        times=SNAPSHOT_TIMES,
+        keys=(("video_id", "video"), ("id", None)),
+    ),
+    "daily_video_stats": Table(
+        source="snapshots",
+        time_column="created_at",
+        daily=True,
+        sums=tuple((column, column) for column in DELTAS) + (("snapshots_count", None),),
+        keys=(("video_id", "video"),),
+    ),
+    "daily_creator_stats": Table(
+        source="snapshots",
+        time_column="created_at",
+        daily=True,
+        sums=tuple((column, column) for column in DELTAS) + (("snapshots_count", None),),
+        keys=(("creator_id", "creator"),),
+    ),
+    "daily_video_publications": Table(
+        source="videos",
+        time_column="video_created_at",
+        daily=True,
+        sums=(("videos_count", None),),
+        keys=(("creator_id", "creator"),),
+    ),
+}
+
+
+class Unsupported(Exception):
+    """Запрос не входит в подмножество SQL, которое движок считает сам."""
+
+
+@dataclass(frozen=True)
+class Value:
+    # Строковый литерал, число или параметр `%s` (номер параметра в `text`)
+    kind: str
+    text: str
+    cast: Optional[str] = None
+    zone: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Predicate:
+    column: str
+    op: str
+    value: Value
+
+
+@dataclass(frozen=True)
+class Query:
+    table: str
+    function: str
+    column: Optional[str]
+    distinct: bool
+    coalesce: bool
+    predicates: Tuple[Predicate, ...]
+    params: int
+
+
+class _Parser:
+    """
+    Разбор запроса вида
+    `SELECT [COALESCE(]SUM|AVG|COUNT(...)[, 0)] [AS x] FROM <таблица> [alias] [WHERE <условия через AND>]`.
+    Условия — сравнения колонки с литералом или параметром, BETWEEN и скобки вокруг таких же конъюнкций.
+    """
+
+    def __init__(self, sql: str) -> None:
+        self.tokens: List[Tuple[str, str]] = []
+        position = 0
+        while position < len(sql):
+            match = _TOKEN_RE.match(sql, position)
+            if match is None:
+                raise Unsupported(f"символ {sql[position]!r}")
+            position = match.end()
+            if match.lastgroup is not None:
+                kind = match.lastgroup
+                text = match.group(kind)
+                self.tokens.append((kind, text.lower() if kind == "word" else text))
+        self.position = 0
+        self.params = 0
+        self.qualifiers = set()
+
+    def peek(self, offset: int = 0) -> Tuple[str, str]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else ("end", "")
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, text: str) -> bool:
+        if self.peek()[1] == text:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, text: str) -> None:
+        if not self.accept(text):
+            raise Unsupported(f"ожидалось {text!r}, получено {self.peek()[1]!r}")
+
+    def word(self) -> str:
+        kind, text = self.take()
+        if kind != "word":
+            raise Unsupported(f"ожидалось имя, получено {text!r}")
+        return text
+
+    def parse(self) -> Query:
+        self.expect("select")
+        coalesce = self.accept("coalesce")
+        if coalesce:
+            self.expect("(")
+        function, column, distinct = self.aggregate()
+        if coalesce:
+            self.expect(",")
+            if self.take() != ("num", "0"):
+                raise Unsupported("COALESCE не с нулём")
+            self.expect(")")
+        if self.accept("as"):
+            self.word()
+        elif self.peek()[0] == "word" and self.peek()[1] != "from":
+            self.word()
+
+        self.expect("from")
+        table = self.word()
+        if table not in TABLES:
+            raise Unsupported(f"таблица {table}")
+        self.qualifiers = {table}
+        if self.accept("as"):
+            self.qualifiers.add(self.word())
+        elif self.peek()[0] == "word" and self.peek()[1] != "where":
+            self.qualifiers.add(self.word())
+
+        predicates: List[Predicate] = []
+        if self.accept("where"):
+            self.conjunction(predicates)
+        self.accept(";")
+        if self.peek()[0] != "end":
+            raise Unsupported(f"лишнее {self.peek()[1]!r}")
+
+        if column is not None and column != "*":
+            column = self.unqualify(column)
+        return Query(table, function, column, distinct, coalesce, tuple(predicates), self.params)
+
+    def aggregate(self) -> Tuple[str, Optional[str], bool]:
+        function = self.word()
+        if function not in ("sum", "avg", "count"):
+            raise Unsupported(f"функция {function}")
+        self.expect("(")
+        distinct = function == "count" and self.accept("distinct")
+        if function == "count" and not distinct and self.accept("*"):
+            column = "*"
+        else:
+            column = self.column()
+        self.expect(")")
+        return function, column, distinct
+
+    def column(self) -> str:
+        name = self.word()
+        if self.accept("."):
+            name = f"{name}.{self.word()}"
+        return name
+
+    def unqualify(self, name: str) -> str:
+        qualifier, _, column = name.rpartition(".")
+        if qualifier and qualifier not in self.qualifiers:
+            raise Unsupported(f"колонка {name}")
+        return column
+
+    def conjunction(self, predicates: List[Predicate]) -> None:
+        self.predicate(predicates)
+        while self.accept("and"):
+            self.predicate(predicates)
+
+    def predicate(self, predicates: List[Predicate]) -> None:
+        if self.accept("("):
+            self.conjunction(predicates)
+            self.expect(")")
+            return
+
+        column = self.unqualify(self.column())
+        if self.accept("between"):
+            lower = self.value()
+            self.expect("and")
+            upper = self.value()
+            predicates.append(Predicate(column, ">=", lower))
+            predicates.append(Predicate(column, "<=", upper))
+            return
+
+        op = self.take()[1]
+        if op not in _OPS:
+            raise Unsupported(f"оператор {op!r}")
+        predicates.append(Predicate(column, "<>" if op == "!=" else op, self.value()))
+
+    def value(self) -> Value:
+        kind, text = self.take()
+        if kind == "op" and text == "-" and self.peek()[0] == "num":
+            return Value("num", "-" + self.take()[1])
+        if kind == "num":
+            return Value("num", text)
+        if kind == "param":
+            self.params += 1
+            return Value("param", str(self.params - 1))
+
+        cast = None
+        if kind == "word" and text in _TYPES and self.peek()[0] == "str":
+            cast = text
+            kind, text = self.take()
+        if kind != "str":
+            raise Unsupported(f"значение {text!r}")
+        literal = text[1:-1].replace("''", "'")
+
+        if self.accept("::"):
+            cast = self.word()
+            if cast not in _TYPES:
+                raise Unsupported(f"приведение к {cast}")
+
+        zone = None
+        if self.peek()[1] == "at":
+            self.expect("at")
+            self.expect("time")
+            self.expect("zone")
+            kind, text = self.take()
+            # AT TIME ZONE переводит в момент времени только значение без часового пояса
+            if kind != "str" or cast != "timestamp":
+                raise Unsupported("AT TIME ZONE")
+            zone = text[1:-1]
+        return Value("str", literal, cast, zone)
+
+
+@lru_cache(maxsize=1024)
+def parse_query(sql: str) -> Optional[Query]:
+    """Разобранный запрос или None, если он не входит в поддерживаемое подмножество."""
+    try:
+        return _Parser(sql).parse()
+    except Unsupported as e:
+        logger.debug("Запрос не поддерживается колоночным движком (%s): %s", e, sql)
+        return None
+
+
+class ColumnarEngine:
+    """
+    Простые агрегаты по колоночным файлам `infrastructure/columnar/export.py` без запроса к БД.
+
+    Файлы открываются через `np.load(mmap_mode="r")` и перечитываются, когда меняется `current.json`
+    (проверяется не чаще раза в `check_interval` секунд). Считаются SUM, AVG и COUNT (в том числе
+    COUNT(DISTINCT) по видео и креаторам) по `videos`, `video_snapshots` и дневным агрегатам с условиями
+    на время и день (бинарный поиск по отсортированной колонке времени), креатора, видео и значения счётчиков.
+
+    `execute` возвращает значение, которое вернул бы PostgreSQL (AVG — float вместо numeric; к одному виду
+    их приводит `normalize_scalar` в `query_executor_db`), или промах (`is_miss`), если запрос не поддерживается,
+    файлов нет или их версия данных не совпадает с текущей, — тогда запрос выполняется в БД.
+    """
+
+    def __init__(self, path: str, *, check_interval: float = 1.0) -> None:
+        if np is None:
+            raise RuntimeError("Для колоночного движка нужен пакет numpy")
+        self.path = path
+        self.check_interval = check_interval
+
+        self._meta: Optional[Dict[str, Any]] = None
+        self._meta_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._arrays: Dict[str, Dict[str, Any]] = {}
+        self._creators: Dict[str, int] = {}
+        self._videos: Optional[Dict[str, int]] = None
+        self._zone: Optional[ZoneInfo] = None
+
+        self.answered = 0
+        self.unsupported = 0
+        self.stale = 0
+        self.reloads = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    @property
+    def data_version(self) -> Optional[int]:
+        return self._meta["data_version"] if self._meta is not None else None
+
+    def refresh(self, force: bool = False) -> None:
+        """Перечитывает файлы, если `current.json` изменился; без `force` — не чаще раза в `check_interval`."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        meta_path = os.path.join(self.path, META_FILE)
+        try:
+            mtime = os.stat(meta_path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            directory = os.path.join(self.path, meta["dir"])
+            arrays: Dict[str, Dict[str, Any]] = {"videos": {}, "snapshots": {}}
+            for name in os.listdir(directory):
+                source, _, rest = name.partition(".")
+                if source in arrays and rest.endswith(".npy"):
+                    arrays[source][rest[:-4]] = np.load(os.path.join(directory, name), mmap_mode="r")
+            with open(os.path.join(directory, "creators.json"), encoding="utf-8") as f:
+                creators = {creator: code for code, creator in enumerate(json.load(f))}
+            zone = ZoneInfo(meta["timezone"])
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Не удалось открыть колоночные файлы в %s: %s", self.path, e)
+            return
+
+        self._meta, self._meta_mtime = meta, mtime
+        self._arrays, self._creators, self._zone = arrays, creators, zone
+        self._videos = None
+        self.reloads += 1
+        logger.info(
+            "Колоночные файлы версии %d открыты: %d видео, %d снапшотов",
+            meta["data_version"], meta["videos"], meta["snapshots"],
+        )
+
+    def _video_codes(self) -> Dict[str, int]:
+        # Словарь идентификаторов видео нужен только для условий по video_id, поэтому строится при первом таком запросе
+        if self._videos is None:
+            ids = np.load(os.path.join(self.path, self._meta["dir"], "video_ids.npy"))
+            self._videos = {video_id.decode(): code for code, video_id in enumerate(ids)}
+        return self._videos
+
+    def execute(self, sql: str, params: tuple | None, version: int) -> Any:
+        """Значение запроса при версии данных `version` или промах."""
+        self.refresh()
+        if self._meta is None or self._meta["data_version"] != version:
+            self.stale += 1
+            return _MISSING
+
+        query = parse_query(sql)
+        if query is None or query.params != len(params or ()):
+            self.unsupported += 1
+            return _MISSING
+
+        started = time.perf_counter()
+        try:
+            value = self._evaluate(query, tuple(params or ()))
+        except Unsupported as e:
+            logger.debug("Запрос не поддерживается колоночным движком (%s): %s", e, sql)
+            self.unsupported += 1
+            return _MISSING
+        self.seconds += time.perf_counter() - started
+        self.answered += 1
+        return value
+
+    @staticmethod
+    def is_miss(value: Any) -> bool:
+        return value is _MISSING
+
+    def _column(self, source: str, column: str) -> Any:
+        if self._meta["nulls"].get(f"{source}.{column}", False):
+            raise Unsupported(f"в {source}.{column} есть NULL")
+        return self._arrays[source][column]
+
+    def _literal(self, value: Value, params: tuple) -> Any:
+        if value.kind == "param":
+            value = params[int(value.text)]
+            # Строковый параметр PostgreSQL приводит к типу колонки так же, как литерал
+            return Value("str", value) if isinstance(value, str) else value
+        if value.kind == "num":
+            return float(value.text) if "." in value.text else int(value.text)
+        return value
+
+    def _moment(self, value: Any) -> int:
+        """Момент времени в микросекундах Unix, как его понял бы PostgreSQL в часовом поясе сессии выгрузки."""
+        if isinstance(value, Value):
+            if value.cast == "date":
+                value = date.fromisoformat(value.text.strip()[:10])
+            else:
+                try:
+                    value_dt = datetime.fromisoformat(value.text.strip())
+                except ValueError:
+                    raise Unsupported(f"время {value.text!r}")
+                if value.cast == "timestamp":
+                    value_dt = value_dt.replace(tzinfo=ZoneInfo(value.zone) if value.zone else self._zone)
+                value = value_dt
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=self._zone)
+            return round(value.timestamp() * 1_000_000)
+        if isinstance(value, date):
+            return self._midnight(value)
+        raise Unsupported(f"время {value!r}")
+
+    def _day(self, value: Any) -> date:
+        # С датой сравнивается только дата: время в значении изменило бы границу дня
+        if isinstance(value, Value) and value.cast in (None, "date") and value.zone is None:
+            try:
+                return date.fromisoformat(value.text.strip()[:10])
+            except ValueError:
+                raise Unsupported(f"день {value.text!r}")
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return value
+        raise Unsupported(f"день {value!r}")
+
+    def _midnight(self, day: date) -> int:
+        return round(datetime(day.year, day.month, day.day, tzinfo=self._zone).timestamp() * 1_000_000)
+
+    def _evaluate(self, query: Query, params: tuple) -> Any:
+        table = TABLES[query.table]
+        arrays = self._arrays[table.source]
+        keys = dict(table.keys)
+        times = arrays[table.time_column]
+
+        # Условия на колонку сортировки сужают срез бинарным поиском, остальные становятся масками по срезу
+        lower, upper = 0, len(times)
+        filters: List[Tuple[str, str, Any]] = []
+        for predicate in query.predicates:
+            column, op = predicate.column, predicate.op
+            value = self._literal(predicate.value, params)
+
+            if column == "day" and table.daily:
+                day = self._day(value)
+                bounds = {
+                    "=": (day, day + timedelta(days=1)),
+                    ">=": (day, None),
+                    ">": (day + timedelta(days=1), None),
+                    "<": (None, day),
+                    "<=": (None, day + timedelta(days=1)),
+                }.get(op)
+                if bounds is None:
+                    raise Unsupported(f"day {op}")
+                if bounds[0] is not None:
+                    lower = max(lower, int(np.searchsorted(times, self._midnight(bounds[0]), "left")))
+                if bounds[1] is not None:
+                    upper = min(upper, int(np.searchsorted(times, self._midnight(bounds[1]), "left")))
+
+            elif column == table.time_column and not table.daily:
+                moment = self._moment(value)
+                if op in (">=", "="):
+                    lower = max(lower, int(np.searchsorted(times, moment, "left")))
+                if op == ">":
+                    lower = max(lower, int(np.searchsorted(times, moment, "right")))
+                if op == "<":
+                    upper = min(upper, int(np.searchsorted(times, moment, "left")))
+                if op in ("<=", "="):
+                    upper = min(upper, int(np.searchsorted(times, moment, "right")))
+                if op == "<>":
+                    filters.append((table.time_column, op, moment))
+
+            elif column in table.times:
+                filters.append((column, op, self._moment(value)))
+
+            elif column in table.values:
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    raise Unsupported(f"{column} {op} {value!r}")
+                filters.append((column, op, value))
+
+            elif keys.get(column) in ("creator", "video") and op in ("=", "<>"):
+                if isinstance(value, Value):
+                    value = value.text
+                if keys[column] == "creator":
+                    code = self._creators.get(str(value), -1)
+                else:
+                    code = self._video_codes().get(str(value).replace("-", "").lower(), -1)
+                filters.append((keys[column], op, code))
+
+            else:
+                raise Unsupported(f"условие на {column}")
+
+        mask = None
+        size = max(0, upper - lower)
+        if size:
+            for column, op, value in filters:
+                matched = _compare(self._column(table.source, column)[lower:upper], op, value)
+                mask = matched if mask is None else mask & matched
+            if mask is not None:
+                size = int(np.count_nonzero(mask))
+
+        def selected(column: str) -> Any:
+            values = self._column(table.source, column)[lower:upper] if size else np.empty(0, dtype=np.int64)
+            return values if mask is None or not size else values[mask]
+
+        function, column = query.function, query.column
+        if function == "count" and query.distinct:
+            source_column = keys.get(column)
+            if source_column == "id" or (source_column is None and column in keys):
+                value = size
+            elif source_column in ("creator", "video"):
+                value = int(np.unique(selected(source_column)).size)
+            else:
+                raise Unsupported(f"COUNT(DISTINCT {column})")
+        elif function == "count":
+            # Строки дневных агрегатов — пары «видео/креатор, день», а не снапшоты
+            if table.daily or (column != "*" and column not in table.values and column not in table.times
+                               and column not in keys):
+                raise Unsupported(f"COUNT({column}) из {query.table}")
+            if column in table.values or column in table.times:
+                self._column(table.source, column)
+            value = size
+        elif function == "sum":
+            sums = dict(table.sums)
+            if column not in sums:
+                raise Unsupported(f"SUM({column}) из {query.table}")
+            if sums[column] is None:
+                value = size if size else None
+            else:
+                value = int(selected(sums[column]).sum(dtype=np.int64)) if size else None
+        else:
+            if table.daily or column not in table.values:
+                raise Unsupported(f"AVG({column}) из {query.table}")
+            value = float(selected(column).mean(dtype=np.float64)) if size else None
+
+        if value is None and query.coalesce:
+            return 0
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "data_version": self.data_version,
+            "answered": self.answered,
+            "unsupported": self.unsupported,
+            "stale": self.stale,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "avg_ms": round(self.seconds / self.answered * 1000, 3) if self.answered else 0.0,
+        }
+
+
+def _compare(values: Any, op: str, value: Any) -> Any:
+    if op == "=":
+        return values == value
+    if op == "<>":
+        return values != value
+    if op == "<":
+        return values < value
+    if op == "<=":
+        return values <= value
+    if op == ">":
+        return values > value
+    return values >= value
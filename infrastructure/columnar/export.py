@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg_pool import AsyncConnectionPool
+
+from infrastructure.database.data_version import get_data_version
+
+try:
+    import numpy as np
+except ImportError:  # numpy — необязательная зависимость, без неё колоночные файлы не строятся
+    np = None
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "current.json"
+
+# Счётчики видео и снапшотов; в файлах все числа — int64, время — микросекунды Unix (UTC)
+COUNTERS = ("views_count", "likes_count", "comments_count", "reports_count")
+DELTAS = tuple(f"delta_{column}" for column in COUNTERS)
+VIDEO_TIMES = ("video_created_at", "created_at")
+SNAPSHOT_TIMES = ("created_at",)
+
+# Номера видео и креаторов — позиции в словарях `video_ids.npy` и `creators.json`.
+# Видео нумеруются в порядке выгрузки (по video_created_at), поэтому номер видео — это и номер его строки
+_VIDEO_CODES = """
+    SELECT id,
+           (row_number() OVER (ORDER BY video_created_at, id) - 1)::int AS code,
+           (dense_rank() OVER (ORDER BY creator_id) - 1)::int AS creator_code
+    FROM videos
+"""
+
+
+def _micros(column: str) -> str:
+    # Пропуски (videos.created_at допускает NULL) выгружаются нулями, как и у счётчиков
+    return f"COALESCE((EXTRACT(EPOCH FROM {column}) * 1000000)::bigint, 0)"
+
+
+def _value(column: str) -> str:
+    return f"COALESCE({column}, 0)"
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+def _new_array(directory: str, name: str, dtype: Any, length: int) -> Any:
+    return np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+", dtype=dtype, shape=(length,))
+
+
+async def _null_counts(cur: Any, table: str, columns: Tuple[str, ...]) -> Tuple[int, Dict[str, bool]]:
+    # Пропуски выгружаются нулями; движок не отвечает по колонкам, где они есть, — там SUM/AVG/COUNT считает иначе
+    await cur.execute(
+        f"SELECT count(*), {', '.join(f'count(*) - count({column})' for column in columns)} FROM {table}"
+    )
+    row = await cur.fetchone()
+    return row[0], {column: bool(nulls) for column, nulls in zip(columns, row[1:])}
+
+
+async def _fill(
+    connection: Any,
+    name: str,
+    sql: str,
+    arrays: List[Tuple[Any, Any]],
+    length: int,
+    batch_size: int,
+    ids: Optional[List[str]] = None,
+) -> None:
+    """
+    Читает запрос серверным курсором пачками по `batch_size` строк и раскладывает столбцы по массивам.
+    Первый столбец при заданном `ids` — идентификатор видео, он собирается в список, а не в массив.
+    """
+    offset = 0
+    skip = 1 if ids is not None else 0
+    async with connection.cursor(name=name) as cur:
+        await cur.execute(sql)
+        while True:
+            rows = await cur.fetchmany(batch_size)
+            if not rows:
+                break
+            if ids is not None:
+                ids.extend(row[0] for row in rows)
+            block = np.array([row[skip:] for row in rows], dtype=np.int64)
+            for j, (array, dtype) in enumerate(arrays):
+                array[offset:offset + len(rows)] = block[:, j].astype(dtype)
+            offset += len(rows)
+
+    if offset != length:
+        raise RuntimeError(f"{name}: выгружено {offset} строк из {length}")
+
+
+async def export_columnar(pool: AsyncConnectionPool, directory: str, *, batch_size: int = 50000) -> Dict[str, Any]:
+    """
+    Выгружает `videos` и `video_snapshots` в колоночные файлы `.npy` для `ColumnarEngine`.
+
+    Всё читается в одной транзакции REPEATABLE READ, поэтому файлы соответствуют одной версии данных.
+    Файлы пишутся в новый каталог `<directory>/v<версия>-<время>`, затем атомарно (`os.replace`) заменяется
+    `<directory>/current.json` с версией, часовым поясом сессии (границы дней для `day`) и флагами пропусков.
+    Остальные каталоги, кроме предыдущего, удаляются — бот мог ещё не перечитать метаданные.
+
+    Returns:
+        Dict[str, Any]: Записанные метаданные.
+    """
+    if np is None:
+        raise RuntimeError("Для колоночных файлов нужен пакет numpy")
+
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_meta(directory)
+    target: Optional[str] = None
+
+    try:
+        async with pool.connection() as connection:
+            async with connection.transaction():
+                async with connection.cursor() as cur:
+                    await cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                    await cur.execute("SELECT current_setting('TimeZone')")
+                    timezone = (await cur.fetchone())[0]
+                    version = await get_data_version(connection)
+                    if version is None:
+                        raise RuntimeError("Таблица data_version не найдена")
+
+                    videos, video_nulls = await _null_counts(cur, "videos", VIDEO_TIMES + COUNTERS)
+                    snapshots, snapshot_nulls = await _null_counts(
+                        cur, "video_snapshots", SNAPSHOT_TIMES + COUNTERS + DELTAS
+                    )
+                    await cur.execute("SELECT DISTINCT creator_id FROM videos ORDER BY creator_id")
+                    creators = [row[0] for row in await cur.fetchall()]
+
+                target = os.path.join(directory, f"v{version}-{int(time.time() * 1000)}")
+                os.makedirs(target)
+
+                video_columns = [("creator", np.int32)] + [(c, np.int64) for c in VIDEO_TIMES + COUNTERS]
+                video_arrays = [
+                    (_new_array(target, f"videos.{name}", dtype, videos), dtype) for name, dtype in video_columns
+                ]
+                video_ids: List[str] = []
+                await _fill(
+                    connection,
+                    "columnar_videos",
+                    f"""
+                    SELECT replace(v.id::text, '-', ''), c.creator_code,
+                           {', '.join(_micros(f'v.{c}') if c in VIDEO_TIMES else _value(f'v.{c}') for c in VIDEO_TIMES + COUNTERS)}
+                    FROM videos v
+                    JOIN ({_VIDEO_CODES}) c ON c.id = v.id
+                    ORDER BY c.code
+                    """,
+                    video_arrays,
+                    videos,
+                    batch_size,
+                    ids=video_ids,
+                )
+
+                snapshot_columns = (
+                    [("video", np.int32), ("creator", np.int32)]
+                    + [(c, np.int64) for c in SNAPSHOT_TIMES + COUNTERS + DELTAS]
+                )
+                snapshot_arrays = [
+                    (_new_array(target, f"snapshots.{name}", dtype, snapshots), dtype)
+                    for name, dtype in snapshot_columns
+                ]
+                await _fill(
+                    connection,
+                    "columnar_snapshots",
+                    f"""
+                    SELECT c.code, c.creator_code,
+                           {', '.join(_micros(f's.{c}') if c in SNAPSHOT_TIMES else _value(f's.{c}') for c in SNAPSHOT_TIMES + COUNTERS + DELTAS)}
+                    FROM video_snapshots s
+                    JOIN ({_VIDEO_CODES}) c ON c.id = s.video_id
+                    ORDER BY s.created_at
+                    """,
+                    snapshot_arrays,
+                    snapshots,
+                    batch_size,
+                )
+
+        for array, _ in video_arrays + snapshot_arrays:
+            array.flush()
+        np.save(os.path.join(target, "video_ids.npy"), np.array(video_ids, dtype="S32"))
+        with open(os.path.join(target, "creators.json"), "w", encoding="utf-8") as f:
+            json.dump(creators, f, ensure_ascii=False)
+
+    except BaseException:
+        if target is not None:
+            shutil.rmtree(target, ignore_errors=True)
+        raise
+
+    meta = {
+        "dir": os.path.basename(target),
+        "data_version": version,
+        "timezone": timezone,
+        "videos": videos,
+        "snapshots": snapshots,
+        "nulls": {
+            **{f"videos.{column}": nulls for column, nulls in video_nulls.items()},
+            **{f"snapshots.{column}": nulls for column, nulls in snapshot_nulls.items()},
+        },
+        "exported_at": time.time(),
+    }
+    tmp_path = os.path.join(directory, META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(directory, META_FILE))
+
+    keep = {meta["dir"], previous.get("dir") if previous else None}
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    logger.info(
+        "Колоночные файлы версии %d записаны в %s: %d видео, %d снапшотов за %.1f с",
+        version, target, videos, snapshots, time.perf_counter() - started,
+    )
+    return meta
+
+
+def _read_meta(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
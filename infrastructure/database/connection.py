@@ -2,6 +2,7 @@ import logging
 from urllib.parse import quote
 
 from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
 
 logger = logging.getLogger(__name__)
 
@@ -53,4 +54,50 @@ async def get_pg_connection(
         logger.exception("Failed to connect to PostgreSQL: %s", e)
         if connection:
             await connection.close()
-        raise
\ No newline at end of file
+        raise
+
+
+# Функция, создающая и открывающая общий для процесса пул соединений с СУБД PostgreSQL
+async def create_pg_pool(
+    db_name: str,
+    host: str,
+    port: int,
+    user: str,
+    password: str,
+    *,
+    min_size: int = 1,
+    max_size: int = 10,
+    max_idle: float = 300.0,
+    max_lifetime: float = 3600.0,
+    timeout: float = 5.0,
+    check: bool = True,
+    timezone: str | None = None,
+) -> AsyncConnectionPool:
+    conninfo = build_pg_conninfo(db_name, host, port, user, password)
+    # Единый часовой пояс сессий: от него зависят границы дней в `created_at::date` и в агрегатах
+    kwargs = {"options": f"-c TimeZone={timezone}"} if timezone else None
+    pool = AsyncConnectionPool(
+        conninfo=conninfo,
+        kwargs=kwargs,
+        min_size=min_size,
+        max_size=max_size,
+        max_idle=max_idle,
+        max_lifetime=max_lifetime,
+        timeout=timeout,
+        # Проверка соединения перед выдачей: «мёртвые» соединения отбрасываются пулом
+        check=AsyncConnectionPool.check_connection if check else None,
+        open=False,
+    )
+
+    try:
+        await pool.open(wait=True, timeout=timeout)
+        async with pool.connection() as connection:
+            await log_db_version(connection)
+        logger.info(
+            "PostgreSQL connection pool opened (min_size=%d, max_size=%d)", min_size, max_size
+        )
+        return pool
+    except Exception as e:
+        logger.exception("Failed to open PostgreSQL connection pool: %s", e)
+        await pool.close()
+        raise
@@ -0,0 +1,34 @@
+import logging
+
+from psycopg import AsyncConnection, AsyncCursor
+from psycopg.errors import UndefinedTable
+
+logger = logging.getLogger(__name__)
+
+
+# Функция, увеличивающая счётчик версии данных; вызывается в транзакции загрузки данных
+async def bump_data_version(cursor: AsyncCursor) -> int:
+    await cursor.execute(
+        """
+        INSERT INTO data_version (id, version, updated_at) VALUES (1, 1, NOW())
+        ON CONFLICT (id) DO UPDATE SET
+            version = data_version.version + 1,
+            updated_at = NOW()
+        RETURNING version;
+        """
+    )
+    row = await cursor.fetchone()
+    logger.info("Версия данных увеличена до %d", row[0])
+    return row[0]
+
+
+# Функция, возвращающая текущую версию данных (None, если таблица версий ещё не создана)
+async def get_data_version(connection: AsyncConnection) -> int | None:
+    try:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT version FROM data_version WHERE id = 1;")
+            row = await cursor.fetchone()
+    except UndefinedTable:
+        logger.warning("Таблица data_version не найдена, кеш результатов отключён")
+        return None
+    return row[0] if row else 0
@@ -0,0 +1,207 @@
+import logging
+from datetime import date
+from typing import List
+
+from psycopg import AsyncCursor, sql
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "video_snapshots"
+DEFAULT_PARTITION = "video_snapshots_default"
+LEGACY_TABLE = "video_snapshots_legacy"
+
+PARTITIONED_SNAPSHOTS_DDL = """
+CREATE TABLE IF NOT EXISTS video_snapshots (
+    id UUID NOT NULL,
+    video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    views_count BIGINT,
+    likes_count BIGINT,
+    comments_count BIGINT,
+    reports_count BIGINT,
+    delta_views_count BIGINT,
+    delta_likes_count BIGINT,
+    delta_comments_count BIGINT,
+    delta_reports_count BIGINT,
+    created_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS video_snapshots_default PARTITION OF video_snapshots DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_video_snapshots_created_at_brin
+    ON video_snapshots USING brin (created_at);
+
+CREATE INDEX IF NOT EXISTS idx_video_snapshots_video_id_created_at
+    ON video_snapshots(video_id, created_at);
+"""
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+# Функция, проверяющая, что таблица снапшотов секционирована
+async def is_partitioned(cur: AsyncCursor) -> bool:
+    await cur.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+        );
+        """,
+        (PARENT_TABLE,),
+    )
+    return (await cur.fetchone())[0]
+
+
+# Функция, создающая и присоединяющая месячную секцию.
+# ATTACH PARTITION берёт SHARE UPDATE EXCLUSIVE на родительскую таблицу, но ACCESS EXCLUSIVE
+# на DEFAULT-секцию (она проверяется на строки нового диапазона), а DEFAULT-секция есть всегда.
+# Поэтому функцию нельзя вызывать в транзакции загрузки или параллельно с открытыми транзакциями,
+# которые пишут в снапшоты: блокировка держалась бы до конца транзакции и останавливала бы запросы бота,
+# а ожидание чужих транзакций могло бы не закончиться. Вызывающий выполняет её отдельной короткой
+# транзакцией с lock_timeout до начала загрузки (см. `prepare_snapshot_partitions` в загрузчике)
+async def create_month_partition(cur: AsyncCursor, month: date) -> None:
+    month = month_start(month)
+    name = sql.Identifier(partition_name(month))
+    parent = sql.Identifier(PARENT_TABLE)
+    lower, upper = month, add_months(month, 1)
+
+    await cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (partition_name(month),))
+    if (await cur.fetchone())[0]:
+        return
+
+    # Таблица создаётся отдельно и присоединяется ниже: CREATE TABLE ... PARTITION OF взял бы
+    # ACCESS EXCLUSIVE ещё и на родительскую таблицу
+    await cur.execute(
+        sql.SQL("CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+        .format(name=name, parent=parent)
+    )
+
+    # Строки этого месяца, уже попавшие в DEFAULT-секцию, переносятся в новую секцию
+    await cur.execute(
+        sql.SQL(
+            """
+            WITH moved AS (
+                DELETE FROM {default} WHERE created_at >= %s AND created_at < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved;
+            """
+        ).format(name=name, default=sql.Identifier(DEFAULT_PARTITION)),
+        (lower, upper),
+    )
+    if cur.rowcount:
+        logger.info("%d строк перенесено из DEFAULT-секции в %s", cur.rowcount, partition_name(month))
+
+    # DDL не поддерживает параметры запроса, поэтому границы подставляются как литералы
+    await cur.execute(
+        sql.SQL("ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper});")
+        .format(name=name, parent=parent, lower=sql.Literal(lower), upper=sql.Literal(upper))
+    )
+    logger.info("Создана секция %s [%s, %s)", partition_name(month), lower, upper)
+
+
+# Функция, гарантирующая наличие месячных секций с `start` по `end` включительно
+async def ensure_snapshot_partitions(cur: AsyncCursor, start: date, end: date) -> None:
+    month = month_start(start)
+    while month <= end:
+        await create_month_partition(cur, month)
+        month = add_months(month, 1)
+
+
+# Функция, отсоединяющая секции старше `before` (данные остаются в отдельных таблицах)
+async def detach_partitions_before(cur: AsyncCursor, before: date) -> List[str]:
+    await cur.execute(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s AND c.relname ~ '_y[0-9]{4}m[0-9]{2}$'
+        ORDER BY c.relname;
+        """,
+        (PARENT_TABLE,),
+    )
+    detached = []
+    for (name,) in await cur.fetchall():
+        month = date(int(name[-7:-3]), int(name[-2:]), 1)
+        if add_months(month, 1) <= before:
+            await cur.execute(
+                sql.SQL("ALTER TABLE {} DETACH PARTITION {};")
+                .format(sql.Identifier(PARENT_TABLE), sql.Identifier(name))
+            )
+            detached.append(name)
+            logger.info("Секция %s отсоединена", name)
+    return detached
+
+
+# Функция, создающая секционированную таблицу снапшотов или переводящая в неё существующую обычную таблицу
+async def setup_partitioned_snapshots(cur: AsyncCursor, months_ahead: int) -> None:
+    await cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (PARENT_TABLE,))
+    exists = (await cur.fetchone())[0]
+
+    if exists and await is_partitioned(cur):
+        logger.info("Таблица %s уже секционирована", PARENT_TABLE)
+    elif exists:
+        logger.info("Перевод таблицы %s в секционированную схему...", PARENT_TABLE)
+        # Старые имена индексов и ограничений освобождаются для новой таблицы
+        await cur.execute(
+            sql.SQL(
+                """
+                ALTER TABLE {parent} RENAME TO {legacy};
+                ALTER TABLE {legacy} RENAME CONSTRAINT video_snapshots_pkey TO video_snapshots_legacy_pkey;
+                DROP INDEX IF EXISTS idx_video_snapshots_video_id;
+                DROP INDEX IF EXISTS idx_video_snapshots_created_at;
+                DROP INDEX IF EXISTS idx_video_snapshots_video_id_created_at;
+                """
+            ).format(parent=sql.Identifier(PARENT_TABLE), legacy=sql.Identifier(LEGACY_TABLE))
+        )
+        await cur.execute(PARTITIONED_SNAPSHOTS_DDL)
+
+        await cur.execute(
+            sql.SQL("SELECT MIN(created_at)::date, MAX(created_at)::date FROM {};")
+            .format(sql.Identifier(LEGACY_TABLE))
+        )
+        first, last = await cur.fetchone()
+        if first is not None:
+            await ensure_snapshot_partitions(cur, first, last)
+
+        await cur.execute(
+            sql.SQL(
+                """
+                INSERT INTO {parent} (
+                    id, video_id,
+                    views_count, likes_count, comments_count, reports_count,
+                    delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                    created_at, updated_at
+                )
+                SELECT id, video_id,
+                       views_count, likes_count, comments_count, reports_count,
+                       delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                       created_at, updated_at
+                FROM {legacy};
+                """
+            ).format(parent=sql.Identifier(PARENT_TABLE), legacy=sql.Identifier(LEGACY_TABLE))
+        )
+        moved = cur.rowcount
+        await cur.execute(sql.SQL("DROP TABLE {};").format(sql.Identifier(LEGACY_TABLE)))
+        logger.info("Перенесено %d снапшотов в секционированную таблицу", moved)
+    else:
+        await cur.execute(PARTITIONED_SNAPSHOTS_DDL)
+        logger.info("Создана секционированная таблица %s", PARENT_TABLE)
+
+    # Секции на текущий месяц и `months_ahead` месяцев вперёд
+    today = date.today()
+    await ensure_snapshot_partitions(cur, today, add_months(today, months_ahead))
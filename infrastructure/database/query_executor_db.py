@@ -1,74 +1,356 @@
 import asyncio
 import logging
-from typing import Any
+import math
+import time
+from contextlib import nullcontext
+from decimal import Decimal
+from typing import Any, AsyncContextManager, Dict, List, Tuple
 
-from psycopg import AsyncConnection
+from psycopg import errors
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 
-from config.config import Config, load_config
-from infrastructure.database.connection import get_pg_connection
+from infrastructure.cache.singleflight import SingleFlight
+from infrastructure.columnar.engine import ColumnarEngine
+from infrastructure.database.query_guard import QueryGuard, QueryRejectedError
+from infrastructure.database.result_cache import ResultCache, canonicalize_sql
+from infrastructure.monitoring.metrics import Metrics
 
-# Загрузка конфигурации
-config: Config = load_config()
-
-logging.basicConfig(
-    level=logging.getLevelName(config.log.level),
-    format=config.log.format,
-)
 logger = logging.getLogger(__name__)
 
+# Знаков после запятой в дробном результате (AVG и деление)
+SCALAR_DIGITS = 2
+
 
-async def execute_scalar_query(sql_query: str) -> Any:
+def normalize_scalar(value: Any) -> Any:
+    """
+    Приводит число из результата к одному виду, кто бы его ни посчитал: PostgreSQL возвращает SUM и AVG
+    как numeric (Decimal), колоночный движок — как int и float. Целое значение становится int,
+    дробное — float, округлённым до `SCALAR_DIGITS` знаков, поэтому текст ответа не зависит от источника.
+    """
+    if not isinstance(value, (float, Decimal)) or not math.isfinite(value):
+        return value
+    if value % 1 == 0:
+        return int(value)
+    return round(float(value), SCALAR_DIGITS)
+
+
+async def execute_scalar_query(
+    pool: AsyncConnectionPool,
+    sql_query: str,
+    params: tuple | None = None,
+    *,
+    result_cache: ResultCache | None = None,
+    guard: QueryGuard | None = None,
+    singleflight: SingleFlight | None = None,
+    limiter: AsyncContextManager | None = None,
+    metrics: Metrics | None = None,
+    columnar: ColumnarEngine | None = None,
+) -> Any:
     """
     Выполняет SQL-запрос, который возвращает ровно одно значение (одно число).
 
     Args:
+        pool (AsyncConnectionPool): Общий пул соединений с БД.
         sql_query (str): Валидный SQL-запрос, возвращающий одну строку и один столбец.
+        params (tuple | None): Параметры запроса для плейсхолдеров `%s`.
+        result_cache (ResultCache | None): Кеш результатов, привязанный к версии данных; запросы,
+            зависящие от времени выполнения (`NOW()`, `CURRENT_DATE`, ...), в нём не хранятся.
+        guard (QueryGuard | None): Ограничения для запроса: проверка таблиц, READ ONLY,
+            statement_timeout/work_mem и проверка плана через EXPLAIN.
+        singleflight (SingleFlight | None): Объединение одновременных одинаковых запросов
+            (по каноническому SQL и параметрам) в одно выполнение.
+        limiter (AsyncContextManager | None): Ограничитель одновременных запросов к БД,
+            захватывается только на время выполнения (не на время ожидания общего запроса).
+        metrics (Metrics | None): Метрики: время получения соединения и выполнения запроса,
+            попадания в кеш результатов, ошибки, таймауты и медленные запросы.
+        columnar (ColumnarEngine | None): Колоночные файлы для простых агрегатов; используются только
+            при известной версии данных (нужен `result_cache`) и совпадении её с версией файлов.
 
     Returns:
-        int | float | None: Одно число из результата запроса.
+        int | float | None: Одно число из результата запроса (см. `normalize_scalar`).
 
     Raises:
+        QueryRejectedError: Если запрос отклонён ограничениями `guard` или прерван по таймауту.
         Exception: Если запрос вернул не одно значение или произошла ошибка.
     """
-    connection: AsyncConnection | None = None
+    if guard is not None:
+        try:
+            guard.validate(sql_query)
+        except QueryRejectedError as rejection:
+            await guard.record(pool, sql_query, rejection)
+            raise
+
+    cache_key: tuple | None = None
     try:
-        connection = await get_pg_connection(
-            db_name=config.db.name,
-            host=config.db.host,
-            port=config.db.port,
-            user=config.db.user,
-            password=config.db.password,
-        )
+        # Запросы с NOW(), CURRENT_DATE и т. п. зависят от времени, а не только от версии данных
+        if result_cache is not None and result_cache.cacheable(sql_query):
+            version = await result_cache.current_version(pool)
+            if version is not None:
+                cache_key = result_cache.key(version, sql_query, params)
+                cached = result_cache.get(cache_key)
+                if not result_cache.is_miss(cached):
+                    if metrics is not None:
+                        metrics.cache_hit("result")
+                    logger.debug("Результат взят из кеша (версия данных %d)", version)
+                    return cached
 
-        async with connection:
-            async with connection.cursor(row_factory=dict_row) as cur:
-                await cur.execute(sql_query)
-                result = await cur.fetchone()
+                value = _from_columnar(columnar, sql_query, params, version, metrics)
+                if not _columnar_miss(value):
+                    result_cache.set(cache_key, value)
+                    return value
 
-                if result is None:
-                    logger.warning("Запрос не вернул данных: %s", sql_query.strip())
-                    return None
+        if singleflight is not None:
+            flight_key = (canonicalize_sql(sql_query), tuple(params) if params else ())
+            value = await singleflight.do(
+                flight_key, lambda: _fetch_scalar(pool, sql_query, params, guard, limiter, metrics)
+            )
+        else:
+            value = await _fetch_scalar(pool, sql_query, params, guard, limiter, metrics)
 
-                if len(result) != 1:
-                    raise ValueError(f"Запрос вернул больше одного столбца: {len(result)}")
+        if cache_key is not None:
+            result_cache.set(cache_key, value)
 
-                value = list(result.values())[0]
+        return value
 
-                if not isinstance(value, (int, float)):
-                    logger.warning("Результат не является числом: %s (тип: %s)", value, type(value))
+    except QueryRejectedError:
+        raise
 
-                return value
+    except asyncio.TimeoutError:
+        # Общий запрос не уложился в таймаут single-flight
+        if metrics is not None:
+            metrics.timeout("db")
+        logger.error("Таймаут выполнения запроса")
+        logger.debug("SQL: %s", sql_query)
+        raise
 
     except Exception as e:
+        if metrics is not None:
+            metrics.error("db")
         logger.error("Ошибка при выполнении запроса: %s", e)
         logger.debug("SQL: %s", sql_query)
         raise
-    finally:
-        if connection and not connection.closed:
-            await connection.close()
-            logger.debug("Подключение к БД закрыто")
 
 
-res = execute_scalar_query("SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots WHERE created_at::date = '2025-12-01'")
-print(res)
\ No newline at end of file
+async def execute_scalar_batch(
+    pool: AsyncConnectionPool,
+    queries: List[Tuple[str, tuple | None]],
+    *,
+    result_cache: ResultCache | None = None,
+    guard: QueryGuard | None = None,
+    limiter: AsyncContextManager | None = None,
+    metrics: Metrics | None = None,
+    columnar: ColumnarEngine | None = None,
+) -> List[Any]:
+    """
+    Выполняет несколько запросов, каждый из которых возвращает одно число, за один round trip:
+    запросы объединяются в `SELECT (q1) AS r1, (q2) AS r2, ...` и выполняются в одной транзакции
+    на одном соединении с теми же ограничениями `guard`, что и одиночные запросы.
+
+    Запросы, уже лежащие в кеше результатов или посчитанные по колоночным файлам `columnar`,
+    в общий запрос не попадают. Если общий запрос не выполнился (например, один из подзапросов
+    вернул несколько строк или план слишком дорогой), запросы выполняются по отдельности через `execute_scalar_query`, чтобы ошибка одного
+    не лишила ответа остальные.
+
+    Args:
+        pool (AsyncConnectionPool): Общий пул соединений с БД.
+        queries (List[Tuple[str, tuple | None]]): Пары «SQL, параметры» в порядке ответов.
+        result_cache, guard, limiter, metrics, columnar: Как в `execute_scalar_query`.
+
+    Returns:
+        List[Any]: Для каждого запроса — число (или None) либо исключение, с которым он завершился.
+    """
+    results: List[Any] = [None] * len(queries)
+    pending: List[int] = []
+
+    for i, (sql_query, _) in enumerate(queries):
+        if guard is not None:
+            try:
+                guard.validate(sql_query)
+            except QueryRejectedError as rejection:
+                await guard.record(pool, sql_query, rejection)
+                results[i] = rejection
+                continue
+        pending.append(i)
+
+    cache_keys: Dict[int, tuple] = {}
+    if result_cache is not None and pending:
+        version = await result_cache.current_version(pool)
+        if version is not None:
+            for i in list(pending):
+                sql_query, params = queries[i]
+                if not result_cache.cacheable(sql_query):
+                    continue
+                cache_keys[i] = result_cache.key(version, sql_query, params)
+                cached = result_cache.get(cache_keys[i])
+                if not result_cache.is_miss(cached):
+                    if metrics is not None:
+                        metrics.cache_hit("result")
+                    results[i] = cached
+                    pending.remove(i)
+                    continue
+
+                value = _from_columnar(columnar, sql_query, params, version, metrics)
+                if not _columnar_miss(value):
+                    result_cache.set(cache_keys[i], value)
+                    results[i] = value
+                    pending.remove(i)
+
+    if not pending:
+        return results
+
+    if len(pending) == 1:
+        combined = None
+    else:
+        combined_sql, combined_params = combine_scalar_queries([queries[i] for i in pending])
+        try:
+            combined = await _fetch_row(pool, combined_sql, combined_params, guard, limiter, metrics)
+        except Exception as e:
+            logger.warning("Общий запрос из %d подзапросов не выполнился (%s), выполняю по одному", len(pending), e)
+            combined = None
+
+    if combined is not None:
+        for i, value in zip(pending, combined.values()):
+            value = normalize_scalar(value)
+            results[i] = value
+            if i in cache_keys:
+                result_cache.set(cache_keys[i], value)
+        return results
+
+    # Запасной путь: каждый запрос отдельно, ошибки сохраняются в результатах
+    values = await asyncio.gather(
+        *(
+            execute_scalar_query(
+                pool, queries[i][0], queries[i][1],
+                result_cache=result_cache, guard=guard, limiter=limiter, metrics=metrics, columnar=columnar,
+            )
+            for i in pending
+        ),
+        return_exceptions=True,
+    )
+    for i, value in zip(pending, values):
+        results[i] = value
+    return results
+
+
+def combine_scalar_queries(queries: List[Tuple[str, tuple | None]]) -> Tuple[str, tuple | None]:
+    """Склеивает скалярные запросы в один `SELECT (q1) AS r1, ...` с общим списком параметров."""
+    has_params = any(params for _, params in queries)
+    parts: List[str] = []
+    combined_params: List[Any] = []
+
+    for i, (sql_query, params) in enumerate(queries, 1):
+        sql_query = sql_query.strip().rstrip(";").strip()
+        if has_params and not params:
+            # При переданных параметрах `%` в тексте остальных запросов (например, в LIKE) нужно экранировать
+            sql_query = sql_query.replace("%", "%%")
+        # Перенос строки перед скобкой: комментарий `--` в конце запроса не должен её закомментировать
+        parts.append(f"({sql_query}\n) AS r{i}")
+        combined_params.extend(params or ())
+
+    return "SELECT " + ",\n       ".join(parts), tuple(combined_params) if has_params else None
+
+
+_COLUMNAR_MISS = object()
+
+
+def _columnar_miss(value: Any) -> bool:
+    return value is _COLUMNAR_MISS
+
+
+# Функция, считающая запрос по колоночным файлам; промах — если движка нет или он не может ответить сам
+def _from_columnar(
+    columnar: ColumnarEngine | None,
+    sql_query: str,
+    params: tuple | None,
+    version: int,
+    metrics: Metrics | None,
+) -> Any:
+    if columnar is None:
+        return _COLUMNAR_MISS
+
+    started = time.perf_counter()
+    try:
+        value = columnar.execute(sql_query, params, version)
+    except Exception as e:
+        # Ошибка движка не должна лишать ответа: запрос просто выполняется в БД
+        logger.warning("Ошибка колоночного движка, запрос выполняется в БД: %s", e)
+        return _COLUMNAR_MISS
+    if columnar.is_miss(value):
+        return _COLUMNAR_MISS
+    value = normalize_scalar(value)
+
+    if metrics is not None:
+        metrics.observe("columnar", time.perf_counter() - started)
+        metrics.inc("columnar_answers")
+    logger.debug("Результат посчитан по колоночным файлам (версия данных %d)", version)
+    return value
+
+
+# Функция, выполняющая запрос в отдельной транзакции; при объединении запросов вызывается один раз на всех
+async def _fetch_scalar(
+    pool: AsyncConnectionPool,
+    sql_query: str,
+    params: tuple | None,
+    guard: QueryGuard | None,
+    limiter: AsyncContextManager | None = None,
+    metrics: Metrics | None = None,
+) -> Any:
+    result = await _fetch_row(pool, sql_query, params, guard, limiter, metrics)
+
+    if result is None:
+        logger.warning("Запрос не вернул данных: %s", sql_query.strip())
+        return None
+
+    if len(result) != 1:
+        raise ValueError(f"Запрос вернул больше одного столбца: {len(result)}")
+
+    value = normalize_scalar(list(result.values())[0])
+
+    if not isinstance(value, (int, float)):
+        logger.warning("Результат не является числом: %s (тип: %s)", value, type(value))
+
+    return value
+
+
+# Функция, возвращающая первую строку результата запроса, выполненного с ограничениями `guard`
+async def _fetch_row(
+    pool: AsyncConnectionPool,
+    sql_query: str,
+    params: tuple | None,
+    guard: QueryGuard | None,
+    limiter: AsyncContextManager | None = None,
+    metrics: Metrics | None = None,
+) -> Dict[str, Any] | None:
+    try:
+        async with limiter or nullcontext():
+            acquire_started = time.perf_counter()
+            async with pool.connection() as connection:
+                if metrics is not None:
+                    metrics.observe("pool_acquire", time.perf_counter() - acquire_started)
+
+                async with connection.transaction():
+                    async with connection.cursor(row_factory=dict_row) as cur:
+                        if guard is not None:
+                            await guard.prepare(cur, sql_query, params)
+
+                        started = time.perf_counter()
+                        try:
+                            await cur.execute(sql_query, params)
+                            return await cur.fetchone()
+                        finally:
+                            if metrics is not None:
+                                metrics.record_query(sql_query, time.perf_counter() - started, params)
+
+    except QueryRejectedError as rejection:
+        await guard.record(pool, sql_query, rejection)
+        raise
+
+    except Exception as e:
+        rejection = guard.rejection_from_error(e) if guard is not None else None
+        if rejection is None:
+            raise
+        if metrics is not None and isinstance(e, errors.QueryCanceled):
+            metrics.timeout("query")
+        await guard.record(pool, sql_query, rejection)
+        raise rejection from e
@@ -0,0 +1,182 @@
+import logging
+import re
+from typing import Iterable, Set
+
+from psycopg import AsyncCursor, errors
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, к которым разрешено обращаться SQL от LLM (вместе с секциями video_snapshots)
+ALLOWED_TABLES = frozenset({
+    "videos",
+    "video_snapshots",
+    "daily_video_stats",
+    "daily_creator_stats",
+    "daily_video_publications",
+})
+_PARTITION_RE = re.compile(r"^video_snapshots_(?:default|y\d{4}m\d{2})$")
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+# FROM внутри EXTRACT(field FROM x), SUBSTRING(x FROM n), TRIM(... FROM x) и т. п. не ссылается на таблицу
+_FUNCTION_FROM_RE = re.compile(r"\b(?:EXTRACT|SUBSTRING|TRIM|OVERLAY|POSITION)\s*\([^()]*?\bFROM\b", re.IGNORECASE)
+_CTE_RE = re.compile(r"(?:\bWITH(?:\s+RECURSIVE)?|,)\s*(\w+)\s*(?:\([^)]*\)\s*)?AS\s*(?:NOT\s+)?(?:MATERIALIZED\s*)?\(", re.IGNORECASE)
+_TABLE_NAME = r'(?:"?\w+"?\s*\.\s*)?"?\w+"?'
+# Псевдоним таблицы; ключевое слово после имени (`FROM videos JOIN ...`) псевдонимом не считается,
+# иначе следующая за ним таблица не попала бы в проверку
+_ALIAS = (
+    r"(?:\s+(?:AS\s+)?(?!(?:JOIN|INNER|LEFT|RIGHT|FULL|CROSS|NATURAL|LATERAL|ON|USING|WHERE|GROUP|HAVING"
+    r"|ORDER|LIMIT|OFFSET|FETCH|FOR|WINDOW|UNION|INTERSECT|EXCEPT)\b)\w+)?"
+)
+_FROM_RE = re.compile(
+    rf"\b(?:FROM|JOIN)\s+(?P<tables>{_TABLE_NAME}{_ALIAS}(?:\s*,\s*{_TABLE_NAME}{_ALIAS})*)",
+    re.IGNORECASE,
+)
+_TABLE_RE = re.compile(rf"(?:^|,)\s*(?P<name>{_TABLE_NAME})", re.IGNORECASE)
+_STATEMENT_START_RE = re.compile(r"^\s*\(*\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+# Изменяющие команды внутри SELECT/WITH: `WITH d AS (DELETE ... RETURNING *) SELECT ...`, `SELECT ... FOR UPDATE`
+_WRITE_RE = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE|TRUNCATE|DROP|ALTER|CREATE|GRANT|REVOKE|COPY|LOCK|VACUUM)\b|\bINTO\b",
+    re.IGNORECASE,
+)
+
+
+class QueryRejectedError(Exception):
+    """SQL от LLM отклонён проверкой до выполнения или прерван по лимиту."""
+
+    def __init__(self, reason: str, *, cost: float | None = None, rows: float | None = None) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.cost = cost
+        self.rows = rows
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """Возвращает имена таблиц из FROM/JOIN (без CTE и подзапросов), в нижнем регистре и без схемы."""
+    text = _COMMENT_RE.sub(" ", _LITERAL_RE.sub("''", sql))
+    text = _FUNCTION_FROM_RE.sub(" ", text)
+    ctes = {name.lower() for name in _CTE_RE.findall(text)}
+
+    tables = set()
+    for match in _FROM_RE.finditer(text):
+        for table in _TABLE_RE.finditer(match.group("tables")):
+            name = table.group("name").replace('"', "").replace(" ", "")
+            schema, _, name = name.rpartition(".")
+            if schema and schema.lower() != "public":
+                # Таблицы из других схем (pg_catalog, information_schema) не разрешены никогда
+                tables.add(f"{schema}.{name}".lower())
+            elif name.lower() not in ctes:
+                tables.add(name.lower())
+    return tables
+
+
+class QueryGuard:
+    """
+    Ограничения для SQL, сгенерированного LLM.
+
+    Перед выполнением проверяется, что это один SELECT (или WITH ... SELECT) без изменяющих команд
+    (DELETE в CTE, SELECT INTO, FOR UPDATE) и что он читает только разрешённые таблицы. Сам запрос выполняется в транзакции READ ONLY с локальными
+    `statement_timeout` и `work_mem`, а при `explain=True` сначала оценивается через EXPLAIN:
+    планы дороже `max_cost` или с оценкой больше `max_rows` строк отклоняются (0 — без ограничения).
+    Отклонённые запросы записываются в таблицу `rejected_queries`.
+    """
+
+    def __init__(
+        self,
+        *,
+        statement_timeout_ms: int = 5000,
+        work_mem: str = "16MB",
+        explain: bool = True,
+        max_cost: float = 1_000_000.0,
+        max_rows: float = 0.0,
+        record_rejected: bool = True,
+        allowed_tables: Iterable[str] = ALLOWED_TABLES,
+    ) -> None:
+        self.statement_timeout_ms = statement_timeout_ms
+        self.work_mem = work_mem
+        self.explain = explain
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.record_rejected = record_rejected
+        self.allowed_tables = frozenset(allowed_tables)
+
+        self.checked = 0
+        self.rejected = 0
+
+    def validate(self, sql: str) -> None:
+        """Статическая проверка текста запроса; при нарушении бросает QueryRejectedError."""
+        self.checked += 1
+        text = _COMMENT_RE.sub(" ", _LITERAL_RE.sub("''", sql)).strip().rstrip(";")
+
+        if not _STATEMENT_START_RE.match(text):
+            raise QueryRejectedError("разрешены только запросы SELECT")
+        if ";" in text:
+            raise QueryRejectedError("разрешён только один запрос")
+        if _WRITE_RE.search(text):
+            raise QueryRejectedError("запрос изменяет данные")
+
+        forbidden = sorted(
+            table for table in referenced_tables(sql)
+            if table not in self.allowed_tables and not _PARTITION_RE.match(table)
+        )
+        if forbidden:
+            raise QueryRejectedError(f"обращение к неразрешённым таблицам: {', '.join(forbidden)}")
+
+    async def prepare(self, cur: AsyncCursor, sql: str, params: tuple | None = None) -> None:
+        """
+        Настраивает текущую транзакцию (должна быть только что начата) и проверяет план запроса.
+        """
+        await cur.execute("SET TRANSACTION READ ONLY;")
+        await cur.execute(
+            "SELECT set_config('statement_timeout', %s, true), set_config('work_mem', %s, true);",
+            (str(self.statement_timeout_ms), self.work_mem),
+        )
+
+        if not self.explain or (not self.max_cost and not self.max_rows):
+            return
+
+        await cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        row = await cur.fetchone()
+        plan = (row[0] if isinstance(row, tuple) else next(iter(row.values())))[0]["Plan"]
+        cost, rows = plan["Total Cost"], plan["Plan Rows"]
+
+        if self.max_cost and cost > self.max_cost:
+            raise QueryRejectedError(
+                f"оценка стоимости плана {cost:.0f} превышает {self.max_cost:.0f}", cost=cost, rows=rows
+            )
+        if self.max_rows and rows > self.max_rows:
+            raise QueryRejectedError(
+                f"оценка числа строк {rows:.0f} превышает {self.max_rows:.0f}", cost=cost, rows=rows
+            )
+
+    @staticmethod
+    def rejection_from_error(error: Exception) -> QueryRejectedError | None:
+        """Переводит ошибки, вызванные лимитами песочницы, в QueryRejectedError."""
+        if isinstance(error, errors.QueryCanceled):
+            return QueryRejectedError("превышен statement_timeout")
+        if isinstance(error, errors.ReadOnlySqlTransaction):
+            return QueryRejectedError("попытка изменить данные в транзакции только для чтения")
+        return None
+
+    async def record(self, pool: AsyncConnectionPool, sql: str, rejection: QueryRejectedError) -> None:
+        """Сохраняет отклонённый запрос для разбора; ошибки записи только логируются."""
+        self.rejected += 1
+        logger.warning("SQL отклонён (%s): %s", rejection.reason, sql)
+        if not self.record_rejected:
+            return
+
+        try:
+            async with pool.connection() as connection:
+                await connection.execute(
+                    """
+                    INSERT INTO rejected_queries (sql, reason, estimated_cost, estimated_rows)
+                    VALUES (%s, %s, %s, %s);
+                    """,
+                    (sql, rejection.reason, rejection.cost, rejection.rows),
+                )
+        except Exception as e:
+            logger.warning("Не удалось записать отклонённый запрос: %s", e)
+
+    def stats(self) -> dict:
+        return {"checked": self.checked, "rejected": self.rejected}
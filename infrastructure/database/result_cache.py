@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+from psycopg_pool import AsyncConnectionPool
+
+from infrastructure.cache.lru import LRUCache
+from infrastructure.database.data_version import get_data_version
+
+logger = logging.getLogger(__name__)
+
+# Строковые литералы, идентификаторы в кавычках и всё остальное между ними
+_SQL_TOKEN_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|([^'\"]+)")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Функции, результат которых зависит от момента выполнения, а не только от данных
+_VOLATILE_RE = re.compile(
+    r"\b(?:now|current_date|current_time|current_timestamp|localtime|localtimestamp|clock_timestamp"
+    r"|statement_timestamp|transaction_timestamp|timeofday|age|random|setseed|gen_random_uuid)\b"
+)
+# Специальные значения даты и времени в литералах: 'now'::timestamptz, DATE 'today'
+_VOLATILE_LITERAL_RE = re.compile(r"^'\s*(?:now|today|yesterday|tomorrow)\s*'$", re.IGNORECASE)
+
+_MISSING = object()
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Приводит SQL к каноническому виду для ключа кеша: пробелы схлопываются,
+    регистр вне литералов понижается, завершающая `;` отбрасывается.
+    Содержимое строковых литералов и идентификаторов в кавычках не меняется.
+    """
+    parts = []
+    for quoted, plain in _SQL_TOKEN_RE.findall(sql):
+        if quoted:
+            parts.append(quoted)
+        else:
+            parts.append(_WHITESPACE_RE.sub(" ", plain.lower()))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_time_dependent(sql: str) -> bool:
+    """
+    Зависит ли результат запроса от времени выполнения: `NOW()`, `CURRENT_DATE`, `random()`,
+    литералы 'now'/'today' и т. п. Такой результат нельзя привязывать только к версии данных.
+    """
+    for quoted, plain in _SQL_TOKEN_RE.findall(sql):
+        if quoted:
+            if _VOLATILE_LITERAL_RE.match(quoted):
+                return True
+        elif _VOLATILE_RE.search(plain.lower()):
+            return True
+    return False
+
+
+class ResultCache:
+    """
+    Кеш результатов скалярных запросов, привязанный к версии данных.
+
+    Ключ — канонический SQL и текущее значение счётчика `data_version`, который загрузчик
+    увеличивает после каждой успешной загрузки, поэтому после новой загрузки старые
+    записи просто перестают находиться и вытесняются LRU. Версия перечитывается из БД
+    не чаще, чем раз в `version_ttl` секунд.
+
+    Запросы, результат которых зависит от времени выполнения (`cacheable` возвращает False),
+    не кешируются: «за последние 7 дней» иначе отвечалось бы по кешу до следующей загрузки.
+    """
+
+    def __init__(self, *, max_size: int = 10000, version_ttl: float = 5.0) -> None:
+        self.memory = LRUCache(max_size=max_size)
+        self.version_ttl = version_ttl
+
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._version_lock = asyncio.Lock()
+        self.uncacheable = 0
+
+    async def current_version(self, pool: AsyncConnectionPool) -> Optional[int]:
+        if time.monotonic() - self._version_checked_at < self.version_ttl:
+            return self._version
+
+        async with self._version_lock:
+            if time.monotonic() - self._version_checked_at >= self.version_ttl:
+                async with pool.connection() as connection:
+                    version = await get_data_version(connection)
+                if version != self._version:
+                    logger.info("Версия данных: %s -> %s", self._version, version)
+                    self._version = version
+                self._version_checked_at = time.monotonic()
+
+        return self._version
+
+    def cacheable(self, sql: str) -> bool:
+        if is_time_dependent(sql):
+            self.uncacheable += 1
+            return False
+        return True
+
+    @staticmethod
+    def key(version: int, sql: str, params: tuple | None = None) -> tuple:
+        return version, canonicalize_sql(sql), tuple(params) if params else ()
+
+    def get(self, key: tuple) -> Any:
+        return self.memory.get(key, _MISSING)
+
+    def set(self, key: tuple, value: Any) -> None:
+        self.memory.set(key, value)
+
+    @staticmethod
+    def is_miss(value: Any) -> bool:
+        return value is _MISSING
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats["data_version"] = self._version
+        stats["uncacheable"] = self.uncacheable
+        return stats
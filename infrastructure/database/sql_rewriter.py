@@ -0,0 +1,234 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Tuple
+
+# Колонки TIMESTAMPTZ, по которым строятся индексы и секции
+_COLUMN = r"(?P<col>\b(?:\w+\.)?(?:video_created_at|created_at|updated_at)\b)"
+# Строковый литерал после маскирования: \x00<номер>\x00, опционально с DATE/TIMESTAMP и ::date
+_LITERAL = r"(?:(?:DATE|TIMESTAMP|TIMESTAMPTZ)\s+)?\x00(?P<{name}>\d+)\x00(?:\s*::\s*(?:date|timestamp|timestamptz))?"
+_NOT_BEFORE = re.compile(r"\bNOT\s*$", re.IGNORECASE)
+# Арифметика или приведение типа вокруг предиката меняет порядок разбора — такие места не трогаем
+_OPERATOR_BEFORE = re.compile(r"[-+*/%|^:]\s*$")
+_OPERATOR_AFTER = re.compile(r"\s*(?:[-+*/%|^]|::|\()")
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_MASK_RE = re.compile(r"\x00(\d+)\x00")
+
+_DATE_CAST = rf"(?:{_COLUMN}\s*::\s*date|DATE\s*\(\s*{_COLUMN.replace('col', 'col2')}\s*\)|CAST\s*\(\s*{_COLUMN.replace('col', 'col3')}\s+AS\s+DATE\s*\))"
+
+_DATE_CMP_RE = re.compile(
+    rf"{_DATE_CAST}\s*(?P<op>>=|<=|=|>|<)\s*{_LITERAL.format(name='lit')}",
+    re.IGNORECASE,
+)
+_DATE_BETWEEN_RE = re.compile(
+    rf"{_DATE_CAST}\s+BETWEEN\s+{_LITERAL.format(name='lo')}\s+AND\s+{_LITERAL.format(name='hi')}",
+    re.IGNORECASE,
+)
+_DATE_TRUNC_RE = re.compile(
+    rf"date_trunc\s*\(\s*\x00(?P<unit>\d+)\x00\s*,\s*{_COLUMN}\s*\)(?:\s*::\s*(?:date|timestamp|timestamptz))?"
+    rf"\s*=\s*{_LITERAL.format(name='lit')}",
+    re.IGNORECASE,
+)
+_TO_CHAR_RE = re.compile(
+    rf"to_char\s*\(\s*{_COLUMN}\s*,\s*\x00(?P<fmt>\d+)\x00\s*\)\s*=\s*\x00(?P<lit>\d+)\x00",
+    re.IGNORECASE,
+)
+
+
+def _extract(field: str, column: str, value: str) -> str:
+    # EXTRACT(<field> FROM col) или date_part('<field>', col); поле date_part проверяется после разбора.
+    # Число не должно продолжаться дробной частью: в `= 2025.0` правило не применяется
+    return (
+        rf"(?:EXTRACT\s*\(\s*(?P<{field}>YEAR|MONTH)\s+FROM|date_part\s*\(\s*\x00(?P<{field}_lit>\d+)\x00\s*,)"
+        rf"\s*{column}\s*\)(?:\s*::\s*int(?:eger)?)?\s*=\s*(?P<{value}>\d{{1,4}})(?![.\w])"
+    )
+
+
+_EXTRACT_YEAR_MONTH_RE = re.compile(
+    rf"{_extract('f1', _COLUMN, 'v1')}\s+AND\s+{_extract('f2', '(?P=col)', 'v2')}",
+    re.IGNORECASE,
+)
+_EXTRACT_YEAR_RE = re.compile(_extract("f1", _COLUMN, "v1"), re.IGNORECASE)
+
+_TRUNC_UNITS = ("day", "week", "month", "quarter", "year")
+_TO_CHAR_FORMATS = {"YYYY-MM-DD": "day", "YYYY-MM": "month", "YYYY": "year"}
+
+
+def _add_unit(start: date, unit: str) -> date:
+    if unit == "day":
+        return start + timedelta(days=1)
+    if unit == "week":
+        return start + timedelta(days=7)
+    months = {"month": 1, "quarter": 3, "year": 12}[unit]
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def _is_unit_start(value: date, unit: str) -> bool:
+    if unit == "day":
+        return True
+    if unit == "week":
+        return value.weekday() == 0
+    if unit == "month":
+        return value.day == 1
+    if unit == "quarter":
+        return value.day == 1 and value.month % 3 == 1
+    return value.day == 1 and value.month == 1
+
+
+def _parse_day(text: str) -> date | None:
+    """Разбирает литерал даты; время допускается только нулевое (полночь)."""
+    try:
+        value = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return None
+    if value.tzinfo is not None or value.time() != datetime.min.time():
+        return None
+    return value.date()
+
+
+class SargableRewriter:
+    """
+    Переписывает в SQL от LLM предикаты, мешающие использовать индексы и отсечение секций,
+    в полуоткрытые диапазоны по самой колонке:
+
+        created_at::date = '2025-12-01'
+        -> (created_at >= TIMESTAMP '2025-12-01 00:00:00' AT TIME ZONE 'UTC'
+            AND created_at < TIMESTAMP '2025-12-02 00:00:00' AT TIME ZONE 'UTC')
+
+    Поддерживаются `col::date`, `DATE(col)`, `CAST(col AS DATE)` с =, <, <=, >, >= и BETWEEN,
+    `date_trunc(unit, col) = X`, `to_char(col, 'YYYY-MM') = X`, а также `EXTRACT(YEAR ...)`
+    отдельно и в паре с `EXTRACT(MONTH ...)`. Границы дней считаются в часовом поясе `timezone`,
+    который должен совпадать с TimeZone сессий (см. `create_pg_pool`), — тогда результат
+    запроса не меняется. Всё, что не распознано, остаётся как есть.
+    """
+
+    def __init__(self, timezone: str = "UTC") -> None:
+        self.timezone = timezone.replace("'", "''")
+        self.rewritten = 0
+        self.total = 0
+
+    def _bound(self, value: date) -> str:
+        return f"TIMESTAMP '{value.isoformat()} 00:00:00' AT TIME ZONE '{self.timezone}'"
+
+    def _range(self, column: str, lower: date | None, upper: date | None) -> str:
+        parts = []
+        if lower is not None:
+            parts.append(f"{column} >= {self._bound(lower)}")
+        if upper is not None:
+            parts.append(f"{column} < {self._bound(upper)}")
+        return f"({' AND '.join(parts)})"
+
+    def rewrite(self, sql: str) -> Tuple[str, List[str]]:
+        """Возвращает переписанный SQL и список применённых правил."""
+        self.total += 1
+        literals: List[str] = []
+
+        def mask(match: re.Match) -> str:
+            literals.append(match.group()[1:-1].replace("''", "'"))
+            return f"\x00{len(literals) - 1}\x00"
+
+        masked = _STRING_RE.sub(mask, sql)
+        applied: List[str] = []
+
+        def literal(match: re.Match, name: str) -> str:
+            return literals[int(match.group(name))]
+
+        def column(match: re.Match) -> str:
+            return next(value for key in ("col", "col2", "col3") if (value := match.groupdict().get(key)))
+
+        def substitute(pattern: re.Pattern, rule: str, build: Callable[[re.Match], str | None]) -> None:
+            nonlocal masked
+
+            def replace(match: re.Match) -> str:
+                if (
+                    _OPERATOR_BEFORE.search(match.string, 0, match.start())
+                    or _OPERATOR_AFTER.match(match.string, match.end())
+                ):
+                    return match.group()
+                replacement = build(match)
+                if replacement is None:
+                    return match.group()
+                applied.append(rule)
+                return replacement
+
+            masked = pattern.sub(replace, masked)
+
+        def date_cmp(match: re.Match) -> str | None:
+            day = _parse_day(literal(match, "lit"))
+            if day is None:
+                return None
+            col, op, next_day = column(match), match.group("op"), day + timedelta(days=1)
+            return {
+                "=": lambda: self._range(col, day, next_day),
+                ">=": lambda: self._range(col, day, None),
+                ">": lambda: self._range(col, next_day, None),
+                "<": lambda: self._range(col, None, day),
+                "<=": lambda: self._range(col, None, next_day),
+            }[op]()
+
+        def date_between(match: re.Match) -> str | None:
+            lower, upper = _parse_day(literal(match, "lo")), _parse_day(literal(match, "hi"))
+            if lower is None or upper is None:
+                return None
+            return self._range(column(match), lower, upper + timedelta(days=1))
+
+        def date_trunc(match: re.Match) -> str | None:
+            unit = literal(match, "unit").lower()
+            start = _parse_day(literal(match, "lit"))
+            # Невыровненная дата (например, date_trunc('month', ...) = '2025-11-15') никогда не
+            # совпадает с исходным выражением — такой запрос не трогаем, чтобы не менять результат
+            if unit not in _TRUNC_UNITS or start is None or not _is_unit_start(start, unit):
+                return None
+            return self._range(match.group("col"), start, _add_unit(start, unit))
+
+        def to_char(match: re.Match) -> str | None:
+            unit = _TO_CHAR_FORMATS.get(literal(match, "fmt"))
+            text = literal(match, "lit")
+            if unit is None:
+                return None
+            padded = {"day": text, "month": f"{text}-01", "year": f"{text}-01-01"}[unit]
+            start = _parse_day(padded)
+            if start is None or start.isoformat()[:len(text)] != text:
+                return None
+            return self._range(match.group("col"), start, _add_unit(start, unit))
+
+        def field(match: re.Match, name: str) -> str:
+            if match.group(name):
+                return match.group(name).upper()
+            return literal(match, f"{name}_lit").upper()
+
+        def extract_year_month(match: re.Match) -> str | None:
+            fields = {field(match, "f1"): int(match.group("v1")), field(match, "f2"): int(match.group("v2"))}
+            if set(fields) != {"YEAR", "MONTH"}:
+                return None
+            # NOT относится только к первому предикату пары — такую пару не объединяем
+            if _NOT_BEFORE.search(match.string, 0, match.start()):
+                return None
+            if not 1 <= fields["MONTH"] <= 12 or not 1 <= fields["YEAR"] <= 9999:
+                return None
+            start = date(fields["YEAR"], fields["MONTH"], 1)
+            return self._range(match.group("col"), start, _add_unit(start, "month"))
+
+        def extract_year(match: re.Match) -> str | None:
+            year = int(match.group("v1"))
+            if field(match, "f1") != "YEAR" or not 1 <= year <= 9998:
+                return None
+            return self._range(match.group("col"), date(year, 1, 1), date(year + 1, 1, 1))
+
+        substitute(_DATE_BETWEEN_RE, "date_between", date_between)
+        substitute(_DATE_CMP_RE, "date_cast", date_cmp)
+        substitute(_DATE_TRUNC_RE, "date_trunc", date_trunc)
+        substitute(_TO_CHAR_RE, "to_char", to_char)
+        substitute(_EXTRACT_YEAR_MONTH_RE, "extract_year_month", extract_year_month)
+        substitute(_EXTRACT_YEAR_RE, "extract_year", extract_year)
+
+        if not applied:
+            return sql, applied
+
+        self.rewritten += 1
+        result = _MASK_RE.sub(lambda m: "'" + literals[int(m.group(1))].replace("'", "''") + "'", masked)
+        return result, applied
+
+    def stats(self) -> dict:
+        return {"total": self.total, "rewritten": self.rewritten}
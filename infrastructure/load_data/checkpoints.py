@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from psycopg import AsyncConnection, AsyncCursor
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт из начала файла участвует в его идентификаторе
+IDENTITY_HEAD_BYTES = 1 << 20
+
+
+@dataclass
+class Checkpoint:
+    file_id: str
+    byte_offset: int
+    videos_loaded: int
+    snapshots_loaded: int
+    last_video_id: Optional[str]
+    completed: bool
+
+
+# Функция, вычисляющая идентификатор файла: размер + SHA-256 его начала
+def file_identity(path: str) -> str:
+    size = os.path.getsize(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(IDENTITY_HEAD_BYTES))
+    return f"{size}:{digest.hexdigest()}"
+
+
+# Функция, возвращающая сохранённый чекпоинт загрузки файла (None, если загрузки ещё не было)
+async def get_checkpoint(connection: AsyncConnection, file_id: str) -> Optional[Checkpoint]:
+    async with connection.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT file_id, byte_offset, videos_loaded, snapshots_loaded, last_video_id, completed
+            FROM load_checkpoints
+            WHERE file_id = %s;
+            """,
+            (file_id,),
+        )
+        row = await cur.fetchone()
+    return Checkpoint(*row) if row else None
+
+
+# Функция, сохраняющая чекпоинт; вызывается в той же транзакции, что и запись пачки данных
+async def save_checkpoint(
+    cur: AsyncCursor,
+    *,
+    file_id: str,
+    path: str,
+    byte_offset: int,
+    videos_loaded: int,
+    snapshots_loaded: int,
+    last_video_id: Optional[str],
+    completed: bool = False,
+) -> None:
+    await cur.execute(
+        """
+        INSERT INTO load_checkpoints (
+            file_id, path, byte_offset, videos_loaded, snapshots_loaded,
+            last_video_id, completed, updated_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (file_id) DO UPDATE SET
+            path = EXCLUDED.path,
+            byte_offset = EXCLUDED.byte_offset,
+            videos_loaded = EXCLUDED.videos_loaded,
+            snapshots_loaded = EXCLUDED.snapshots_loaded,
+            last_video_id = EXCLUDED.last_video_id,
+            completed = EXCLUDED.completed,
+            updated_at = NOW();
+        """,
+        (file_id, path, byte_offset, videos_loaded, snapshots_loaded, last_video_id, completed),
+    )
@@ -0,0 +1,127 @@
+import logging
+from typing import List
+
+from psycopg import AsyncCursor
+
+logger = logging.getLogger(__name__)
+
+VIDEO_COLUMNS = (
+    "id", "creator_id", "video_created_at",
+    "views_count", "likes_count", "comments_count", "reports_count",
+)
+
+SNAPSHOT_COLUMNS = (
+    "id", "video_id",
+    "views_count", "likes_count", "comments_count", "reports_count",
+    "delta_views_count", "delta_likes_count",
+    "delta_comments_count", "delta_reports_count",
+    "created_at",
+)
+
+
+# Функция, создающая временные staging-таблицы сессии (если их ещё нет) и очищающая их
+async def prepare_staging_tables(cur: AsyncCursor) -> None:
+    # `ord` сохраняет порядок строк во входных данных для разрешения дубликатов
+    await cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS videos_staging (
+            ord BIGSERIAL,
+            id UUID,
+            creator_id TEXT,
+            video_created_at TIMESTAMPTZ,
+            views_count BIGINT,
+            likes_count BIGINT,
+            comments_count BIGINT,
+            reports_count BIGINT
+        );
+
+        CREATE TEMP TABLE IF NOT EXISTS video_snapshots_staging (
+            ord BIGSERIAL,
+            id UUID,
+            video_id UUID,
+            views_count BIGINT,
+            likes_count BIGINT,
+            comments_count BIGINT,
+            reports_count BIGINT,
+            delta_views_count BIGINT,
+            delta_likes_count BIGINT,
+            delta_comments_count BIGINT,
+            delta_reports_count BIGINT,
+            created_at TIMESTAMPTZ
+        );
+
+        TRUNCATE videos_staging, video_snapshots_staging;
+        """
+    )
+
+
+# Функция, загружающая строки в staging-таблицы по протоколу COPY и сливающая их в основные таблицы
+async def copy_videos_and_snapshots(
+    cur: AsyncCursor,
+    *,
+    video_values: List[tuple],
+    snapshot_values: List[tuple],
+) -> tuple[int, int]:
+    await prepare_staging_tables(cur)
+
+    async with cur.copy(f"COPY videos_staging ({', '.join(VIDEO_COLUMNS)}) FROM STDIN") as copy:
+        for row in video_values:
+            await copy.write_row(row)
+
+    async with cur.copy(
+        f"COPY video_snapshots_staging ({', '.join(SNAPSHOT_COLUMNS)}) FROM STDIN"
+    ) as copy:
+        for row in snapshot_values:
+            await copy.write_row(row)
+
+    # UPSERT видео: при повторе id в одной пачке побеждает последняя строка, как и при executemany
+    await cur.execute(
+        """
+        INSERT INTO videos (
+            id, creator_id, video_created_at,
+            views_count, likes_count, comments_count, reports_count
+        )
+        SELECT DISTINCT ON (id)
+            id, creator_id, video_created_at,
+            views_count, likes_count, comments_count, reports_count
+        FROM videos_staging
+        ORDER BY id, ord DESC
+        ON CONFLICT (id) DO UPDATE SET
+            views_count = EXCLUDED.views_count,
+            likes_count = EXCLUDED.likes_count,
+            comments_count = EXCLUDED.comments_count,
+            reports_count = EXCLUDED.reports_count,
+            updated_at = NOW();
+        """
+    )
+    videos_merged = cur.rowcount
+
+    # Снапшоты вставляются один раз: дубликаты (в пачке и в таблице) пропускаются.
+    # ON CONFLICT без цели подходит и для обычной таблицы (PK id), и для секционированной (PK id, created_at)
+    await cur.execute(
+        """
+        INSERT INTO video_snapshots (
+            id, video_id,
+            views_count, likes_count, comments_count, reports_count,
+            delta_views_count, delta_likes_count,
+            delta_comments_count, delta_reports_count,
+            created_at
+        )
+        SELECT DISTINCT ON (id)
+            id, video_id,
+            views_count, likes_count, comments_count, reports_count,
+            delta_views_count, delta_likes_count,
+            delta_comments_count, delta_reports_count,
+            created_at
+        FROM video_snapshots_staging
+        ORDER BY id, ord
+        ON CONFLICT DO NOTHING;
+        """
+    )
+    snapshots_inserted = cur.rowcount
+
+    logger.debug(
+        "COPY: видео слито %d из %d, снапшотов вставлено %d из %d",
+        videos_merged, len(video_values), snapshots_inserted, len(snapshot_values),
+    )
+    return videos_merged, snapshots_inserted
@@ -0,0 +1,78 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from psycopg import AsyncCursor
+
+logger = logging.getLogger(__name__)
+
+# Позиции полей в кортежах из `prepare_rows`
+VIDEO_COUNTERS = slice(3, 7)
+SNAPSHOT_VIDEO_ID = 1
+SNAPSHOT_CREATED_AT = 10
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    # Время без часового пояса БД интерпретирует по-своему — такие снапшоты не фильтруем
+    return parsed if parsed.tzinfo else None
+
+
+# Функция, возвращающая сохранённые счётчики видео и watermark их снапшотов (максимальный created_at)
+async def fetch_video_state(
+    cur: AsyncCursor,
+    video_ids: List[str],
+) -> Dict[str, Tuple[tuple, Optional[datetime]]]:
+    await cur.execute(
+        """
+        SELECT v.id::text,
+               v.views_count, v.likes_count, v.comments_count, v.reports_count,
+               w.watermark
+        FROM videos v
+        LEFT JOIN LATERAL (
+            SELECT MAX(s.created_at) AS watermark
+            FROM video_snapshots s
+            WHERE s.video_id = v.id
+        ) w ON TRUE
+        WHERE v.id = ANY(%s::uuid[]);
+        """,
+        (video_ids,),
+    )
+    return {row[0]: (tuple(row[1:5]), row[5]) for row in await cur.fetchall()}
+
+
+# Функция, отбрасывающая неизменившиеся видео и уже известные снапшоты перед записью в БД
+async def filter_changed_rows(
+    cur: AsyncCursor,
+    *,
+    video_values: List[tuple],
+    snapshot_values: List[tuple],
+) -> Tuple[List[tuple], List[tuple]]:
+    if not video_values:
+        return video_values, snapshot_values
+
+    state = await fetch_video_state(cur, list({str(row[0]).lower() for row in video_values}))
+
+    changed_videos = [
+        row for row in video_values
+        if (stored := state.get(str(row[0]).lower())) is None or stored[0] != tuple(row[VIDEO_COUNTERS])
+    ]
+
+    new_snapshots = []
+    for row in snapshot_values:
+        stored = state.get(str(row[SNAPSHOT_VIDEO_ID]).lower())
+        watermark = stored[1] if stored else None
+        created_at = _parse_timestamp(row[SNAPSHOT_CREATED_AT]) if watermark else None
+        if watermark is None or created_at is None or created_at > watermark:
+            new_snapshots.append(row)
+
+    logger.info(
+        "Инкрементальная загрузка: видео к записи %d из %d, снапшотов %d из %d",
+        len(changed_videos), len(video_values), len(new_snapshots), len(snapshot_values),
+    )
+    return changed_videos, new_snapshots
@@ -0,0 +1,107 @@
+import logging
+import re
+from typing import Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+
+# Строка целиком, незавершённая строка (одиночная кавычка в конце буфера) или скобка
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|"|[{}\[\]]', re.DOTALL)
+
+_VIDEOS_KEY = b'"videos"'
+_OPEN = b"{["
+_OBJECT_OPEN = ord("{")
+_ARRAY_OPEN = ord("[")
+_QUOTE = ord('"')
+
+
+def iter_video_records(
+    path: str,
+    *,
+    start_offset: int = 0,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Потоково читает JSON-файл с видео и отдаёт сырые байты каждого элемента массива видео.
+
+    Поддерживаются оба формата файла: `{"videos": [...]}` и просто `[...]`.
+    Файл читается кусками по `chunk_size` байт, в памяти одновременно находится
+    не больше одного видео (вместе с его снапшотами) и одного куска файла.
+
+    Для каждого видео возвращается пара `(end_offset, raw)`, где `end_offset` —
+    смещение в байтах сразу за элементом. С этого смещения можно продолжить чтение
+    (`start_offset`), считая, что позиция находится внутри массива видео.
+    """
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+
+        buf = b""
+        base = start_offset  # абсолютное смещение buf[0] в файле
+        pos = 0
+        depth = 0
+        # Глубина элементов массива видео; при продолжении чтения мы уже внутри массива
+        array_depth: int | None = 1 if start_offset else None
+        if start_offset:
+            depth = 1
+        element_start: int | None = None
+        last_string = b""
+
+        while True:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+            incomplete = False
+
+            for match in _TOKEN_RE.finditer(buf, pos):
+                token = match.group()
+                head = token[0]
+
+                if token == b'"':
+                    # Строка обрезана границей куска — дочитываем файл
+                    if eof:
+                        raise ValueError(f"Unterminated string at byte {base + match.start()}")
+                    pos = match.start()
+                    incomplete = True
+                    break
+
+                if head == _QUOTE:
+                    if array_depth is None and depth == 1:
+                        last_string = token
+                    continue
+
+                if head in _OPEN:
+                    if array_depth is None:
+                        if head == _ARRAY_OPEN and (depth == 0 or (depth == 1 and last_string == _VIDEOS_KEY)):
+                            array_depth = depth + 1
+                    elif depth == array_depth and head == _OBJECT_OPEN:
+                        element_start = match.start()
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if array_depth is None:
+                    continue
+                if depth == array_depth and element_start is not None:
+                    yield base + match.end(), buf[element_start:match.end()]
+                    element_start = None
+                elif depth < array_depth:
+                    return
+
+            if not incomplete:
+                pos = len(buf)
+                if eof:
+                    break
+
+            # Отбрасываем уже разобранную часть буфера
+            keep = element_start if element_start is not None else pos
+            buf = buf[keep:]
+            base += keep
+            pos -= keep
+            if element_start is not None:
+                element_start = 0
+
+        if array_depth is None:
+            logger.warning("В файле %s не найден массив видео", path)
+        elif element_start is not None or depth >= array_depth:
+            raise ValueError(f"Unexpected end of file {path}: videos array is not closed")
@@ -1,70 +1,77 @@
 import asyncio
 import json
 import logging
-from datetime import timezone
-from typing import Any, List, Dict, Optional
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timezone
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 
-from psycopg import AsyncConnection
+from psycopg import AsyncConnection, errors
+from psycopg_pool import AsyncConnectionPool
 
-from config.config import Config, load_config
-from infrastructure.database.connection import get_pg_connection
-
-# Загрузка конфигурации
-config: Config = load_config()
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.getLevelName(config.log.level),
-    format=config.log.format,
+from config.config import Config, get_config
+from infrastructure.columnar.export import export_columnar, is_available as columnar_available
+from infrastructure.database.connection import create_pg_pool
+from infrastructure.database.data_version import bump_data_version
+from infrastructure.database.partitions import add_months, create_month_partition, is_partitioned
+from infrastructure.load_data.checkpoints import file_identity, get_checkpoint, save_checkpoint
+from infrastructure.load_data.copy_loader import copy_videos_and_snapshots
+from infrastructure.load_data.incremental import filter_changed_rows
+from infrastructure.load_data.json_stream import iter_video_records
+from infrastructure.load_data.rollups import (
+    rebuild_creator_rollups,
+    refresh_creator_rollups,
+    refresh_video_rollups,
 )
+from infrastructure.load_data.rows import prepare_rows, prepare_shard_rows
 
 logger = logging.getLogger(__name__)
 
+# Размер куска сырых данных, отдаваемого одному воркеру, и период отчёта о прогрессе
+PARALLEL_CHUNK_BYTES = 4 << 20
+PROGRESS_INTERVAL = 5.0
+
+# Снапшот в сыром JSON — объект без вложенных объектов с полем "video_id" (у видео есть вложенный
+# список снапшотов и нет "video_id"), и месяц его поля "created_at": секции нужны только по снапшотам
+_SNAPSHOT_RE = re.compile(rb'\{[^{}]*"video_id"[^{}]*\}')
+_CREATED_AT_MONTH_RE = re.compile(rb'"created_at"\s*:\s*"(\d{4})-(\d{2})')
+_SCAN_CHUNK_BYTES = 4 << 20
+
+# Ожидание блокировки при присоединении секции и число попыток
+PARTITION_LOCK_TIMEOUT = "5s"
+PARTITION_ATTEMPTS = 5
+
 
 async def upsert_videos_and_snapshots(
     conn: AsyncConnection,
     *,
     data: List[Dict[str, Any]],
+    bump_version: bool = True,
+    method: str = "executemany",
+    incremental: bool = False,
 ) -> None:
     """
     Загружает видео и их снапшоты в БД с использованием UPSERT.
+
+    `method="executemany"` отправляет построчные `INSERT ... ON CONFLICT`,
+    `method="copy"` — загружает строки по протоколу COPY во временные staging-таблицы
+    и сливает их в основные таблицы одним запросом на таблицу.
+
+    При `bump_version=False` счётчик версии данных не увеличивается — так делают
+    потоковые режимы, которые вызывают функцию для каждой пачки и увеличивают версию один раз.
+
+    При `incremental=True` видео с неизменившимися счётчиками не перезаписываются, а снапшоты
+    не новее последнего сохранённого снапшота того же видео (watermark) не отправляются в БД.
     """
     if not data:
         logger.info("Нет данных для загрузки в videos/video_snapshots")
         return
 
-    video_values: List[tuple] = []
-    snapshot_values: List[tuple] = []
-
     try:
-        for video in data:
-            # Основные данные видео
-            video_values.append((
-                video["id"],
-                video["creator_id"],
-                video["video_created_at"] ,
-                video["views_count"],
-                video["likes_count"],
-                video["comments_count"],
-                video["reports_count"],
-            ))
-
-            # Снапшоты
-            for snap in video["snapshots"]:
-                snapshot_values.append((
-                    snap["id"],
-                    snap["video_id"],
-                    snap["views_count"],
-                    snap["likes_count"],
-                    snap["comments_count"],
-                    snap["reports_count"],
-                    snap["delta_views_count"],
-                    snap["delta_likes_count"],
-                    snap["delta_comments_count"],
-                    snap["delta_reports_count"],
-                    snap["created_at"],
-                ))
-
+        video_values, snapshot_values = prepare_rows(data)
     except KeyError as e:
         logger.error("Отсутствует обязательное поле в данных: %s", e)
         raise
@@ -72,9 +79,50 @@ async def upsert_videos_and_snapshots(
         logger.error("Неожиданная ошибка при подготовке данных: %s", e)
         raise
 
+    await upsert_rows(
+        conn,
+        video_values=video_values,
+        snapshot_values=snapshot_values,
+        bump_version=bump_version,
+        method=method,
+        incremental=incremental,
+    )
+
+
+async def upsert_rows(
+    conn: AsyncConnection,
+    *,
+    video_values: List[tuple],
+    snapshot_values: List[tuple],
+    bump_version: bool = True,
+    method: str = "executemany",
+    incremental: bool = False,
+    creator_rollups: bool = True,
+) -> None:
+    """
+    Записывает уже подготовленные строки videos/video_snapshots (см. `prepare_rows`)
+    и обновляет дневные агрегаты. При `creator_rollups=False` агрегаты по креаторам
+    не трогаются — параллельная загрузка пересобирает их один раз в конце.
+    """
+    started = time.perf_counter()
+
     try:
         async with conn.cursor() as cur:
-            if video_values:
+            if incremental:
+                video_values, snapshot_values = await filter_changed_rows(
+                    cur, video_values=video_values, snapshot_values=snapshot_values
+                )
+
+            if method == "copy":
+                await copy_videos_and_snapshots(
+                    cur, video_values=video_values, snapshot_values=snapshot_values
+                )
+                logger.info(
+                    "Успешно загружено через COPY %d видео и %d снапшотов (дубликаты пропущены)",
+                    len(video_values), len(snapshot_values),
+                )
+
+            if method == "executemany" and video_values:
                 await cur.executemany(
                     """
                     INSERT INTO videos (
@@ -93,7 +141,7 @@ async def upsert_videos_and_snapshots(
                 logger.info("Успешно загружено/обновлено %d видео", len(video_values))
 
             # INSERT снапшотов
-            if snapshot_values:
+            if method == "executemany" and snapshot_values:
                 await cur.executemany(
                     """
                     INSERT INTO video_snapshots (
@@ -103,15 +151,28 @@ async def upsert_videos_and_snapshots(
                         delta_comments_count, delta_reports_count,
                         created_at
                     ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (id) DO NOTHING;
+                    ON CONFLICT DO NOTHING;
                     """,
                     snapshot_values,
                 )
                 logger.info("Успешно загружено %d снапшотов (дубликаты пропущены)", len(snapshot_values))
 
+            # Дневные агрегаты пересчитываются для затронутых пачкой видео, креаторов и дней
+            await refresh_video_rollups(cur, snapshot_values)
+            if creator_rollups:
+                await refresh_creator_rollups(cur, video_values, snapshot_values)
+
+            # Новая версия данных фиксируется в той же транзакции, что и сами данные
+            if bump_version:
+                await bump_data_version(cur)
+
+        elapsed = time.perf_counter() - started
+        rows = len(video_values) + len(snapshot_values)
         logger.info(
-            "Загрузка данных завершена успешно. Время: %s. Видео: %d, Снапшоты: %d",
-            asyncio.get_event_loop().time(),  # или datetime.now(timezone.utc).isoformat() если нужен читаемый формат
+            "Загрузка данных завершена успешно (%s). Время: %.3f с, %.0f строк/с. Видео: %d, Снапшоты: %d",
+            method,
+            elapsed,
+            rows / elapsed if elapsed else 0.0,
             len(video_values),
             len(snapshot_values),
         )
@@ -121,49 +182,499 @@ async def upsert_videos_and_snapshots(
         raise
 
 
-async def main() -> None:
-    data_path = "infrastructure/load_data/videos.json"
+def iter_video_batches(
+    path: str,
+    batch_size: int,
+    *,
+    start_offset: int = 0,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Потоково читает видео из файла и группирует их в пачки примерно по `batch_size` строк
+    (видео + снапшоты). Возвращает пары `(end_offset, videos)`, где `end_offset` —
+    смещение в файле сразу за последним видео пачки.
+    """
+    batch: List[Dict[str, Any]] = []
+    rows = 0
+    end_offset = start_offset
+
+    for end_offset, raw in iter_video_records(path, start_offset=start_offset):
+        video = json.loads(raw)
+        batch.append(video)
+        rows += 1 + len(video.get("snapshots", ()))
+
+        if rows >= batch_size:
+            yield end_offset, batch
+            batch = []
+            rows = 0
+
+    if batch:
+        yield end_offset, batch
+
 
-    # Чтение JSON-файла
+def read_videos_json(data_path: str) -> Optional[List[Dict[str, Any]]]:
+    # Чтение JSON-файла целиком
     try:
         with open(data_path, "r", encoding="utf-8") as f:
             full_data = json.load(f)
 
         videos_data: List[Dict[str, Any]] = full_data.get("videos", full_data)
         logger.info("Успешно загружен JSON-файл: %s. Количество видео: %d", data_path, len(videos_data))
+        return videos_data
 
     except FileNotFoundError:
         logger.error("Файл не найден: %s", data_path)
-        return
     except json.JSONDecodeError as e:
         logger.error("Ошибка разбора JSON в файле %s: %s", data_path, e)
-        return
     except Exception as e:
         logger.error("Неожиданная ошибка при чтении файла %s: %s", data_path, e)
+    return None
+
+
+async def load_full(
+    pool: AsyncConnectionPool,
+    data_path: str,
+    method: str,
+    incremental: bool = False,
+) -> None:
+    """Читает файл целиком и загружает его одной транзакцией."""
+    videos_data = read_videos_json(data_path)
+    if videos_data is None:
+        return
+
+    async with pool.connection() as connection:
+        async with connection.transaction():
+            await upsert_videos_and_snapshots(
+                connection,
+                data=videos_data,
+                method=method,
+                incremental=incremental,
+            )
+
+
+async def load_streaming(
+    pool: AsyncConnectionPool,
+    data_path: str,
+    batch_size: int,
+    method: str,
+    incremental: bool = False,
+) -> None:
+    """
+    Потоково разбирает файл и отправляет строки в БД пачками фиксированного размера
+    в рамках одной транзакции. Потребление памяти не зависит от размера файла.
+    """
+    videos_total = 0
+    snapshots_total = 0
+    started = time.perf_counter()
+
+    async with pool.connection() as connection:
+        async with connection.transaction():
+            for _, batch in iter_video_batches(data_path, batch_size):
+                await upsert_videos_and_snapshots(
+                    connection,
+                    data=batch,
+                    bump_version=False,
+                    method=method,
+                    incremental=incremental,
+                )
+                videos_total += len(batch)
+                snapshots_total += sum(len(video["snapshots"]) for video in batch)
+
+            async with connection.cursor() as cur:
+                await bump_data_version(cur)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Потоковая загрузка %s завершена (%s) за %.1f с, %.0f строк/с. Видео: %d, Снапшоты: %d",
+        data_path,
+        method,
+        elapsed,
+        (videos_total + snapshots_total) / elapsed if elapsed else 0.0,
+        videos_total,
+        snapshots_total,
+    )
+
+
+async def load_chunked(
+    pool: AsyncConnectionPool,
+    data_path: str,
+    batch_size: int,
+    method: str,
+    incremental: bool = False,
+) -> None:
+    """
+    Возобновляемая загрузка: каждая пачка примерно из `batch_size` строк фиксируется
+    отдельной транзакцией вместе с чекпоинтом (идентификатор файла + смещение в байтах).
+    После сбоя повторный запуск продолжает чтение файла с последнего чекпоинта.
+    """
+    file_id = file_identity(data_path)
+
+    async with pool.connection() as connection:
+        async with connection.transaction():
+            checkpoint = await get_checkpoint(connection, file_id)
+
+        if checkpoint and checkpoint.completed:
+            logger.info(
+                "Файл %s уже загружен полностью (видео: %d, снапшоты: %d), пропускаем",
+                data_path, checkpoint.videos_loaded, checkpoint.snapshots_loaded,
+            )
+            return
+
+        start_offset = checkpoint.byte_offset if checkpoint else 0
+        videos_total = checkpoint.videos_loaded if checkpoint else 0
+        snapshots_total = checkpoint.snapshots_loaded if checkpoint else 0
+        last_video_id = checkpoint.last_video_id if checkpoint else None
+        if start_offset:
+            logger.info(
+                "Продолжаем загрузку %s с байта %d (последнее видео: %s)",
+                data_path, start_offset, last_video_id,
+            )
+
+        started = time.perf_counter()
+        rows_this_run = 0
+
+        for end_offset, batch in iter_video_batches(data_path, batch_size, start_offset=start_offset):
+            async with connection.transaction():
+                await upsert_videos_and_snapshots(
+                    connection,
+                    data=batch,
+                    method=method,
+                    incremental=incremental,
+                )
+
+                videos_total += len(batch)
+                snapshots = sum(len(video["snapshots"]) for video in batch)
+                snapshots_total += snapshots
+                rows_this_run += len(batch) + snapshots
+                last_video_id = batch[-1]["id"]
+
+                async with connection.cursor() as cur:
+                    await save_checkpoint(
+                        cur,
+                        file_id=file_id,
+                        path=data_path,
+                        byte_offset=end_offset,
+                        videos_loaded=videos_total,
+                        snapshots_loaded=snapshots_total,
+                        last_video_id=last_video_id,
+                    )
+            start_offset = end_offset
+
+        async with connection.transaction():
+            async with connection.cursor() as cur:
+                await save_checkpoint(
+                    cur,
+                    file_id=file_id,
+                    path=data_path,
+                    byte_offset=start_offset,
+                    videos_loaded=videos_total,
+                    snapshots_loaded=snapshots_total,
+                    last_video_id=last_video_id,
+                    completed=True,
+                )
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Загрузка %s по чекпоинтам завершена за %.1f с, %.0f строк/с. Всего видео: %d, снапшотов: %d",
+        data_path,
+        elapsed,
+        rows_this_run / elapsed if elapsed else 0.0,
+        videos_total,
+        snapshots_total,
+    )
+
+
+def scan_snapshot_months(path: str) -> List[date]:
+    """
+    Месяцы поля created_at снапшотов файла — те, для которых нужны секции `video_snapshots`.
+    Файл читается кусками без разбора JSON; незаконченный на границе куска объект переносится в следующий.
+    """
+    months: set = set()
+    tail = b""
+    with open(path, "rb") as f:
+        while chunk := f.read(_SCAN_CHUNK_BYTES):
+            buf = tail + chunk
+            for snapshot in _SNAPSHOT_RE.finditer(buf):
+                month = _CREATED_AT_MONTH_RE.search(snapshot.group())
+                if month:
+                    months.add((int(month[1]), int(month[2])))
+            start = buf.rfind(b"{")
+            tail = buf[start:] if start > buf.rfind(b"}") else b""
+    return sorted(date(year, month, 1) for year, month in months if 1 <= month <= 12)
+
+
+async def prepare_snapshot_partitions(pool: AsyncConnectionPool, data_path: str) -> None:
+    """
+    Создаёт месячные секции video_snapshots для всех месяцев файла до начала загрузки.
+
+    Присоединение секции блокирует DEFAULT-секцию (ACCESS EXCLUSIVE), поэтому оно выполняется
+    до того, как загрузка откроет свои транзакции, — каждая секция отдельной короткой транзакцией
+    с `lock_timeout`, чтобы не ждать долгих запросов бота и не выстраивать за собой очередь.
+    Соседние месяцы создаются заранее: месяц в часовом поясе сессии может отличаться от строки.
+    Если секцию создать не удалось, строки этого месяца попадут в DEFAULT-секцию и будут перенесены
+    в месячную секцию при следующей загрузке.
+    """
+    months = set()
+    for month in await asyncio.to_thread(scan_snapshot_months, data_path):
+        months.update((add_months(month, -1), month, add_months(month, 1)))
+
+    async with pool.connection() as connection:
+        for month in sorted(months):
+            for attempt in range(1, PARTITION_ATTEMPTS + 1):
+                try:
+                    async with connection.transaction():
+                        async with connection.cursor() as cur:
+                            await cur.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
+                            await create_month_partition(cur, month)
+                    break
+                except errors.LockNotAvailable:
+                    if attempt == PARTITION_ATTEMPTS:
+                        logger.warning(
+                            "Секция за %s не создана: DEFAULT-секция занята, строки месяца попадут в неё",
+                            month.strftime("%Y-%m"),
+                        )
+                    else:
+                        await asyncio.sleep(attempt)
+
+
+def iter_raw_chunks(path: str, chunk_bytes: int) -> Iterator[List[bytes]]:
+    """Группирует сырые JSON-записи видео в куски примерно по `chunk_bytes` байт для воркеров."""
+    chunk: List[bytes] = []
+    size = 0
+
+    for _, raw in iter_video_records(path):
+        chunk.append(raw)
+        size += len(raw)
+        if size >= chunk_bytes:
+            yield chunk
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield chunk
+
+
+async def load_parallel(
+    pool: AsyncConnectionPool,
+    data_path: str,
+    batch_size: int,
+    method: str,
+    workers: int,
+    incremental: bool = False,
+) -> None:
+    """
+    Параллельная загрузка: видео распределяются по `workers` шардам по хешу `video_id`.
+
+    Разбор JSON и подготовка строк выполняются в пуле процессов, каждый шард пишется
+    своей корутиной на отдельном соединении в собственной транзакции. Результаты воркеров
+    раздаются шардам в порядке чтения файла, а одно и то же видео всегда попадает
+    в один шард, поэтому повторы видео в разных кусках применяются в исходном порядке.
+
+    Если какой-то шард упал, уже зафиксированные шарды остаются в БД: для них всё равно пересобираются
+    агрегаты по креаторам и увеличивается версия данных, а загрузку нужно запустить повторно
+    (upsert идемпотентен, поэтому повтор дописывает только недостающее).
+    """
+    loop = asyncio.get_running_loop()
+    queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=2) for _ in range(workers)]
+    progress = [[0, 0] for _ in range(workers)]  # [видео, снапшоты] по шардам
+    started = time.perf_counter()
+    last_report = started
+    committed = 0  # шарды, транзакции которых зафиксированы
+
+    def report(final: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        rows = sum(videos + snapshots for videos, snapshots in progress)
+        logger.info(
+            "%s: %d строк за %.1f с (%.0f строк/с); по шардам (видео/снапшоты): %s",
+            "Параллельная загрузка завершена" if final else "Прогресс параллельной загрузки",
+            rows,
+            elapsed,
+            rows / elapsed if elapsed else 0.0,
+            ", ".join(f"#{shard}: {videos}/{snapshots}" for shard, (videos, snapshots) in enumerate(progress)),
+        )
+
+    async def write_shard(shard: int) -> None:
+        nonlocal last_report, committed
+        async with pool.connection() as connection:
+            async with connection.transaction():
+                while (item := await queues[shard].get()) is not None:
+                    video_values, snapshot_values = item
+                    await upsert_rows(
+                        connection,
+                        video_values=video_values,
+                        snapshot_values=snapshot_values,
+                        bump_version=False,
+                        method=method,
+                        incremental=incremental,
+                        creator_rollups=False,
+                    )
+                    progress[shard][0] += len(video_values)
+                    progress[shard][1] += len(snapshot_values)
+
+                    if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.perf_counter()
+                        report()
+        committed += 1
+
+    async def produce(executor: ProcessPoolExecutor) -> None:
+        buffers: List[Tuple[List[tuple], List[tuple]]] = [([], []) for _ in range(workers)]
+        pending: deque = deque()
+
+        async def dispatch(future: asyncio.Future) -> None:
+            shard_rows = await future
+            for shard, (video_values, snapshot_values) in enumerate(shard_rows):
+                buffer_videos, buffer_snapshots = buffers[shard]
+                buffer_videos.extend(video_values)
+                buffer_snapshots.extend(snapshot_values)
+                if len(buffer_videos) + len(buffer_snapshots) >= batch_size:
+                    await queues[shard].put((buffer_videos, buffer_snapshots))
+                    buffers[shard] = ([], [])
+
+        for chunk in iter_raw_chunks(data_path, PARALLEL_CHUNK_BYTES):
+            pending.append(loop.run_in_executor(executor, prepare_shard_rows, chunk, workers))
+            # Ограничиваем число кусков в работе, чтобы память не росла с размером файла;
+            # результаты забираются строго в порядке чтения
+            if len(pending) >= workers * 2:
+                await dispatch(pending.popleft())
+
+        while pending:
+            await dispatch(pending.popleft())
+
+        for shard, (video_values, snapshot_values) in enumerate(buffers):
+            if video_values or snapshot_values:
+                await queues[shard].put((video_values, snapshot_values))
+        for queue in queues:
+            await queue.put(None)
+
+    failed = False
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            writers = [asyncio.create_task(write_shard(shard)) for shard in range(workers)]
+            producer = asyncio.create_task(produce(executor))
+            try:
+                await asyncio.gather(producer, *writers)
+            except BaseException:
+                failed = True
+                for task in (producer, *writers):
+                    task.cancel()
+                await asyncio.gather(producer, *writers, return_exceptions=True)
+                raise
+    finally:
+        # Строки зафиксированных шардов видны сразу, поэтому агрегаты и версия данных обновляются
+        # и после сбоя остальных: иначе кеш результатов и колоночные файлы остались бы на старой версии
+        if committed:
+            if failed:
+                logger.warning(
+                    "Параллельная загрузка прервана: зафиксировано шардов %d из %d, запустите загрузку повторно",
+                    committed, workers,
+                )
+            try:
+                await publish_parallel_load(pool)
+            except Exception as e:
+                if not failed:
+                    raise
+                logger.error("Не удалось обновить агрегаты и версию данных после сбоя загрузки: %s", e)
+
+    report(final=True)
+
+
+# Функция, пересобирающая агрегаты по креаторам и увеличивающая версию данных после параллельной загрузки
+async def publish_parallel_load(pool: AsyncConnectionPool) -> None:
+    # Агрегаты по креаторам затрагиваются всеми шардами, поэтому пересобираются один раз
+    async with pool.connection() as connection:
+        async with connection.cursor() as cur:
+            await rebuild_creator_rollups(cur)
+            await bump_data_version(cur)
+
+
+async def main(config: Config) -> None:
+    data_path = config.load.path
+
+    if not os.path.exists(data_path):
+        logger.error("Файл не найден: %s", data_path)
         return
 
     # Подключение к БД и загрузка
-    connection: Optional[AsyncConnection] = None
+    pool: Optional[AsyncConnectionPool] = None
     try:
-        connection = await get_pg_connection(
+        pool = await create_pg_pool(
             db_name=config.db.name,
             host=config.db.host,
             port=config.db.port,
             user=config.db.user,
             password=config.db.password,
+            min_size=1,
+            max_size=max(config.db.pool.max_size, config.load.workers + 1),
+            max_idle=config.db.pool.max_idle,
+            max_lifetime=config.db.pool.max_lifetime,
+            timeout=config.db.pool.timeout,
+            check=config.db.pool.check,
+            timezone=config.db.timezone,
         )
 
-        async with connection:
-            async with connection.transaction():
-                await upsert_videos_and_snapshots(connection, data=videos_data)
+        # Схема таблицы снапшотов определяется по БД, а не по настройкам
+        async with pool.connection() as connection:
+            async with connection.cursor() as cur:
+                partitioned = await is_partitioned(cur)
+        if partitioned:
+            logger.info("Таблица video_snapshots секционирована, создаём секции для месяцев файла")
+            await prepare_snapshot_partitions(pool, data_path)
+
+        if config.load.mode == "parallel":
+            await load_parallel(
+                pool,
+                data_path,
+                config.load.batch_size,
+                config.load.method,
+                config.load.workers,
+                incremental=config.load.incremental,
+            )
+        elif config.load.mode == "chunked":
+            await load_chunked(
+                pool,
+                data_path,
+                config.load.batch_size,
+                config.load.method,
+                incremental=config.load.incremental,
+            )
+        elif config.load.mode == "stream":
+            await load_streaming(
+                pool,
+                data_path,
+                config.load.batch_size,
+                config.load.method,
+                incremental=config.load.incremental,
+            )
+        else:
+            await load_full(
+                pool,
+                data_path,
+                config.load.method,
+                incremental=config.load.incremental,
+            )
+
+        # Колоночные файлы бота обновляются после каждой успешной загрузки; их ошибка загрузку не отменяет
+        if config.columnar.enabled:
+            if not columnar_available():
+                logger.warning("Пакет numpy не установлен, колоночные файлы в %s не обновлены", config.columnar.path)
+            else:
+                try:
+                    await export_columnar(pool, config.columnar.path)
+                except Exception as e:
+                    logger.error("Не удалось обновить колоночные файлы: %s", e)
 
     except Exception as e:
         logger.error("Критическая ошибка при работе с базой данных: %s", e)
         raise
     finally:
-        if connection and not connection.closed:
-            await connection.close()
-            logger.debug("Подключение к БД закрыто")
+        if pool:
+            await pool.close()
+            logger.debug("Пул соединений с БД закрыт")
 
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    config = get_config()
+    logging.basicConfig(
+        level=logging.getLevelName(config.log.level),
+        format=config.log.format,
+    )
+    asyncio.run(main(config))
@@ -0,0 +1,188 @@
+import logging
+from typing import List
+
+from psycopg import AsyncConnection, AsyncCursor
+
+logger = logging.getLogger(__name__)
+
+# Позиции полей в кортежах из `prepare_rows`
+VIDEO_ID = 0
+VIDEO_CREATOR_ID = 1
+VIDEO_CREATED_AT = 2
+SNAPSHOT_VIDEO_ID = 1
+SNAPSHOT_CREATED_AT = 10
+
+# Дневные агрегаты и таблицы, из которых они строятся
+ROLLUP_SOURCES = {
+    "daily_video_stats": "video_snapshots",
+    "daily_creator_stats": "video_snapshots",
+    "daily_video_publications": "videos",
+}
+
+
+# Функция, пересчитывающая дневные суммы приростов по видео для дней, затронутых пачкой снапшотов
+async def refresh_video_rollups(cur: AsyncCursor, snapshot_values: List[tuple]) -> None:
+    if not snapshot_values:
+        return
+
+    # Пересчёт (а не прибавление) делает обновление идемпотентным: дубликаты снапшотов,
+    # пропущенные ON CONFLICT, и повторные загрузки не искажают суммы
+    await cur.execute(
+        """
+        WITH affected AS (
+            SELECT DISTINCT k.video_id, k.created_at::date AS day
+            FROM unnest(%s::uuid[], %s::timestamptz[]) AS k(video_id, created_at)
+        )
+        INSERT INTO daily_video_stats (
+            video_id, day,
+            delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+            snapshots_count
+        )
+        SELECT a.video_id, a.day,
+               COALESCE(SUM(s.delta_views_count), 0),
+               COALESCE(SUM(s.delta_likes_count), 0),
+               COALESCE(SUM(s.delta_comments_count), 0),
+               COALESCE(SUM(s.delta_reports_count), 0),
+               COUNT(*)
+        FROM affected a
+        JOIN video_snapshots s
+          ON s.video_id = a.video_id
+         AND s.created_at >= a.day
+         AND s.created_at < a.day + 1
+        GROUP BY a.video_id, a.day
+        ON CONFLICT (video_id, day) DO UPDATE SET
+            delta_views_count = EXCLUDED.delta_views_count,
+            delta_likes_count = EXCLUDED.delta_likes_count,
+            delta_comments_count = EXCLUDED.delta_comments_count,
+            delta_reports_count = EXCLUDED.delta_reports_count,
+            snapshots_count = EXCLUDED.snapshots_count;
+        """,
+        (
+            [row[SNAPSHOT_VIDEO_ID] for row in snapshot_values],
+            [row[SNAPSHOT_CREATED_AT] for row in snapshot_values],
+        ),
+    )
+
+
+# Функция, пересчитывающая агрегаты по креаторам для креаторов и дней, затронутых пачкой
+async def refresh_creator_rollups(
+    cur: AsyncCursor,
+    video_values: List[tuple],
+    snapshot_values: List[tuple],
+) -> None:
+    if snapshot_values:
+        await cur.execute(
+            """
+            WITH affected AS (
+                SELECT DISTINCT v.creator_id, k.created_at::date AS day
+                FROM unnest(%s::uuid[], %s::timestamptz[]) AS k(video_id, created_at)
+                JOIN videos v ON v.id = k.video_id
+            )
+            INSERT INTO daily_creator_stats (
+                creator_id, day,
+                delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                snapshots_count, videos_count
+            )
+            SELECT a.creator_id, a.day,
+                   SUM(d.delta_views_count),
+                   SUM(d.delta_likes_count),
+                   SUM(d.delta_comments_count),
+                   SUM(d.delta_reports_count),
+                   SUM(d.snapshots_count),
+                   COUNT(*)
+            FROM affected a
+            JOIN videos v ON v.creator_id = a.creator_id
+            JOIN daily_video_stats d ON d.video_id = v.id AND d.day = a.day
+            GROUP BY a.creator_id, a.day
+            ON CONFLICT (creator_id, day) DO UPDATE SET
+                delta_views_count = EXCLUDED.delta_views_count,
+                delta_likes_count = EXCLUDED.delta_likes_count,
+                delta_comments_count = EXCLUDED.delta_comments_count,
+                delta_reports_count = EXCLUDED.delta_reports_count,
+                snapshots_count = EXCLUDED.snapshots_count,
+                videos_count = EXCLUDED.videos_count;
+            """,
+            (
+                [row[SNAPSHOT_VIDEO_ID] for row in snapshot_values],
+                [row[SNAPSHOT_CREATED_AT] for row in snapshot_values],
+            ),
+        )
+
+    if video_values:
+        await cur.execute(
+            """
+            WITH affected AS (
+                SELECT DISTINCT k.creator_id, k.video_created_at::date AS day
+                FROM unnest(%s::text[], %s::timestamptz[]) AS k(creator_id, video_created_at)
+            )
+            INSERT INTO daily_video_publications (creator_id, day, videos_count)
+            SELECT a.creator_id, a.day, COUNT(*)
+            FROM affected a
+            JOIN videos v
+              ON v.creator_id = a.creator_id
+             AND v.video_created_at >= a.day
+             AND v.video_created_at < a.day + 1
+            GROUP BY a.creator_id, a.day
+            ON CONFLICT (creator_id, day) DO UPDATE SET
+                videos_count = EXCLUDED.videos_count;
+            """,
+            (
+                [row[VIDEO_CREATOR_ID] for row in video_values],
+                [row[VIDEO_CREATED_AT] for row in video_values],
+            ),
+        )
+
+
+# Функция, полностью пересобирающая агрегаты по креаторам из дневных агрегатов по видео
+async def rebuild_creator_rollups(cur: AsyncCursor) -> None:
+    await cur.execute(
+        """
+        INSERT INTO daily_creator_stats (
+            creator_id, day,
+            delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+            snapshots_count, videos_count
+        )
+        SELECT v.creator_id, d.day,
+               SUM(d.delta_views_count),
+               SUM(d.delta_likes_count),
+               SUM(d.delta_comments_count),
+               SUM(d.delta_reports_count),
+               SUM(d.snapshots_count),
+               COUNT(*)
+        FROM daily_video_stats d
+        JOIN videos v ON v.id = d.video_id
+        GROUP BY v.creator_id, d.day
+        ON CONFLICT (creator_id, day) DO UPDATE SET
+            delta_views_count = EXCLUDED.delta_views_count,
+            delta_likes_count = EXCLUDED.delta_likes_count,
+            delta_comments_count = EXCLUDED.delta_comments_count,
+            delta_reports_count = EXCLUDED.delta_reports_count,
+            snapshots_count = EXCLUDED.snapshots_count,
+            videos_count = EXCLUDED.videos_count;
+
+        INSERT INTO daily_video_publications (creator_id, day, videos_count)
+        SELECT creator_id, video_created_at::date, COUNT(*)
+        FROM videos
+        GROUP BY creator_id, video_created_at::date
+        ON CONFLICT (creator_id, day) DO UPDATE SET
+            videos_count = EXCLUDED.videos_count;
+        """
+    )
+    logger.info("Агрегаты по креаторам пересобраны")
+
+
+# Функция, проверяющая, что дневные агрегаты созданы и заполнены: агрегат не пуст, если есть исходные строки
+async def rollups_populated(connection: AsyncConnection) -> bool:
+    async with connection.cursor() as cur:
+        for rollup, source in ROLLUP_SOURCES.items():
+            await cur.execute("SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL", (rollup, source))
+            if not all(await cur.fetchone()):
+                logger.warning("Таблица %s или %s не найдена", rollup, source)
+                return False
+
+            await cur.execute(f"SELECT EXISTS (SELECT 1 FROM {source}), EXISTS (SELECT 1 FROM {rollup})")
+            has_source, has_rollup = await cur.fetchone()
+            if has_source and not has_rollup:
+                logger.warning("Агрегат %s пуст, хотя в %s есть строки", rollup, source)
+                return False
+    return True
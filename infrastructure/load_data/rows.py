@@ -0,0 +1,65 @@
+import json
+import zlib
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Позиция created_at в кортеже снапшота
+SNAPSHOT_CREATED_AT = 10
+
+
+# Функция, превращающая видео из JSON в кортежи строк для таблиц videos и video_snapshots
+def prepare_rows(data: Iterable[Dict[str, Any]]) -> Tuple[List[tuple], List[tuple]]:
+    video_values: List[tuple] = []
+    snapshot_values: List[tuple] = []
+
+    for video in data:
+        # Основные данные видео
+        video_values.append((
+            video["id"],
+            video["creator_id"],
+            video["video_created_at"],
+            video["views_count"],
+            video["likes_count"],
+            video["comments_count"],
+            video["reports_count"],
+        ))
+
+        # Снапшоты
+        for snap in video["snapshots"]:
+            snapshot_values.append((
+                snap["id"],
+                snap["video_id"],
+                snap["views_count"],
+                snap["likes_count"],
+                snap["comments_count"],
+                snap["reports_count"],
+                snap["delta_views_count"],
+                snap["delta_likes_count"],
+                snap["delta_comments_count"],
+                snap["delta_reports_count"],
+                snap["created_at"],
+            ))
+
+    return video_values, snapshot_values
+
+
+# Функция, возвращающая номер шарда видео; стабильна между процессами (в отличие от hash())
+def shard_of(video_id: str, shards: int) -> int:
+    return zlib.crc32(str(video_id).encode()) % shards
+
+
+# Функция для процесса-воркера: декодирует сырые JSON-записи видео и раскладывает строки по шардам
+def prepare_shard_rows(
+    records: List[bytes],
+    shards: int,
+) -> List[Tuple[List[tuple], List[tuple]]]:
+    result: List[Tuple[List[tuple], List[tuple]]] = [([], []) for _ in range(shards)]
+
+    for raw in records:
+        video = json.loads(raw)
+        video_values, snapshot_values = prepare_rows((video,))
+        # Снапшоты идут в шард родительского видео, чтобы видео записывалось раньше них
+        shard_videos, shard_snapshots = result[shard_of(video["id"], shards)]
+        shard_videos.extend(video_values)
+        shard_snapshots.extend(snapshot_values)
+
+    return result
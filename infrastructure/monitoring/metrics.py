@@ -0,0 +1,268 @@
+import json
+import logging
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах: от быстрых попаданий в кеш до долгих ответов LLM
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Идентификатор трассировки текущего сообщения; задачи, созданные внутри обработки, наследуют его
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+
+
+def new_trace_id() -> str:
+    """Создаёт идентификатор трассировки для текущего контекста и возвращает его."""
+    trace_id = uuid.uuid4().hex[:12]
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет в записи лога поле `trace_id` (для LOG_FORMAT с `%(trace_id)s`)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def install_trace_logging() -> None:
+    """
+    Подключает TraceIdFilter к обработчикам корневого логгера. Если формат обработчика
+    не содержит `%(trace_id)s`, идентификатор добавляется в начало строки.
+    """
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, TraceIdFilter) for f in handler.filters):
+            handler.addFilter(TraceIdFilter())
+        formatter = handler.formatter or logging.Formatter()
+        fmt = formatter._fmt or "%(message)s"
+        if "trace_id" not in fmt:
+            handler.setFormatter(logging.Formatter(f"[%(trace_id)s] {fmt}", formatter.datefmt))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in sorted(labels.items())) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # Последняя ячейка — значения больше верхней границы (+Inf)
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Метрики горячего пути в памяти процесса без внешних зависимостей.
+
+    - гистограммы длительности этапов (`bot_stage_duration_seconds{stage=...}`):
+      prompt_load, llm_request, sql_cleanup, pool_acquire, query_execution, columnar, telegram_send;
+    - счётчики ошибок, попаданий в кеши и таймаутов;
+    - значения-gauge, например длительности фаз запуска (`bot_startup_seconds{phase=...}`); текущие значения
+      (глубина очередей, ожидание) обновляются сборщиками `add_collector` при каждом чтении;
+    - захват медленных запросов: SQL, выполнявшийся дольше `slow_query_seconds`,
+      сохраняется в кольцевой буфер из `slow_query_limit` последних записей и пишется в лог.
+
+    `render()` отдаёт всё в текстовом формате Prometheus.
+    """
+
+    def __init__(
+        self,
+        *,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        slow_query_seconds: float = 1.0,
+        slow_query_limit: int = 100,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.slow_query_seconds = slow_query_seconds
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self._gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._slow_queries: Deque[Dict[str, Any]] = deque(maxlen=slow_query_limit)
+        self._collectors: List[Callable[["Metrics"], None]] = []
+        self._started_at = time.time()
+
+    # --- запись ---
+
+    def observe(self, stage: str, seconds: float) -> None:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = _Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Измеряет длительность блока `with` как этап `stage`, в том числе при исключении."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def inc(self, name: str, value: int = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def add_collector(self, collector: Callable[["Metrics"], None]) -> None:
+        """Регистрирует функцию, которая обновляет gauge перед каждым `render()` и `stats()`."""
+        self._collectors.append(collector)
+
+    def _collect(self) -> None:
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.warning("Ошибка сборщика метрик %r: %s", collector, e)
+
+    def error(self, stage: str) -> None:
+        self.inc("errors", stage=stage)
+
+    def cache_hit(self, cache: str) -> None:
+        self.inc("cache_hits", cache=cache)
+
+    def timeout(self, stage: str) -> None:
+        self.inc("timeouts", stage=stage)
+
+    def record_query(self, sql: str, seconds: float, params: tuple | None = None) -> None:
+        """Учитывает выполнение SQL и сохраняет его, если он медленнее порога."""
+        self.observe("query_execution", seconds)
+        if self.slow_query_seconds <= 0 or seconds < self.slow_query_seconds:
+            return
+        self.inc("slow_queries")
+        entry = {
+            "at": time.time(),
+            "duration": round(seconds, 4),
+            "trace_id": trace_id_var.get(),
+            "sql": sql.strip(),
+            "params": list(params) if params else [],
+        }
+        self._slow_queries.append(entry)
+        logger.warning("Медленный запрос (%.0f мс): %s", seconds * 1000, entry["sql"])
+
+    # --- чтение ---
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        return list(self._slow_queries)
+
+    def render(self) -> str:
+        self._collect()
+        lines = [
+            "# HELP bot_uptime_seconds Time since the metrics registry was created.",
+            "# TYPE bot_uptime_seconds gauge",
+            f"bot_uptime_seconds {_number(round(time.time() - self._started_at, 3))}",
+            "# HELP bot_stage_duration_seconds Duration of message processing stages.",
+            "# TYPE bot_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                labels = _labels({"stage": stage, "le": _number(bound)})
+                lines.append(f"bot_stage_duration_seconds_bucket{labels} {cumulative}")
+            labels = _labels({"stage": stage})
+            lines.append(f"bot_stage_duration_seconds_sum{labels} {_number(histogram.sum)}")
+            lines.append(f"bot_stage_duration_seconds_count{labels} {histogram.count}")
+
+        counters: Dict[str, List[str]] = {}
+        for (name, labels), value in sorted(self._counters.items()):
+            counters.setdefault(name, []).append(f"bot_{name}_total{_labels(dict(labels))} {value}")
+        for name, samples in counters.items():
+            lines.append(f"# TYPE bot_{name}_total counter")
+            lines.extend(samples)
+
+        gauges: Dict[str, List[str]] = {}
+        for (name, labels), value in sorted(self._gauges.items()):
+            gauges.setdefault(name, []).append(f"bot_{name}{_labels(dict(labels))} {_number(round(value, 6))}")
+        for name, samples in gauges.items():
+            lines.append(f"# TYPE bot_{name} gauge")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict[str, Any]:
+        self._collect()
+        return {
+            "stages": {
+                stage: {"count": h.count, "avg": h.sum / h.count if h.count else None}
+                for stage, h in sorted(self._histograms.items())
+            },
+            "counters": {
+                name + (str(dict(labels)) if labels else ""): value
+                for (name, labels), value in sorted(self._counters.items())
+            },
+            "gauges": {
+                name + (str(dict(labels)) if labels else ""): value
+                for (name, labels), value in sorted(self._gauges.items())
+            },
+            "slow_queries": len(self._slow_queries),
+        }
+
+
+METRICS_KEY = web.AppKey("metrics", Metrics)
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=request.app[METRICS_KEY].render(),
+        content_type="text/plain",
+        charset="utf-8",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+async def _slow_queries_handler(request: web.Request) -> web.Response:
+    # Параметры шаблонных запросов могут быть датами
+    return web.json_response(request.app[METRICS_KEY].slow_queries(), dumps=partial(json.dumps, default=str))
+
+
+async def start_metrics_server(metrics: Metrics, *, host: str, port: int) -> web.AppRunner:
+    """
+    Запускает локальный HTTP-сервер: GET /metrics (формат Prometheus)
+    и GET /metrics/slow (JSON с последними медленными запросами).
+    Возвращает runner, который нужно закрыть через `await runner.cleanup()`.
+    """
+    app = web.Application()
+    app[METRICS_KEY] = metrics
+    app.router.add_get("/metrics", _metrics_handler)
+    app.router.add_get("/metrics/slow", _slow_queries_handler)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics server listening on %s:%d", host, port)
+    return runner
@@ -0,0 +1,73 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from infrastructure.monitoring.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """
+    Замеряет запуск процесса: длительность фаз (конфигурация, пул БД, прогрев LLM...),
+    время до готовности принимать сообщения и время до первого отправленного ответа.
+
+    Отсчёт идёт от `started_at` (`time.monotonic()` в начале процесса). Значения пишутся в лог
+    и, если подключены метрики, в gauge `bot_startup_seconds{phase=...}`; фаза `first_answer` —
+    время от старта процесса до первого ответа пользователю после деплоя.
+    """
+
+    def __init__(self, started_at: float | None = None) -> None:
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.phases: Dict[str, float] = {}
+        self.ready_after: float | None = None
+        self.first_answer_after: float | None = None
+        self._metrics: Metrics | None = None
+
+    def attach(self, metrics: Metrics) -> None:
+        """Подключает метрики и переносит в них уже замеренные фазы."""
+        self._metrics = metrics
+        for phase, seconds in self.phases.items():
+            metrics.set_gauge("startup_seconds", seconds, phase=phase)
+
+    def _record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = seconds
+        if self._metrics is not None:
+            self._metrics.set_gauge("startup_seconds", seconds, phase=phase)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Измеряет длительность блока `with` как фазу запуска `name`."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(name, time.monotonic() - started)
+
+    def ready(self) -> None:
+        """Отмечает момент, когда бот начинает принимать сообщения."""
+        self.ready_after = time.monotonic() - self.started_at
+        self._record("ready", self.ready_after)
+        logger.info(
+            "Бот готов через %.2f с после старта процесса (фазы: %s)",
+            self.ready_after,
+            ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in self.phases.items() if name != "ready"),
+        )
+
+    def answered(self) -> None:
+        """Отмечает отправку ответа; учитывается только первый ответ после старта."""
+        if self.first_answer_after is not None:
+            return
+        self.first_answer_after = time.monotonic() - self.started_at
+        self._record("first_answer", self.first_answer_after)
+        logger.info("Первый ответ отправлен через %.2f с после старта процесса", self.first_answer_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "ready_after": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "first_answer_after": (
+                round(self.first_answer_after, 3) if self.first_answer_after is not None else None
+            ),
+        }
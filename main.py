@@ -1,5 +1,9 @@
 import asyncio
 import logging
+import time
+
+# Отсчёт времени запуска процесса: до импорта aiogram и модулей бота
+STARTED_AT = time.monotonic()
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
@@ -8,15 +12,38 @@ from aiogram.enums import ParseMode
 from bot.handlers.other import other_router
 from bot.handlers.query import query_router
 from bot.handlers.start_help import start_help_router
-from config.config import Config, load_config
-
-config: Config = load_config()
+from bot.services.batch import QuestionSplitter
+from bot.services.intents import IntentMatcher
+from bot.services.llm import LLMClient
+from bot.services.pipeline import QueryPipeline
+from bot.services.prompt_builder import PromptBuilder, SQLiteExampleStore
+from bot.services.resilience import CircuitBreaker, HedgePolicy
+from bot.services.scheduler import WorkScheduler
+from bot.services.translation_cache import (
+    PostgresTranslationStore,
+    SQLiteTranslationStore,
+    TranslationCache,
+    TranslationStore,
+)
+from bot.webhook import run_webhook
+from config.config import Config, get_config
+from infrastructure.cache.singleflight import SingleFlight
+from infrastructure.columnar.engine import ColumnarEngine
+from infrastructure.columnar.export import is_available as columnar_available
+from infrastructure.database.connection import create_pg_pool
+from infrastructure.database.query_guard import QueryGuard
+from infrastructure.database.result_cache import ResultCache
+from infrastructure.database.sql_rewriter import SargableRewriter
+from infrastructure.load_data.rollups import rollups_populated
+from infrastructure.monitoring.metrics import Metrics, install_trace_logging, start_metrics_server
+from infrastructure.monitoring.startup import StartupTimer
 
 logger = logging.getLogger(__name__)
 
 # Функция конфигурирования и запуска бота
-async def main(config: Config) -> None:
+async def main(config: Config, startup: StartupTimer | None = None) -> None:
     logger.info("Starting bot...")
+    startup = startup or StartupTimer()
 
     # Инициализируем бот и диспетчер
     bot = Bot(
@@ -31,12 +58,244 @@ async def main(config: Config) -> None:
     dp.include_routers(start_help_router, query_router, other_router)
 
 
-    # Запускаем поллинг
+    # Открываем общий пул соединений с БД, он передаётся в хэндлеры как `pool`
+    logger.info("Opening database connection pool...")
+    with startup.phase("db_pool"):
+        pool = await create_pg_pool(
+            db_name=config.db.name,
+            host=config.db.host,
+            port=config.db.port,
+            user=config.db.user,
+            password=config.db.password,
+            min_size=config.db.pool.min_size,
+            max_size=config.db.pool.max_size,
+            max_idle=config.db.pool.max_idle,
+            max_lifetime=config.db.pool.max_lifetime,
+            timeout=config.db.pool.timeout,
+            check=config.db.pool.check,
+            timezone=config.db.timezone,
+        )
+
+    # Метрики этапов обработки; сервер /metrics слушает только локальный адрес по умолчанию
+    metrics: Metrics | None = None
+    metrics_runner = None
+    if config.metrics.enabled:
+        metrics = Metrics(slow_query_seconds=config.metrics.slow_query_ms / 1000)
+        metrics_runner = await start_metrics_server(metrics, host=config.metrics.host, port=config.metrics.port)
+        startup.attach(metrics)
+    if config.metrics.trace_ids:
+        install_trace_logging()
+
+    # Промпт под вопрос: компактная схема и похожие проверенные примеры вместо полного prompt.txt
+    prompt_builder: PromptBuilder | None = None
+    if config.prompt.retrieval:
+        prompt_builder = PromptBuilder(
+            store=SQLiteExampleStore(config.prompt.examples_path),
+            k=config.prompt.examples_k,
+            max_examples=config.prompt.max_examples,
+            min_score=config.prompt.min_score,
+            verify_successes=config.prompt.verify_successes,
+        )
+
+    # Создаём долгоживущий клиент LLM, он передаётся в хэндлеры как `llm`
+    llm = LLMClient(
+        config.ai.token,
+        timeout=config.ai.timeout,
+        connection_limit=config.ai.connection_limit,
+        keepalive_timeout=config.ai.keepalive_timeout,
+        dns_cache_ttl=config.ai.dns_cache_ttl,
+        stream=config.ai.stream,
+        stream_read_timeout=config.ai.stream_read_timeout,
+        hedge=HedgePolicy(
+            min_delay=config.ai.hedge_min_delay,
+            max_ratio=config.ai.hedge_max_ratio,
+        ) if config.ai.hedge else None,
+        breaker=CircuitBreaker(
+            failure_threshold=config.ai.breaker_failures,
+            recovery_time=config.ai.breaker_recovery,
+            probe_timeout=config.ai.timeout,
+        ) if config.ai.breaker_failures > 0 else None,
+        prompt_builder=prompt_builder,
+        metrics=metrics,
+    )
+    with startup.phase("llm_client"):
+        await llm.start()
+        if prompt_builder is not None:
+            await prompt_builder.start()
+
+    # Кеш переводов «вопрос -> SQL» с опциональным персистентным уровнем
+    store: TranslationStore | None = None
+    if config.translation_cache.backend == "disk":
+        store = SQLiteTranslationStore(config.translation_cache.path, ttl=config.translation_cache.ttl)
+    elif config.translation_cache.backend == "postgres":
+        store = PostgresTranslationStore(pool, ttl=config.translation_cache.ttl)
+    translation_cache = TranslationCache(
+        max_size=config.translation_cache.max_size,
+        ttl=config.translation_cache.ttl,
+        store=store,
+    )
+
+    # Кеш результатов запросов, инвалидируемый по версии данных
+    result_cache: ResultCache | None = None
+    if config.result_cache.max_size > 0:
+        result_cache = ResultCache(
+            max_size=config.result_cache.max_size,
+            version_ttl=config.result_cache.version_ttl,
+        )
+
+    # Простые агрегаты по колоночным файлам без запроса к БД; версия файлов сверяется с версией кеша результатов
+    columnar: ColumnarEngine | None = None
+    if config.columnar.enabled:
+        if not columnar_available():
+            logger.warning("COLUMNAR_ENABLED=true, но пакет numpy не установлен: запросы выполняются в БД")
+        elif result_cache is None:
+            logger.warning("COLUMNAR_ENABLED=true, но кеш результатов выключен: запросы выполняются в БД")
+        else:
+            columnar = ColumnarEngine(config.columnar.path)
+
+    # Переписывание фильтров по датам в диапазоны; границы дней — в часовом поясе сессий пула
+    rewriter = SargableRewriter(timezone=config.db.timezone)
+
+    # Ограничения выполнения SQL от LLM: READ ONLY, таймаут, work_mem, проверка плана
+    guard = QueryGuard(
+        statement_timeout_ms=config.query_guard.statement_timeout_ms,
+        work_mem=config.query_guard.work_mem,
+        explain=config.query_guard.explain,
+        max_cost=config.query_guard.max_cost,
+        max_rows=config.query_guard.max_rows,
+        record_rejected=config.query_guard.record_rejected,
+    )
+
+    # Шаблонные ответы на типовые вопросы без обращения к LLM; шаблоны читают дневные агрегаты,
+    # поэтому без заполненных агрегатов они дали бы нули вместо ответа
+    intents: IntentMatcher | None = None
+    if config.intents.enabled:
+        async with pool.connection() as connection:
+            populated = await rollups_populated(connection)
+        if populated:
+            intents = IntentMatcher(default_year=config.intents.default_year)
+        else:
+            logger.warning("INTENTS_ENABLED=true, но дневные агрегаты не заполнены: типовые вопросы уходят в LLM")
+
+    # Объединение одновременных одинаковых вопросов: один вызов LLM и одно выполнение SQL на всех
+    llm_flights: SingleFlight | None = None
+    db_flights: SingleFlight | None = None
+    if config.singleflight.enabled:
+        llm_flights = SingleFlight(timeout=config.singleflight.llm_timeout)
+        db_flights = SingleFlight(timeout=config.singleflight.db_timeout)
+
+    # Допуск сообщений к обработке и лимиты этапов LLM/БД
+    scheduler: WorkScheduler | None = None
+    if config.scheduler.enabled:
+        scheduler = WorkScheduler(
+            workers=config.scheduler.workers,
+            max_queue=config.scheduler.queue_size,
+            max_per_user=config.scheduler.user_queue_size,
+            llm_concurrency=config.scheduler.llm_concurrency,
+            llm_rate=config.scheduler.llm_rate,
+            llm_burst=config.scheduler.llm_burst,
+            db_concurrency=min(config.scheduler.db_concurrency, config.db.pool.max_size),
+        )
+        if metrics is not None:
+            scheduler.attach(metrics)
+        # Дублирующие запросы к модели расходуют ту же квоту частоты, что и основные
+        llm.rate_limit = scheduler.llm.bucket
+
+    # Разбиение сообщения с несколькими вопросами для пакетного ответа
+    splitter: QuestionSplitter | None = None
+    if config.batch.enabled:
+        splitter = QuestionSplitter(max_questions=config.batch.max_questions)
+
+    # Прогрев до приёма сообщений: пул БД уже открыт с min_size соединениями, промпт загружен в llm.start();
+    # остаётся открыть соединение с API модели и прочитать версию данных для кеша результатов
+    if config.bot.warm_up:
+        logger.info("Warming up...")
+        with startup.phase("warm_up"):
+            await llm.warm_up()
+            if result_cache is not None:
+                await result_cache.current_version(pool)
+            if columnar is not None:
+                columnar.refresh(force=True)
+
+    # Объекты, которые aiogram передаёт в хэндлеры по именам аргументов
+    workflow_data = dict(
+        pipeline=QueryPipeline(
+            pool=pool,
+            llm=llm,
+            translation_cache=translation_cache,
+            rewriter=rewriter,
+            guard=guard,
+            result_cache=result_cache,
+            intents=intents,
+            llm_flights=llm_flights,
+            db_flights=db_flights,
+            scheduler=scheduler,
+            metrics=metrics,
+            prompt_builder=prompt_builder,
+            columnar=columnar,
+        ),
+        splitter=splitter,
+        startup=startup,
+    )
+
+    # Запускаем поллинг или веб-сервер для вебхука
+    startup.ready()
     try:
-        await dp.start_polling(bot)
+        if config.bot.mode == "webhook":
+            await run_webhook(
+                dp,
+                bot,
+                host=config.webhook.host,
+                port=config.webhook.port,
+                path=config.webhook.path,
+                secret=config.webhook.secret,
+                url=config.webhook.url,
+                drain_timeout=config.webhook.drain_timeout,
+                **workflow_data,
+            )
+        else:
+            await dp.start_polling(bot, **workflow_data)
     except Exception as e:
         logger.exception(e)
+    finally:
+        logger.info("Startup stats: %s", startup.stats())
+        logger.info("LLM client stats: %s", llm.stats())
+        logger.info("Translation cache stats: %s", translation_cache.stats())
+        if result_cache is not None:
+            logger.info("Result cache stats: %s", result_cache.stats())
+        if columnar is not None:
+            logger.info("Columnar engine stats: %s", columnar.stats())
+        logger.info("SQL rewriter stats: %s", rewriter.stats())
+        logger.info("Query guard stats: %s", guard.stats())
+        if intents is not None:
+            logger.info("Intent matcher stats: %s", intents.stats())
+        if llm_flights is not None:
+            logger.info("LLM single-flight stats: %s", llm_flights.stats())
+            logger.info("DB single-flight stats: %s", db_flights.stats())
+        if scheduler is not None:
+            logger.info("Scheduler stats: %s", scheduler.stats())
+        if splitter is not None:
+            logger.info("Question splitter stats: %s", splitter.stats())
+        if prompt_builder is not None:
+            logger.info("Prompt builder stats: %s", prompt_builder.stats())
+            prompt_builder.close()
+        if metrics is not None:
+            logger.info("Metrics: %s", metrics.stats())
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if isinstance(store, SQLiteTranslationStore):
+            store.close()
+        await llm.close()
+        await pool.close()
+        logger.info("Database connection pool closed")
 
 
 if __name__ == '__main__':
-    asyncio.run(main(config))
\ No newline at end of file
+    startup = StartupTimer(STARTED_AT)
+    with startup.phase("config"):
+        config = get_config()
+    logging.basicConfig(
+        level=logging.getLevelName(config.log.level),
+        format=config.log.format,
+    )
+    asyncio.run(main(config, startup))
\ No newline at end of file
@@ -3,32 +3,32 @@ import logging
 import os
 import sys
 
-from infrastructure.database.connection import get_pg_connection
-from config.config import Config, load_config
-from psycopg import AsyncConnection, Error
-
-config: Config = load_config()
-
-logging.basicConfig(
-    level=logging.getLevelName(level=config.log.level),
-    format=config.log.format,
-)
+from infrastructure.database.connection import create_pg_pool
+from infrastructure.database.partitions import setup_partitioned_snapshots
+from config.config import Config, get_config
+from psycopg import Error
+from psycopg_pool import AsyncConnectionPool
 
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    connection: AsyncConnection | None = None
+async def main(config: Config):
+    pool: AsyncConnectionPool | None = None
 
     try:
-        connection = await get_pg_connection(
+        pool = await create_pg_pool(
             db_name=config.db.name,
             host=config.db.host,
             port=config.db.port,
             user=config.db.user,
             password=config.db.password,
+            min_size=1,
+            max_size=1,
+            timeout=config.db.pool.timeout,
+            check=config.db.pool.check,
+            timezone=config.db.timezone,
         )
-        async with connection:
+        async with pool.connection() as connection:
             async with connection.transaction():
                 async with connection.cursor() as cursor:
                     # Расширение pgcrypto для gen_random_uuid()
@@ -51,30 +51,40 @@ async def main():
                         """
                     )
 
-                    # Таблица снэпшотов
-                    await cursor.execute(
-                        """
-                        CREATE TABLE IF NOT EXISTS video_snapshots (
-                            id UUID PRIMARY KEY,
-                            video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
-                            views_count BIGINT,
-                            likes_count BIGINT,
-                            comments_count BIGINT,
-                            reports_count BIGINT,
-                            delta_views_count BIGINT,
-                            delta_likes_count BIGINT,
-                            delta_comments_count BIGINT,
-                            delta_reports_count BIGINT,
-                            created_at TIMESTAMPTZ NOT NULL,
-                            updated_at TIMESTAMPTZ DEFAULT NOW()
-                        );
-                        
-                        CREATE INDEX IF NOT EXISTS idx_video_snapshots_video_id 
-                            ON video_snapshots(video_id);
+                    # Таблица снэпшотов: обычная или секционированная по месяцам created_at
+                    if config.db.partitioned_snapshots:
+                        await setup_partitioned_snapshots(cursor, config.db.partitions_ahead)
+                    else:
+                        await cursor.execute(
+                            """
+                            CREATE TABLE IF NOT EXISTS video_snapshots (
+                                id UUID PRIMARY KEY,
+                                video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+                                views_count BIGINT,
+                                likes_count BIGINT,
+                                comments_count BIGINT,
+                                reports_count BIGINT,
+                                delta_views_count BIGINT,
+                                delta_likes_count BIGINT,
+                                delta_comments_count BIGINT,
+                                delta_reports_count BIGINT,
+                                created_at TIMESTAMPTZ NOT NULL,
+                                updated_at TIMESTAMPTZ DEFAULT NOW()
+                            );
+
+                            CREATE INDEX IF NOT EXISTS idx_video_snapshots_video_id
+                                ON video_snapshots(video_id);
+
+                            CREATE INDEX IF NOT EXISTS idx_video_snapshots_created_at
+                                ON video_snapshots(created_at);
 
-                        CREATE INDEX IF NOT EXISTS idx_video_snapshots_created_at 
-                            ON video_snapshots(created_at);
+                            CREATE INDEX IF NOT EXISTS idx_video_snapshots_video_id_created_at
+                                ON video_snapshots(video_id, created_at);
+                            """
+                        )
 
+                    await cursor.execute(
+                        """
                         CREATE INDEX IF NOT EXISTS idx_videos_creator_id 
                             ON videos(creator_id);
 
@@ -82,14 +92,164 @@ async def main():
                             ON videos(video_created_at);
                         """
                     )
-                logger.info("Tables 'videos', 'video_snapshots' were successfully created")
+
+                    # Персистентный кеш переводов «нормализованный вопрос -> SQL»
+                    await cursor.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS sql_translation_cache (
+                            question_key TEXT PRIMARY KEY,
+                            sql TEXT NOT NULL,
+                            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                        );
+                        """
+                    )
+
+                    # Версия данных: увеличивается загрузчиком, используется кешем результатов
+                    await cursor.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS data_version (
+                            id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                            version BIGINT NOT NULL DEFAULT 0,
+                            updated_at TIMESTAMPTZ DEFAULT NOW()
+                        );
+
+                        INSERT INTO data_version (id, version) VALUES (1, 0)
+                            ON CONFLICT (id) DO NOTHING;
+                        """
+                    )
+
+                    # Чекпоинты возобновляемой загрузки данных (LOAD_MODE=chunked)
+                    await cursor.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS load_checkpoints (
+                            file_id TEXT PRIMARY KEY,
+                            path TEXT NOT NULL,
+                            byte_offset BIGINT NOT NULL,
+                            videos_loaded BIGINT NOT NULL DEFAULT 0,
+                            snapshots_loaded BIGINT NOT NULL DEFAULT 0,
+                            last_video_id TEXT,
+                            completed BOOLEAN NOT NULL DEFAULT FALSE,
+                            updated_at TIMESTAMPTZ DEFAULT NOW()
+                        );
+                        """
+                    )
+
+                    # SQL от LLM, отклонённый ограничениями выполнения (для разбора)
+                    await cursor.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS rejected_queries (
+                            id BIGSERIAL PRIMARY KEY,
+                            sql TEXT NOT NULL,
+                            reason TEXT NOT NULL,
+                            estimated_cost DOUBLE PRECISION,
+                            estimated_rows DOUBLE PRECISION,
+                            created_at TIMESTAMPTZ DEFAULT NOW()
+                        );
+                        """
+                    )
+
+                    # Дневные агрегаты, поддерживаемые загрузчиком
+                    await cursor.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS daily_video_stats (
+                            video_id UUID NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+                            day DATE NOT NULL,
+                            delta_views_count BIGINT NOT NULL DEFAULT 0,
+                            delta_likes_count BIGINT NOT NULL DEFAULT 0,
+                            delta_comments_count BIGINT NOT NULL DEFAULT 0,
+                            delta_reports_count BIGINT NOT NULL DEFAULT 0,
+                            snapshots_count BIGINT NOT NULL DEFAULT 0,
+                            PRIMARY KEY (video_id, day)
+                        );
+
+                        CREATE TABLE IF NOT EXISTS daily_creator_stats (
+                            creator_id TEXT NOT NULL,
+                            day DATE NOT NULL,
+                            delta_views_count BIGINT NOT NULL DEFAULT 0,
+                            delta_likes_count BIGINT NOT NULL DEFAULT 0,
+                            delta_comments_count BIGINT NOT NULL DEFAULT 0,
+                            delta_reports_count BIGINT NOT NULL DEFAULT 0,
+                            snapshots_count BIGINT NOT NULL DEFAULT 0,
+                            videos_count BIGINT NOT NULL DEFAULT 0,
+                            PRIMARY KEY (creator_id, day)
+                        );
+
+                        CREATE TABLE IF NOT EXISTS daily_video_publications (
+                            creator_id TEXT NOT NULL,
+                            day DATE NOT NULL,
+                            videos_count BIGINT NOT NULL DEFAULT 0,
+                            PRIMARY KEY (creator_id, day)
+                        );
+
+                        CREATE INDEX IF NOT EXISTS idx_daily_video_stats_day
+                            ON daily_video_stats(day);
+
+                        CREATE INDEX IF NOT EXISTS idx_daily_creator_stats_day
+                            ON daily_creator_stats(day);
+
+                        CREATE INDEX IF NOT EXISTS idx_daily_video_publications_day
+                            ON daily_video_publications(day);
+                        """
+                    )
+
+                    # Первичное заполнение агрегатов по уже загруженным данным (только если они пусты)
+                    await cursor.execute(
+                        """
+                        INSERT INTO daily_video_stats (
+                            video_id, day,
+                            delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                            snapshots_count
+                        )
+                        SELECT video_id, created_at::date,
+                               COALESCE(SUM(delta_views_count), 0),
+                               COALESCE(SUM(delta_likes_count), 0),
+                               COALESCE(SUM(delta_comments_count), 0),
+                               COALESCE(SUM(delta_reports_count), 0),
+                               COUNT(*)
+                        FROM video_snapshots
+                        WHERE NOT EXISTS (SELECT 1 FROM daily_video_stats)
+                        GROUP BY video_id, created_at::date;
+
+                        INSERT INTO daily_creator_stats (
+                            creator_id, day,
+                            delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count,
+                            snapshots_count, videos_count
+                        )
+                        SELECT v.creator_id, d.day,
+                               SUM(d.delta_views_count), SUM(d.delta_likes_count),
+                               SUM(d.delta_comments_count), SUM(d.delta_reports_count),
+                               SUM(d.snapshots_count), COUNT(*)
+                        FROM daily_video_stats d
+                        JOIN videos v ON v.id = d.video_id
+                        WHERE NOT EXISTS (SELECT 1 FROM daily_creator_stats)
+                        GROUP BY v.creator_id, d.day;
+
+                        INSERT INTO daily_video_publications (creator_id, day, videos_count)
+                        SELECT creator_id, video_created_at::date, COUNT(*)
+                        FROM videos
+                        WHERE NOT EXISTS (SELECT 1 FROM daily_video_publications)
+                        GROUP BY creator_id, video_created_at::date;
+                        """
+                    )
+                logger.info(
+                    "Tables 'videos', 'video_snapshots', 'sql_translation_cache', 'data_version', "
+                    "'load_checkpoints', 'rejected_queries', 'daily_video_stats', 'daily_creator_stats', "
+                    "'daily_video_publications' were successfully created"
+                )
     except Error as db_error:
         logger.exception("Database-specific error: %s", db_error)
     except Exception as e:
         logger.exception("Unhandled error: %s", e)
     finally:
-        if connection:
-            await connection.close()
-            logger.info("Connection to Postgres closed")
+        if pool:
+            await pool.close()
+            logger.info("Connection pool to Postgres closed")
+
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    config = get_config()
+    logging.basicConfig(
+        level=logging.getLevelName(config.log.level),
+        format=config.log.format,
+    )
+    asyncio.run(main(config))
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from bot.handlers.query import _answer_batch
+from bot.services.batch import QuestionSplitter, TooManyQuestionsError
+from bot.services.pipeline import ResolvedQuery
+from infrastructure.database.query_guard import QueryRejectedError
+
+
+@pytest.fixture
+def splitter() -> QuestionSplitter:
+    return QuestionSplitter(max_questions=3)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Сколько всего видео?",
+        "  Сколько видео вышло 1.12.2025?  ",
+        "Сколько видео\nвышло в ноябре 2025?",
+        "Сколько видео с просмотрами > 100? и лайками > 10",
+    ],
+)
+def test_single_question_is_returned_as_is(splitter, text):
+    assert splitter.split(text) == [text.strip()]
+
+
+@pytest.mark.parametrize(
+    "text, questions",
+    [
+        (
+            "1. Сколько всего видео?\n2. Сколько всего просмотров?",
+            ["Сколько всего видео?", "Сколько всего просмотров?"],
+        ),
+        (
+            "Отчёт за неделю:\n- Сколько всего видео\n- Сколько всего лайков",
+            ["Сколько всего видео", "Сколько всего лайков"],
+        ),
+        (
+            "Сколько всего видео? Сколько всего лайков? 3) Сколько жалоб?",
+            ["Сколько всего видео?", "Сколько всего лайков?", "3) Сколько жалоб?"],
+        ),
+        (
+            "Сколько видео вышло\nв ноябре 2025?\nСколько лайков набрали\nвидео за ноябрь?",
+            ["Сколько видео вышло в ноябре 2025?", "Сколько лайков набрали видео за ноябрь?"],
+        ),
+    ],
+)
+def test_list_is_split_into_questions(splitter, text, questions):
+    assert splitter.split(text) == questions
+
+
+def test_too_many_questions(splitter):
+    with pytest.raises(TooManyQuestionsError) as error:
+        splitter.split("\n".join(f"{i}. Сколько видео у креатора {i}?" for i in range(1, 5)))
+    assert (error.value.count, error.value.limit) == (4, 3)
+    assert splitter.stats()["rejected"] == 1
+
+
+class FakePipeline:
+    """Шаблоны и кеш — словарь `known`, LLM — один вызов `translate_many` на все неизвестные вопросы."""
+
+    metrics = None
+
+    def __init__(self, known, results) -> None:
+        self.known = known
+        self.results = results
+        self.translated = []
+        self.executed = []
+
+    async def lookup(self, question):
+        sql = self.known.get(question)
+        return ResolvedQuery(question, sql) if sql else None
+
+    async def translate_many(self, questions):
+        self.translated.append(questions)
+        return [ResolvedQuery(question, f"SQL {question}", generated=f"SQL {question}") for question in questions]
+
+    async def execute_many(self, queries, user_id=None):
+        self.executed.append([query.sql for query in queries])
+        return [self.results[query.sql] for query in queries]
+
+
+def test_batch_uses_one_llm_call_and_one_query():
+    pipeline = FakePipeline(
+        known={"Сколько всего видео?": "SELECT COUNT(*) FROM videos"},
+        results={
+            "SELECT COUNT(*) FROM videos": 10,
+            "SQL Сколько лайков?": None,
+            "SQL Сколько жалоб?": QueryRejectedError("дорого"),
+        },
+    )
+    answer = asyncio.run(_answer_batch(["Сколько всего видео?", "Сколько лайков?", "Сколько жалоб?"], pipeline))
+
+    assert pipeline.translated == [["Сколько лайков?", "Сколько жалоб?"]]
+    assert len(pipeline.executed) == 1
+    assert answer.splitlines() == [
+        "1. Сколько всего видео? — 10",
+        "2. Сколько лайков? — 0",
+        "3. Сколько жалоб? — ❌ Запрос получился слишком тяжёлым или недопустимым. Попробуй уточнить вопрос.",
+    ]
+
+
+def test_batch_llm_failure_keeps_other_answers():
+    class FailingPipeline(FakePipeline):
+        async def translate_many(self, questions):
+            raise RuntimeError("api")
+
+    pipeline = FailingPipeline(known={"Сколько всего видео?": "SQL"}, results={"SQL": 5})
+    answer = asyncio.run(_answer_batch(["Сколько всего видео?", "Сколько лайков?"], pipeline))
+
+    assert answer.splitlines() == [
+        "1. Сколько всего видео? — 5",
+        "2. Сколько лайков? — ❌ Не удалось обработать запрос. Попробуй переформулировать.",
+    ]
@@ -0,0 +1,190 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from infrastructure.columnar.export import COUNTERS, DELTAS
+from infrastructure.database.query_executor_db import normalize_scalar
+
+np = pytest.importorskip("numpy")
+
+from infrastructure.columnar.engine import ColumnarEngine, parse_query  # noqa: E402
+
+ZONE = ZoneInfo("Europe/Moscow")
+VERSION = 7
+
+CREATORS = ["a", "b"]
+VIDEO_IDS = ["00000000000000000000000000000001", "00000000000000000000000000000002", "00000000000000000000000000000003"]
+
+# (креатор, публикация по Москве, просмотры); видео отсортированы по времени публикации.
+# Третье видео опубликовано в 00:30 по Москве 2 ноября — по UTC это ещё 1 ноября
+VIDEOS = [
+    (0, datetime(2025, 11, 1, 10, 0), 100),
+    (1, datetime(2025, 11, 1, 23, 30), 200),
+    (0, datetime(2025, 11, 2, 0, 30), 50),
+]
+
+# (номер видео, время по Москве, прирост просмотров); отсортированы по времени
+SNAPSHOTS = [
+    (0, datetime(2025, 11, 1, 12, 0), 100),
+    (1, datetime(2025, 11, 1, 23, 59), 200),
+    (0, datetime(2025, 11, 2, 0, 0), 20),
+    (2, datetime(2025, 11, 2, 1, 0), 50),
+    (0, datetime(2025, 11, 3, 9, 0), 5),
+]
+
+
+def micros(moment: datetime) -> int:
+    return round(moment.replace(tzinfo=ZONE).timestamp() * 1_000_000)
+
+
+@pytest.fixture
+def engine(tmp_path) -> ColumnarEngine:
+    directory = tmp_path / "v7-1"
+    directory.mkdir()
+
+    published = np.array([micros(moment) for _, moment, _ in VIDEOS], dtype=np.int64)
+    videos = {
+        "creator": np.array([creator for creator, _, _ in VIDEOS], dtype=np.int32),
+        "video_created_at": published,
+        "created_at": published,
+        "views_count": np.array([views for _, _, views in VIDEOS], dtype=np.int64),
+    }
+    for column in COUNTERS[1:]:
+        videos[column] = np.zeros(len(VIDEOS), dtype=np.int64)
+
+    video = np.array([code for code, _, _ in SNAPSHOTS], dtype=np.int32)
+    snapshots = {
+        "video": video,
+        "creator": np.array([VIDEOS[code][0] for code in video], dtype=np.int32),
+        "created_at": np.array([micros(moment) for _, moment, _ in SNAPSHOTS], dtype=np.int64),
+        "delta_views_count": np.array([delta for _, _, delta in SNAPSHOTS], dtype=np.int64),
+    }
+    for column in COUNTERS + DELTAS[1:]:
+        snapshots[column] = np.zeros(len(SNAPSHOTS), dtype=np.int64)
+
+    for name, array in videos.items():
+        np.save(directory / f"videos.{name}.npy", array)
+    for name, array in snapshots.items():
+        np.save(directory / f"snapshots.{name}.npy", array)
+    np.save(directory / "video_ids.npy", np.array(VIDEO_IDS, dtype="S32"))
+    (directory / "creators.json").write_text(json.dumps(CREATORS))
+    (tmp_path / "current.json").write_text(json.dumps({
+        "dir": directory.name,
+        "data_version": VERSION,
+        "timezone": "Europe/Moscow",
+        "videos": len(VIDEOS),
+        "snapshots": len(SNAPSHOTS),
+        "nulls": {},
+    }))
+    return ColumnarEngine(str(tmp_path))
+
+
+@pytest.mark.parametrize(
+    "sql, params, expected",
+    [
+        # Границы дня — полночь по часовому поясу выгрузки: снапшот в 00:00 2 ноября относится ко 2 ноября
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day = '2025-11-01'", None, 300),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day = '2025-11-02'", None, 70),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day >= '2025-11-02'", None, 75),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day > '2025-11-02'", None, 5),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day < '2025-11-02'", None, 300),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day <= '2025-11-02'", None, 370),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day = %s", (date(2025, 11, 3),), 5),
+        ("SELECT SUM(snapshots_count) FROM daily_video_stats WHERE day = '2025-11-02'", None, 2),
+        ("SELECT COALESCE(SUM(videos_count), 0) FROM daily_video_publications WHERE day = '2025-11-01'", None, 2),
+        ("SELECT COALESCE(SUM(videos_count), 0) FROM daily_video_publications WHERE day = '2025-11-02'", None, 1),
+        # BETWEEN включает обе границы
+        (
+            "SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day BETWEEN '2025-11-01' AND '2025-11-02'",
+            None,
+            370,
+        ),
+        (
+            "SELECT SUM(delta_views_count) FROM daily_creator_stats WHERE creator_id = %s AND day BETWEEN %s AND %s",
+            ("a", date(2025, 11, 2), date(2025, 11, 3)),
+            75,
+        ),
+        # COUNT(DISTINCT)
+        ("SELECT COUNT(DISTINCT video_id) FROM daily_video_stats WHERE day = '2025-11-02'", None, 2),
+        ("SELECT COUNT(DISTINCT video_id) FROM daily_video_stats WHERE day >= '2025-11-01'", None, 3),
+        ("SELECT COUNT(DISTINCT creator_id) FROM daily_creator_stats WHERE day = '2025-11-02'", None, 1),
+        ("SELECT COUNT(DISTINCT creator_id) FROM daily_video_publications WHERE day = '2025-11-01'", None, 2),
+        # Пустой диапазон: COALESCE даёт 0, SUM без него — NULL, COUNT — 0
+        ("SELECT COALESCE(SUM(delta_views_count), 0) FROM daily_video_stats WHERE day = '2025-12-01'", None, 0),
+        ("SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day = '2025-12-01'", None, None),
+        ("SELECT COUNT(DISTINCT video_id) FROM daily_video_stats WHERE day = '2025-12-01'", None, 0),
+        ("SELECT COALESCE(SUM(views_count), 0) FROM videos WHERE views_count > 1000", None, 0),
+        # Время без зоны — в часовом поясе выгрузки, с AT TIME ZONE — в указанном
+        ("SELECT SUM(delta_views_count) FROM video_snapshots WHERE created_at >= '2025-11-02 00:00'", None, 75),
+        (
+            "SELECT SUM(delta_views_count) FROM video_snapshots "
+            "WHERE created_at >= TIMESTAMP '2025-11-01 21:00:00' AT TIME ZONE 'UTC' "
+            "AND created_at < TIMESTAMP '2025-11-02 21:00:00' AT TIME ZONE 'UTC'",
+            None,
+            70,
+        ),
+        # Креатор и видео
+        ("SELECT COUNT(*) FROM videos WHERE creator_id = 'a'", None, 2),
+        ("SELECT COUNT(*) FROM videos WHERE creator_id = %s", ("zzz",), 0),
+        (
+            "SELECT SUM(delta_views_count) FROM video_snapshots WHERE video_id = %s",
+            ("00000000-0000-0000-0000-000000000001",),
+            125,
+        ),
+        ("SELECT COUNT(*) FROM videos v WHERE v.views_count >= 100;", None, 2),
+    ],
+)
+def test_execute(engine, sql, params, expected):
+    assert engine.execute(sql, params, VERSION) == expected
+
+
+def test_avg_matches_postgres_after_normalization(engine):
+    value = engine.execute("SELECT AVG(views_count) FROM videos", None, VERSION)
+    assert value == pytest.approx(350 / 3)
+    assert normalize_scalar(value) == normalize_scalar(Decimal("116.6666666666666667")) == 116.67
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT MAX(views_count) FROM videos",
+        "SELECT COUNT(*) FROM videos WHERE views_count > 1 OR likes_count > 1",
+        "SELECT COUNT(*) FROM videos v JOIN video_snapshots s ON s.video_id = v.id",
+        "SELECT COUNT(*) FROM videos WHERE created_at > NOW() - INTERVAL '1 day'",
+    ],
+)
+def test_unsupported_sql_is_a_miss(engine, sql):
+    assert parse_query(sql) is None
+    assert engine.is_miss(engine.execute(sql, None, VERSION))
+
+
+def test_other_data_version_is_a_miss(engine):
+    assert engine.is_miss(engine.execute("SELECT COUNT(*) FROM videos", None, VERSION + 1))
+    assert engine.stats()["stale"] == 1
+
+
+def test_day_with_time_is_a_miss(engine):
+    sql = "SELECT SUM(delta_views_count) FROM daily_video_stats WHERE day = '2025-11-01 12:00:00' AT TIME ZONE 'UTC'"
+    assert engine.is_miss(engine.execute(sql, None, VERSION))
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (Decimal("10"), 10),
+        (Decimal("10.000"), 10),
+        (Decimal("2.345"), 2.35),
+        (12.0, 12),
+        (1 / 3, 0.33),
+        (5, 5),
+        (None, None),
+        (True, True),
+    ],
+)
+def test_normalize_scalar(value, expected):
+    result = normalize_scalar(value)
+    assert result == expected
+    assert type(result) is type(expected)
@@ -0,0 +1,120 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+
+import pytest
+
+from bot.services.intents import IntentMatcher
+from infrastructure.load_data.rollups import rollups_populated
+
+
+@pytest.fixture
+def intents() -> IntentMatcher:
+    return IntentMatcher()
+
+
+@pytest.mark.parametrize(
+    "question, intent, sql, params",
+    [
+        ("Сколько всего видео?", "videos_total", "SELECT COUNT(*) FROM videos", ()),
+        ("Сколько всего просмотров?", "views_total", "SELECT COALESCE(SUM(views_count), 0) FROM videos", ()),
+        (
+            "Сколько видео у креатора с id AbC123xyz?",
+            "videos_total",
+            "SELECT COUNT(*) FROM videos WHERE creator_id = %s",
+            ("AbC123xyz",),
+        ),
+        (
+            "Сколько видео вышло в ноябре 2025 года?",
+            "videos_published",
+            "SELECT COALESCE(SUM(videos_count), 0) FROM daily_video_publications WHERE day >= %s AND day < %s",
+            (date(2025, 11, 1), date(2025, 12, 1)),
+        ),
+        (
+            "На сколько выросли просмотры 28 ноября 2025?",
+            "views_growth",
+            "SELECT COALESCE(SUM(delta_views_count), 0) FROM daily_video_stats WHERE day >= %s AND day < %s",
+            (date(2025, 11, 28), date(2025, 11, 29)),
+        ),
+        (
+            "На сколько выросли лайки у креатора abc123xyz с 1 по 5 ноября 2025?",
+            "likes_growth",
+            "SELECT COALESCE(SUM(delta_likes_count), 0) FROM daily_creator_stats "
+            "WHERE day >= %s AND day < %s AND creator_id = %s",
+            (date(2025, 11, 1), date(2025, 11, 6), "abc123xyz"),
+        ),
+    ],
+)
+def test_matches_templates(intents, question, intent, sql, params):
+    match = intents.match(question)
+    assert (match.intent, match.sql, match.params) == (intent, sql, params)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # Без года дата не дополняется: вопрос уходит в LLM
+        "На сколько выросли просмотры 28 ноября?",
+        "Сколько видео вышло в ноябре?",
+        # Условия, которых нет в шаблонах
+        "Сколько видео с просмотрами > 100000?",
+        "Сколько видео набрали больше 100000 просмотров?",
+        "Сколько просмотров в ноябре 2025?",
+        "Сколько видео и лайков?",
+        "Сколько видео у креатора aaaaaa1 и креатора bbbbbb2?",
+        "На сколько выросли просмотры 31 ноября 2025?",
+    ],
+)
+def test_leaves_other_questions_to_llm(intents, question):
+    assert intents.match(question) is None
+
+
+def test_default_year_fills_yearless_dates():
+    match = IntentMatcher(default_year=2024).match("На сколько выросли просмотры 28 ноября?")
+    assert match.params == (date(2024, 11, 28), date(2024, 11, 29))
+
+
+def test_stats(intents):
+    intents.match("Сколько всего видео?")
+    intents.match("Какое видео самое популярное?")
+    intents.record_llm_latency(2.0)
+    stats = intents.stats()
+    assert (stats["hits"], stats["misses"], stats["latency_saved"]) == (1, 1, 2.0)
+
+
+class RollupConnection:
+    """Отвечает на запросы `rollups_populated`: существование таблиц и наличие строк."""
+
+    def __init__(self, rows: dict) -> None:
+        self.rows = rows
+        self._result = None
+
+    @asynccontextmanager
+    async def cursor(self):
+        yield self
+
+    async def execute(self, sql, params=None):
+        if params:
+            self._result = tuple(name in self.rows for name in params)
+        else:
+            tables = [word for word in sql.replace(")", " ").split() if word in self.rows]
+            self._result = tuple(self.rows[table] > 0 for table in tables)
+
+    async def fetchone(self):
+        return self._result
+
+
+@pytest.mark.parametrize(
+    "rows, populated",
+    [
+        ({"videos": 10, "video_snapshots": 100, "daily_video_stats": 5, "daily_creator_stats": 3,
+          "daily_video_publications": 2}, True),
+        ({"videos": 0, "video_snapshots": 0, "daily_video_stats": 0, "daily_creator_stats": 0,
+          "daily_video_publications": 0}, True),
+        ({"videos": 10, "video_snapshots": 100, "daily_video_stats": 0, "daily_creator_stats": 0,
+          "daily_video_publications": 0}, False),
+        ({"videos": 10, "video_snapshots": 100}, False),
+    ],
+)
+def test_rollups_populated(rows, populated):
+    assert asyncio.run(rollups_populated(RollupConnection(rows))) is populated
@@ -0,0 +1,238 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from bot.services.llm import (
+    LLMClient,
+    LLMTimeoutError,
+    json_array_end,
+    parse_sql_list,
+    sql_statement_end,
+    strip_code_fence,
+)
+from bot.services.resilience import HedgePolicy
+from bot.services.scheduler import TokenBucket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def sse(*pieces: str) -> list[bytes]:
+    """События потока chat-completions с порциями текста."""
+    return [
+        f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n".encode()
+        for piece in pieces
+    ]
+
+
+@asynccontextmanager
+async def api(handler):
+    """Локальный HTTP-сервер вместо Chipp.ai; отдаёт URL эндпоинта."""
+    app = web.Application()
+    app.router.add_post("/chat", handler)
+    # Зависшие обработчики не держат остановку сервера
+    runner = web.AppRunner(app, shutdown_timeout=0.1)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        yield f"http://127.0.0.1:{port}/chat"
+    finally:
+        await runner.cleanup()
+
+
+def streaming(events: list[bytes], hang: float = 0.0):
+    """Обработчик, который отдаёт `events` потоком и затем молчит `hang` секунд, не закрывая поток."""
+    async def handler(request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for event in events:
+            await resp.write(event)
+        await asyncio.sleep(hang)
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+    return handler
+
+
+@pytest.fixture
+def prompt(tmp_path):
+    path = tmp_path / "prompt.txt"
+    path.write_text("Схема", encoding="utf-8")
+    return str(path)
+
+
+async def ask(url, prompt, questions=None, **options):
+    client = LLMClient("token", url=url, prompt_path=prompt, **options)
+    try:
+        if questions is None:
+            return await client.get_sql_query("Сколько видео?"), client
+        return await client.get_sql_queries(questions), client
+    finally:
+        await client.close()
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("SELECT 1", -1),
+        ("SELECT 1;", 9),
+        ("SELECT 1; -- ещё текст", 9),
+        ("SELECT ';' FROM t;", 18),
+        ("SELECT 1 -- ; комментарий\n;", 27),
+        ("SELECT 1 /* ; */;", 17),
+        ("SELECT 'не закрыта;", -1),
+        ("```sql\nSELECT 1\n```", 16),
+        ("```sql\nSELECT 1\n``", -1),
+    ],
+)
+def test_sql_statement_end(text, expected):
+    assert sql_statement_end(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('["SELECT 1"', -1),
+        ('["SELECT 1", "SELECT 2"] хвост', 24),
+        ('["SELECT \']\' ", "x"]', 20),
+        ('["a \\" ]"]', 10),
+        ("нет массива", -1),
+    ],
+)
+def test_json_array_end(text, expected):
+    assert json_array_end(text) == expected
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ("SELECT 1", "SELECT 1"),
+        ("```sql\nSELECT 1\n```", "SELECT 1"),
+        ("```\nSELECT 1\n```", "SELECT 1"),
+        ('```json\n["SELECT 1"]\n```', '["SELECT 1"]'),
+    ],
+)
+def test_strip_code_fence(content, expected):
+    assert strip_code_fence(content) == expected
+
+
+def test_parse_sql_list_strips_fences_and_semicolons():
+    content = '```json\n["SELECT 1;", "SELECT 2 ;"]\n```'
+    assert parse_sql_list(content, 2) == ["SELECT 1", "SELECT 2"]
+
+
+def test_stream_is_joined_until_done(prompt):
+    async def scenario():
+        async with api(streaming(sse("SELECT COUNT(*)", " FROM videos"))) as url:
+            return await ask(url, prompt)
+
+    sql, client = run(scenario())
+    assert sql == "SELECT COUNT(*) FROM videos"
+    assert client.early_stops == 0
+
+
+def test_stream_stops_after_first_statement(prompt):
+    # Сервер после «;» молчит дольше таймаута чтения: ответ должен прийти без ожидания конца потока
+    events = sse("```sql\nSELECT COUNT(*)", " FROM videos;", "\n```\nПояснение")
+
+    async def scenario():
+        async with api(streaming(events, hang=5)) as url:
+            return await ask(url, prompt, stream_read_timeout=1)
+
+    sql, client = run(scenario())
+    assert sql == "SELECT COUNT(*) FROM videos;"
+    assert client.early_stops == 1
+
+
+def test_batch_stream_stops_after_json_array(prompt):
+    events = sse('["SELECT 1", ', '"SELECT 2;"]', " Готово")
+
+    async def scenario():
+        async with api(streaming(events, hang=5)) as url:
+            return await ask(url, prompt, questions=["a", "b"], stream_read_timeout=1)
+
+    sqls, client = run(scenario())
+    assert sqls == ["SELECT 1", "SELECT 2"]
+    assert client.early_stops == 1
+
+
+def test_stalled_stream_times_out(prompt):
+    async def scenario():
+        async with api(streaming(sse("SELECT COUNT(*)"), hang=5)) as url:
+            return await ask(url, prompt, stream_read_timeout=0.2)
+
+    with pytest.raises(LLMTimeoutError):
+        run(scenario())
+
+
+def test_non_stream_response(prompt):
+    async def handler(request):
+        return web.json_response({"choices": [{"message": {"content": "```sql\nSELECT 1\n```"}}]})
+
+    async def scenario():
+        async with api(handler) as url:
+            return await ask(url, prompt, stream=False)
+
+    sql, _ = run(scenario())
+    assert sql == "SELECT 1"
+
+
+def test_hung_non_stream_response_times_out(prompt):
+    async def handler(request):
+        await asyncio.sleep(5)
+        return web.json_response({"choices": [{"message": {"content": "SELECT 1"}}]})
+
+    async def scenario():
+        async with api(handler) as url:
+            return await asyncio.wait_for(ask(url, prompt, stream=False, timeout=0.2), 3)
+
+    with pytest.raises(LLMTimeoutError):
+        run(scenario())
+
+
+def slow_first_request():
+    """Первый запрос отвечает через 0.5 с, следующие — сразу."""
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(0.5)
+        return web.json_response({"choices": [{"message": {"content": f"SELECT {len(calls)}"}}]})
+    return handler
+
+
+def hedge_policy() -> HedgePolicy:
+    hedge = HedgePolicy(min_delay=0.05, max_ratio=1, min_samples=1)
+    hedge.record(0.01)
+    return hedge
+
+
+def test_hedge_is_sent_when_rate_limit_has_a_token(prompt):
+    async def scenario():
+        async with api(slow_first_request()) as url:
+            return await ask(
+                url, prompt, stream=False, hedge=hedge_policy(), rate_limit=TokenBucket(rate=1, capacity=1)
+            )
+
+    sql, client = run(scenario())
+    assert sql == "SELECT 2"
+    assert (client.requests, client.hedged, client.hedge_wins, client.hedges_throttled) == (2, 1, 1, 0)
+
+
+def test_hedge_is_skipped_without_rate_limit_token(prompt):
+    bucket = TokenBucket(rate=0.001, capacity=1)
+    assert bucket.try_acquire()
+
+    async def scenario():
+        async with api(slow_first_request()) as url:
+            return await ask(url, prompt, stream=False, hedge=hedge_policy(), rate_limit=bucket)
+
+    sql, client = run(scenario())
+    assert sql == "SELECT 1"
+    assert (client.requests, client.hedged, client.hedges_throttled) == (1, 0, 1)
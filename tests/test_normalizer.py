@@ -0,0 +1,62 @@
+import pytest
+
+from bot.services.normalizer import month_number, normalize_question
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("Сколько видео с просмотрами > 100000?", "Сколько видео с просмотрами < 100000?"),
+        ("Сколько видео с просмотрами >= 100000?", "Сколько видео с просмотрами > 100000?"),
+        ("Сколько видео с просмотрами = 100000?", "Сколько видео с просмотрами 100000?"),
+        ("Сколько видео с просмотрами != 0?", "Сколько видео с просмотрами 0?"),
+        ("Какая доля видео набрала 10% лайков?", "Какая доля видео набрала 10 лайков?"),
+        ("Сколько видео у креатора AbC123xyz?", "Сколько видео у креатора abc123xyz?"),
+        ("Сколько просмотров у видео 1a2B3c4D?", "Сколько просмотров у видео 1A2b3C4d?"),
+        ("Сколько видео вышло 1 декабря 2025?", "Сколько видео вышло 1 декабря 2024?"),
+        ("Сколько видео набрали 100000 просмотров?", "Сколько видео набрали 10000 просмотров?"),
+    ],
+)
+def test_different_questions_get_different_keys(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+
+@pytest.mark.parametrize(
+    "variants, expected",
+    [
+        (
+            ["Сколько видео вышло 1 декабря 2025?", "сколько видео вышло 01.12.2025", "Сколько видео вышло 2025-12-1"],
+            "сколько видео вышло 2025-12-01",
+        ),
+        (
+            ["Сколько видео вышло 1/12/2025?", "СКОЛЬКО ВИДЕО ВЫШЛО 1 ДЕКАБРЯ 2025 года"],
+            "сколько видео вышло 2025-12-01",
+        ),
+        (
+            ["Сколько видео вышло в ноябре 2025 года?", "сколько видео вышло в ноябре 2025 г."],
+            "сколько видео вышло в 2025-11",
+        ),
+        (["Сколько видео вышло в ноябре?", "Сколько видео вышло в Ноябре"], "сколько видео вышло в xxxx-11"),
+        (["Сколько видео вышло 5 мая?", "сколько видео вышло 5 мая"], "сколько видео вышло xxxx-05-05"),
+        (["Сколько  всего   просмотров?!", "сколько всего просмотров"], "сколько всего просмотров"),
+        (["Сколько всего ёлок?", "сколько всего елок"], "сколько всего елок"),
+        (
+            ["Сколько видео с просмотрами>100000", "сколько видео с просмотрами > 100000?"],
+            "сколько видео с просмотрами > 100000",
+        ),
+        (["Сколько Views у Video ID abc123?", "сколько views у video id abc123"], "сколько views у video id abc123"),
+    ],
+)
+def test_equivalent_questions_get_one_key(variants, expected):
+    assert {normalize_question(variant) for variant in variants} == {expected}
+
+
+@pytest.mark.parametrize(
+    "word, number",
+    [
+        ("январь", 1), ("марта", 3), ("март", 3), ("мае", 5), ("май", 5), ("августе", 8), ("декабря", 12),
+        ("понедельник", None),
+    ],
+)
+def test_month_number(word, number):
+    assert month_number(word) == number
@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import psycopg
+import pytest
+
+from bot.services.pipeline import QueryPipeline, ResolvedQuery
+from bot.services.prompt_builder import PromptBuilder, SQLiteExampleStore
+from infrastructure.database.query_guard import QueryRejectedError
+
+SEED_SQL = "SELECT COUNT(*) FROM videos"
+QUESTION = "Сколько лайков у всех видео?"
+SQL = "SELECT SUM(likes_count) FROM videos"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def files(tmp_path):
+    template = tmp_path / "prompt_compact.txt"
+    template.write_text("Схема\n{examples}", encoding="utf-8")
+    seeds = tmp_path / "prompt_examples.json"
+    seeds.write_text(json.dumps([{"question": "Сколько всего видео?", "sql": SEED_SQL}]), encoding="utf-8")
+    return tmp_path
+
+
+def make_builder(files, store=None, verify_successes=3) -> PromptBuilder:
+    builder = PromptBuilder(
+        template_path=str(files / "prompt_compact.txt"),
+        seeds_path=str(files / "prompt_examples.json"),
+        store=store,
+        verify_successes=verify_successes,
+        min_score=0.0,
+    )
+    run(builder.start())
+    return builder
+
+
+def examples(builder: PromptBuilder):
+    return builder.similar([QUESTION])
+
+
+def test_example_needs_successes_from_different_users(files):
+    builder = make_builder(files)
+
+    async def scenario():
+        await builder.record(QUESTION, SQL, user_id=1)
+        await builder.record(QUESTION, SQL, user_id=1)
+        await builder.record(QUESTION, SQL, user_id=2)
+        before = (QUESTION, SQL) in examples(builder)
+        await builder.record(QUESTION, SQL, user_id=3)
+        return before
+
+    assert run(scenario()) is False
+    assert (QUESTION, SQL) in examples(builder)
+    assert builder.stats()["recorded"] == 1
+
+
+def test_other_sql_restarts_verification(files):
+    builder = make_builder(files, verify_successes=2)
+
+    async def scenario():
+        await builder.record(QUESTION, SQL, user_id=1)
+        await builder.record(QUESTION, "SELECT SUM(views_count) FROM videos", user_id=2)
+        await builder.record(QUESTION, SQL, user_id=3)
+
+    run(scenario())
+    assert builder.stats()["recorded"] == 0
+    assert builder.stats()["pending"] == 1
+
+
+def test_sql_matching_a_seed_is_verified_at_once(files):
+    builder = make_builder(files)
+    run(builder.record("А сколько видео всего?", f"{SEED_SQL} ;", user_id=1))
+    assert builder.stats()["recorded"] == 1
+    assert ("А сколько видео всего?", f"{SEED_SQL} ;") in builder.similar(["А сколько видео всего?"])
+
+
+def test_failed_sql_is_evicted_from_examples_and_store(files):
+    store = SQLiteExampleStore(str(files / "examples.sqlite3"))
+    builder = make_builder(files, store=store, verify_successes=1)
+
+    async def scenario():
+        await builder.record(QUESTION, SQL)
+        stored = await store.load(10)
+        # Другой SQL для того же вопроса пример не трогает
+        await builder.reject(QUESTION, "SELECT 1")
+        kept = (QUESTION, SQL) in examples(builder)
+        await builder.reject(QUESTION, SQL)
+        return stored, kept, await store.load(10)
+
+    stored, kept, after = run(scenario())
+    assert [row[2] for row in stored] == [SQL]
+    assert kept
+    assert after == []
+    assert (QUESTION, SQL) not in examples(builder)
+    assert builder.stats()["rejected"] == 1
+    store.close()
+
+
+def test_forget_keeps_seeds(files):
+    builder = make_builder(files, verify_successes=1)
+
+    async def scenario():
+        await builder.record(QUESTION, SQL)
+        return await builder.forget(QUESTION), await builder.forget("Сколько всего видео?")
+
+    assert run(scenario()) == (True, False)
+    assert (QUESTION, SQL) not in examples(builder)
+    assert ("Сколько всего видео?", SEED_SQL) in builder.similar(["Сколько всего видео?"])
+
+
+def test_store_loads_only_verified_pairs(files):
+    store = SQLiteExampleStore(str(files / "examples.sqlite3"))
+    # Пара, записанная после одного выполнения (как до появления проверки), в примеры не попадает
+    run(store.add("сколько лайков у всех видео", QUESTION, SQL, verified=1))
+    builder = make_builder(files, store=store, verify_successes=3)
+    assert (QUESTION, SQL) not in examples(builder)
+
+    run(store.add("сколько лайков у всех видео", QUESTION, SQL, verified=3))
+    builder = make_builder(files, store=store, verify_successes=3)
+    assert (QUESTION, SQL) in examples(builder)
+    store.close()
+
+
+class FailingPool:
+    """Пул, в котором запрос падает с ошибкой `error`; до БД дело не доходит."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+    def connection(self):
+        raise self.error
+
+
+class PassGuard:
+    """Проверка без записи отклонённых запросов в БД."""
+
+    def validate(self, sql):
+        pass
+
+    async def record(self, pool, sql, rejection):
+        pass
+
+    def rejection_from_error(self, error):
+        return None
+
+
+class NoCache:
+    async def set(self, question, sql):
+        pass
+
+
+def pipeline_with(files, error: Exception) -> tuple[QueryPipeline, PromptBuilder]:
+    builder = make_builder(files, verify_successes=1)
+    run(builder.record(QUESTION, SQL))
+    pipeline = QueryPipeline(
+        pool=FailingPool(error), llm=None, translation_cache=NoCache(), rewriter=None, guard=PassGuard(),
+        prompt_builder=builder,
+    )
+    return pipeline, builder
+
+
+@pytest.mark.parametrize(
+    "error, evicted",
+    [
+        (QueryRejectedError("запрос изменяет данные"), True),
+        (psycopg.errors.UndefinedColumn("column does not exist"), True),
+        (psycopg.OperationalError("connection refused"), False),
+    ],
+)
+def test_pipeline_evicts_example_only_for_bad_sql(files, error, evicted):
+    pipeline, builder = pipeline_with(files, error)
+    resolved = ResolvedQuery(QUESTION, SQL, generated=SQL, cached=True)
+
+    with pytest.raises(type(error)):
+        run(pipeline.execute(resolved, user_id=1))
+    assert ((QUESTION, SQL) not in examples(builder)) is evicted
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from infrastructure.database.query_guard import QueryGuard, QueryRejectedError, referenced_tables
+
+
+@pytest.fixture
+def guard() -> QueryGuard:
+    return QueryGuard()
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "INSERT INTO videos (id) VALUES ('x')",
+        "UPDATE videos SET views_count = 0",
+        "DELETE FROM video_snapshots",
+        "DROP TABLE videos",
+        "TRUNCATE videos",
+        "SELECT 1; DELETE FROM videos",
+        "WITH d AS (DELETE FROM videos RETURNING id) SELECT COUNT(*) FROM d",
+        "SELECT * INTO videos_copy FROM videos",
+        "SELECT id FROM videos FOR UPDATE",
+        "select count(*) from videos; drop table videos;",
+    ],
+)
+def test_rejects_writes(guard, sql):
+    with pytest.raises(QueryRejectedError):
+        guard.validate(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT COUNT(*) FROM pg_catalog.pg_user",
+        "SELECT COUNT(*) FROM information_schema.tables",
+        "SELECT COUNT(*) FROM rejected_queries",
+        "SELECT COUNT(*) FROM videos v JOIN sql_translation_cache c ON true",
+        "SELECT COUNT(*) FROM videos JOIN rejected_queries ON true",
+        "SELECT COUNT(*) FROM videos AS v, load_checkpoints",
+    ],
+)
+def test_rejects_other_tables(guard, sql):
+    with pytest.raises(QueryRejectedError, match="неразрешённым таблицам"):
+        guard.validate(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT COUNT(*) FROM videos;",
+        "SELECT COALESCE(SUM(delta_views_count), 0) FROM video_snapshots WHERE created_at >= '2025-11-01'",
+        "SELECT COUNT(*) FROM videos WHERE updated_at > created_at",
+        "SELECT COUNT(*) FROM videos WHERE creator_id = 'delete; drop table videos'",
+        "WITH t AS (SELECT video_id FROM daily_video_stats) SELECT COUNT(*) FROM t",
+        "SELECT EXTRACT(MONTH FROM video_created_at) FROM videos LIMIT 1",
+        "SELECT COUNT(*) FROM video_snapshots_y2025m11",
+        "-- комментарий\nSELECT COUNT(*) FROM public.videos",
+    ],
+)
+def test_allows_reads(guard, sql):
+    guard.validate(sql)
+
+
+def test_referenced_tables_skip_ctes_and_functions():
+    sql = "WITH t AS (SELECT * FROM videos) SELECT EXTRACT(DAY FROM created_at) FROM t JOIN video_snapshots s ON true"
+    assert referenced_tables(sql) == {"videos", "video_snapshots"}
+
+
+class PlanCursor:
+    def __init__(self, cost: float, rows: float) -> None:
+        self.plan = [{"Plan": {"Total Cost": cost, "Plan Rows": rows}}]
+        self.executed = []
+
+    async def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    async def fetchone(self):
+        return (self.plan,)
+
+
+def test_prepare_rejects_expensive_plan():
+    guard = QueryGuard(max_cost=1000, max_rows=0)
+    cur = PlanCursor(cost=5000, rows=1)
+    with pytest.raises(QueryRejectedError) as rejection:
+        asyncio.run(guard.prepare(cur, "SELECT COUNT(*) FROM videos"))
+    assert rejection.value.cost == 5000
+    assert cur.executed[0] == "SET TRANSACTION READ ONLY;"
+
+
+def test_prepare_accepts_cheap_plan():
+    guard = QueryGuard(max_cost=1000, max_rows=10)
+    asyncio.run(guard.prepare(PlanCursor(cost=10, rows=1), "SELECT COUNT(*) FROM videos"))
@@ -0,0 +1,167 @@
+import asyncio
+import types
+
+import pytest
+
+from bot.handlers.query import handle_text_query
+from bot.services.scheduler import SchedulerBusyError, StageLimiter, TokenBucket, WorkScheduler
+from infrastructure.monitoring.metrics import Metrics
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_free_slots_admit_immediately():
+    scheduler = WorkScheduler(workers=2)
+
+    async def scenario():
+        async with scheduler.admit("a"), scheduler.admit("b"):
+            return scheduler.stats()
+
+    stats = run(scenario())
+    assert (stats["active"], stats["queue_depth"], stats["admitted"]) == (2, 0, 2)
+
+
+def test_queued_users_are_served_round_robin():
+    scheduler = WorkScheduler(workers=1, max_queue=10, max_per_user=10)
+    order = []
+
+    async def message(user, name):
+        async with scheduler.admit(user):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        async with scheduler.admit("busy"):
+            tasks = [asyncio.create_task(message("a", f"a{i}")) for i in range(3)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(message("b", "b0")))
+            tasks.append(asyncio.create_task(message("c", "c0")))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    run(scenario())
+    # Пользователь с тремя сообщениями не задерживает остальных
+    assert order == ["a0", "b0", "c0", "a1", "a2"]
+
+
+def test_full_queue_rejects():
+    scheduler = WorkScheduler(workers=1, max_queue=1, max_per_user=5)
+
+    async def scenario():
+        async with scheduler.admit("a"):
+            waiting = asyncio.create_task(scheduler.admit("b").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(SchedulerBusyError):
+                async with scheduler.admit("c"):
+                    pass
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+
+    run(scenario())
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_full_user_queue_rejects_only_that_user():
+    scheduler = WorkScheduler(workers=1, max_queue=10, max_per_user=1)
+
+    async def scenario():
+        async with scheduler.admit("a"):
+            first = asyncio.create_task(scheduler.admit("a").__aenter__())
+            other = asyncio.create_task(scheduler.admit("b").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(SchedulerBusyError):
+                await scheduler.admit("a").__aenter__()
+            assert scheduler.stats()["queue_depth"] == 2
+            for task in (first, other):
+                task.cancel()
+            await asyncio.gather(first, other, return_exceptions=True)
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = WorkScheduler(workers=1)
+
+    async def scenario():
+        async with scheduler.admit("a"):
+            waiting = asyncio.create_task(scheduler.admit("b").__aenter__())
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            return scheduler.stats()["queue_depth"]
+
+    assert run(scenario()) == 0
+    assert scheduler.stats()["active"] == 0
+
+
+def test_busy_scheduler_gets_busy_reply():
+    scheduler = WorkScheduler(workers=1, max_queue=0)
+    sent = []
+
+    async def answer(text):
+        sent.append(text)
+
+    message = types.SimpleNamespace(
+        text="Сколько всего видео?", from_user=types.SimpleNamespace(id=1), chat=None, answer=answer
+    )
+    pipeline = types.SimpleNamespace(scheduler=scheduler, metrics=None)
+
+    async def scenario():
+        async with scheduler.admit(2):
+            await handle_text_query(message, pipeline, None, None)
+
+    run(scenario())
+    assert sent == ["⏳ Сейчас слишком много запросов. Попробуй через минуту."]
+
+
+def test_stage_limiter_caps_concurrency():
+    limiter = StageLimiter("db", 2)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.active)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(*(work() for _ in range(6)))
+
+    run(scenario())
+    assert peak == 2
+    assert limiter.stats()["acquired"] == 6
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        return loop.time() - started
+
+    # Первый токен есть сразу, ещё три — по 10 мс
+    assert run(scenario()) >= 0.025
+
+
+def test_attached_metrics_expose_queue_depth_and_waits():
+    scheduler = WorkScheduler(workers=1, max_queue=0)
+    metrics = Metrics()
+    scheduler.attach(metrics)
+
+    async def scenario():
+        async with scheduler.admit("a"):
+            with pytest.raises(SchedulerBusyError):
+                await scheduler.admit("b").__aenter__()
+            return metrics.render()
+
+    text = run(scenario())
+    assert "bot_scheduler_active 1" in text
+    assert "bot_scheduler_queue_depth 0" in text
+    assert 'bot_scheduler_wait_seconds{quantile="0.95"} 0' in text
+    assert 'bot_stage_waiting{stage="llm"} 0' in text
+    assert "bot_scheduler_rejected_total 1" in text
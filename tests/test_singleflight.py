@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from infrastructure.cache.singleflight import SingleFlight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert run(scenario()) == [42] * 5
+    assert calls == 1
+    assert flights.stats()["shared"] == 4
+    assert len(flights) == 0
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def scenario():
+        return await asyncio.gather(
+            flights.do("a", lambda: asyncio.sleep(0, "a")),
+            flights.do("b", lambda: asyncio.sleep(0, "b")),
+        )
+
+    assert run(scenario()) == ["a", "b"]
+    assert flights.stats()["leaders"] == 2
+
+
+def test_error_reaches_every_waiter_and_frees_the_key():
+    flights = SingleFlight()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+        # Ошибка не кешируется: следующий вызов выполняет работу заново
+        retry = await flights.do("key", lambda: asyncio.sleep(0, "ok"))
+        return results, retry
+
+    results, retry = run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert calls == 1
+    assert retry == "ok"
+
+
+def test_timeout_is_raised_to_every_waiter():
+    flights = SingleFlight(timeout=0.01)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flights.do("key", lambda: asyncio.sleep(1)) for _ in range(2)), return_exceptions=True
+        )
+
+    results = run(scenario())
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    assert flights.stats()["timeouts"] == 1
+    assert len(flights) == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def scenario():
+        first = asyncio.create_task(flights.do("key", lambda: asyncio.sleep(0.02, "done")))
+        second = asyncio.create_task(flights.do("key", lambda: asyncio.sleep(0.02, "other")))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert run(scenario()) == "done"
+
+
+def test_last_cancelled_waiter_cancels_the_work():
+    flights = SingleFlight()
+
+    async def scenario():
+        finished = []
+
+        async def work():
+            await asyncio.sleep(1)
+            finished.append(True)
+
+        waiter = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+        return finished
+
+    assert run(scenario()) == []
+    assert flights.stats()["abandoned"] == 1
+    assert len(flights) == 0
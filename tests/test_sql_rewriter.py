@@ -0,0 +1,150 @@
+import pytest
+
+from infrastructure.database.sql_rewriter import SargableRewriter
+
+
+def day_range(column: str, lower: str | None, upper: str | None, timezone: str = "UTC") -> str:
+    parts = []
+    if lower is not None:
+        parts.append(f"{column} >= TIMESTAMP '{lower} 00:00:00' AT TIME ZONE '{timezone}'")
+    if upper is not None:
+        parts.append(f"{column} < TIMESTAMP '{upper} 00:00:00' AT TIME ZONE '{timezone}'")
+    return f"({' AND '.join(parts)})"
+
+
+@pytest.fixture
+def rewriter() -> SargableRewriter:
+    return SargableRewriter()
+
+
+@pytest.mark.parametrize(
+    "predicate, expected, rule",
+    [
+        ("created_at::date = '2025-11-01'", day_range("created_at", "2025-11-01", "2025-11-02"), "date_cast"),
+        ("created_at::date >= '2025-11-01'", day_range("created_at", "2025-11-01", None), "date_cast"),
+        ("created_at::date > '2025-11-01'", day_range("created_at", "2025-11-02", None), "date_cast"),
+        ("created_at::date < '2025-11-01'", day_range("created_at", None, "2025-11-01"), "date_cast"),
+        ("created_at::date <= '2025-11-01'", day_range("created_at", None, "2025-11-02"), "date_cast"),
+        ("DATE(created_at) = '2025-11-01'", day_range("created_at", "2025-11-01", "2025-11-02"), "date_cast"),
+        (
+            "CAST(v.video_created_at AS DATE) = DATE '2025-11-01'",
+            day_range("v.video_created_at", "2025-11-01", "2025-11-02"),
+            "date_cast",
+        ),
+        (
+            "created_at::date BETWEEN '2025-11-01' AND '2025-11-05'",
+            day_range("created_at", "2025-11-01", "2025-11-06"),
+            "date_between",
+        ),
+        (
+            "date_trunc('month', created_at) = '2025-11-01'",
+            day_range("created_at", "2025-11-01", "2025-12-01"),
+            "date_trunc",
+        ),
+        (
+            "date_trunc('quarter', created_at) = '2025-10-01'",
+            day_range("created_at", "2025-10-01", "2026-01-01"),
+            "date_trunc",
+        ),
+        (
+            "date_trunc('week', created_at) = '2025-11-24'",
+            day_range("created_at", "2025-11-24", "2025-12-01"),
+            "date_trunc",
+        ),
+        (
+            "to_char(created_at, 'YYYY-MM') = '2025-11'",
+            day_range("created_at", "2025-11-01", "2025-12-01"),
+            "to_char",
+        ),
+        (
+            "to_char(created_at, 'YYYY') = '2025'",
+            day_range("created_at", "2025-01-01", "2026-01-01"),
+            "to_char",
+        ),
+        (
+            "EXTRACT(YEAR FROM created_at) = 2025 AND EXTRACT(MONTH FROM created_at) = 11",
+            day_range("created_at", "2025-11-01", "2025-12-01"),
+            "extract_year_month",
+        ),
+        (
+            "date_part('month', created_at) = 12 AND date_part('year', created_at) = 2025",
+            day_range("created_at", "2025-12-01", "2026-01-01"),
+            "extract_year_month",
+        ),
+        (
+            "EXTRACT(YEAR FROM created_at) = 2025",
+            day_range("created_at", "2025-01-01", "2026-01-01"),
+            "extract_year",
+        ),
+    ],
+)
+def test_rules(rewriter: SargableRewriter, predicate: str, expected: str, rule: str) -> None:
+    sql, rules = rewriter.rewrite(f"SELECT COUNT(*) FROM videos WHERE {predicate}")
+    assert sql == f"SELECT COUNT(*) FROM videos WHERE {expected}"
+    assert rules == [rule]
+
+
+def test_timezone_is_used_for_day_bounds() -> None:
+    sql, _ = SargableRewriter(timezone="Europe/Moscow").rewrite(
+        "SELECT COUNT(*) FROM videos WHERE created_at::date = '2025-11-01'"
+    )
+    assert sql == "SELECT COUNT(*) FROM videos WHERE " + day_range(
+        "created_at", "2025-11-01", "2025-11-02", "Europe/Moscow"
+    )
+
+
+@pytest.mark.parametrize(
+    "predicate",
+    [
+        # Невыровненная дата никогда не равна date_trunc(...), диапазон изменил бы результат
+        "date_trunc('month', created_at) = '2025-11-15'",
+        "date_trunc('week', created_at) = '2025-11-26'",
+        "date_trunc('quarter', created_at) = '2025-11-01'",
+        # Дробное число: `2025` не должно совпасть с началом `2025.0`
+        "EXTRACT(YEAR FROM created_at) = 2025.0",
+        "EXTRACT(YEAR FROM created_at) = 20251",
+        # Время, отличное от полуночи, и неразборчивые литералы
+        "created_at::date = '2025-11-01 10:00'",
+        "created_at::date = 'вчера'",
+        # Арифметика вокруг предиката меняет порядок разбора
+        "created_at::date + 1 = '2025-11-01'",
+        "EXTRACT(YEAR FROM created_at) = 2025 + 1",
+        "updated_at::date = created_at::date",
+    ],
+)
+def test_untouched(rewriter: SargableRewriter, predicate: str) -> None:
+    sql = f"SELECT COUNT(*) FROM videos WHERE {predicate}"
+    assert rewriter.rewrite(sql) == (sql, [])
+
+
+def test_literals_are_masked(rewriter: SargableRewriter) -> None:
+    # Предикат внутри строкового литерала не переписывается, а сам литерал сохраняется с экранированием
+    sql, rules = rewriter.rewrite(
+        "SELECT COUNT(*) FROM videos WHERE creator_id = 'created_at::date = ''2025-11-01''' "
+        "AND created_at::date = '2025-11-01'"
+    )
+    assert sql == (
+        "SELECT COUNT(*) FROM videos WHERE creator_id = 'created_at::date = ''2025-11-01''' AND "
+        + day_range("created_at", "2025-11-01", "2025-11-02")
+    )
+    assert rules == ["date_cast"]
+
+
+def test_not_before_year_month_pair(rewriter: SargableRewriter) -> None:
+    # NOT относится только к первому предикату: пару нельзя объединить в один диапазон месяца
+    sql, rules = rewriter.rewrite(
+        "SELECT COUNT(*) FROM videos WHERE NOT EXTRACT(YEAR FROM created_at) = 2025 "
+        "AND EXTRACT(MONTH FROM created_at) = 11"
+    )
+    assert sql == (
+        "SELECT COUNT(*) FROM videos WHERE NOT "
+        + day_range("created_at", "2025-01-01", "2026-01-01")
+        + " AND EXTRACT(MONTH FROM created_at) = 11"
+    )
+    assert rules == ["extract_year"]
+
+
+def test_stats(rewriter: SargableRewriter) -> None:
+    rewriter.rewrite("SELECT COUNT(*) FROM videos")
+    rewriter.rewrite("SELECT COUNT(*) FROM videos WHERE created_at::date = '2025-11-01'")
+    assert rewriter.stats() == {"total": 2, "rewritten": 1}
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from bot.services.translation_cache import SQLiteTranslationStore, TranslationCache
+from infrastructure.cache import lru
+from infrastructure.cache.lru import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lru.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_expires_after_ttl(clock):
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+
+    clock[0] += 59
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_without_ttl_never_expires(clock):
+    cache = LRUCache(max_size=10)
+    cache.set("a", 1)
+    clock[0] += 10 ** 9
+    assert cache.get("a") == 1
+
+
+def test_lru_rejects_empty_size():
+    with pytest.raises(ValueError):
+        LRUCache(max_size=0)
+
+
+def test_translation_cache_uses_normalized_question():
+    cache = TranslationCache(max_size=10)
+
+    async def scenario():
+        await cache.set("Сколько видео вышло 1 декабря 2025?", "SELECT 1")
+        return (
+            await cache.get("сколько видео вышло 01.12.2025"),
+            await cache.get("Сколько видео вышло 2 декабря 2025?"),
+        )
+
+    assert asyncio.run(scenario()) == ("SELECT 1", None)
+
+
+def test_translation_cache_keeps_operators_apart():
+    cache = TranslationCache(max_size=10)
+
+    async def scenario():
+        await cache.set("Сколько видео с просмотрами > 100000?", "SELECT 1")
+        return await cache.get("Сколько видео с просмотрами < 100000?")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_sqlite_store_survives_restart(tmp_path):
+    path = str(tmp_path / "cache" / "translations.sqlite3")
+
+    async def scenario():
+        first = TranslationCache(max_size=10, store=SQLiteTranslationStore(path))
+        await first.set("Сколько всего видео?", "SELECT COUNT(*) FROM videos")
+        first.store.close()
+
+        second = TranslationCache(max_size=10, store=SQLiteTranslationStore(path))
+        try:
+            return await second.get("сколько всего видео"), second.stats()
+        finally:
+            second.store.close()
+
+    sql, stats = asyncio.run(scenario())
+    assert sql == "SELECT COUNT(*) FROM videos"
+    assert stats["store_hits"] == 1
+    assert stats["total_hits"] == 1
+
+
+def test_sqlite_store_expires_after_ttl(tmp_path, monkeypatch):
+    store = SQLiteTranslationStore(str(tmp_path / "translations.sqlite3"), ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr("bot.services.translation_cache.time.time", lambda: now[0])
+
+    async def scenario():
+        await store.set("key", "SELECT 1")
+        now[0] += 61
+        return await store.get("key")
+
+    try:
+        assert asyncio.run(scenario()) is None
+    finally:
+        store.close()
+
+
+def test_store_errors_do_not_fail_requests():
+    class BrokenStore:
+        async def get(self, key):
+            raise OSError("disk")
+
+        async def set(self, key, sql):
+            raise OSError("disk")
+
+    cache = TranslationCache(max_size=10, store=BrokenStore())
+
+    async def scenario():
+        await cache.set("Сколько всего видео?", "SELECT 1")
+        cache.memory.clear()
+        return await cache.get("Сколько всего видео?")
+
+    assert asyncio.run(scenario()) is None
+    assert cache.stats()["store_errors"] == 2